@@ -1,2 +1,7 @@
-from resources.lib.plugin import plugin
-plugin.dispatch(sys.argv[2])
\ No newline at end of file
+import sys
+
+from resources.lib.base import daemon
+
+if not daemon.forward(argv=sys.argv):
+    from resources.lib.plugin import plugin
+    plugin.dispatch(sys.argv[2])
\ No newline at end of file
@@ -1,12 +1,11 @@
-import datetime, os, time, xbmc
+import calendar, collections, datetime, os, threading, time, xbmc
 
-from resources.lib.base import gui, settings
-from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE
+from resources.lib.base import gui, httpcache, listcache, settings
+from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE, CHANNEL_TEST_LIMIT, SESSION_MAX_AGE, SESSION_RETRY_STATUSES
 from resources.lib.base.exceptions import Error
 from resources.lib.base.log import log
-from resources.lib.base.session import Session
-from resources.lib.base.util import check_key, clean_filename, combine_playlist, find_highest_bandwidth, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
-from resources.lib.constants import CONST_BASE_HEADERS, CONST_BASE_URL, CONST_DEFAULT_API, CONST_LOGIN_HEADERS, CONST_LOGIN_URL
+from resources.lib.base.util import check_key, clean_filename, combine_playlist, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
+from resources.lib.constants import CONST_BASE_HEADERS, CONST_BASE_URL, CONST_CACHE_TTL, CONST_DEFAULT_API, CONST_LOGIN_HEADERS, CONST_LOGIN_URL
 from resources.lib.language import _
 
 try:
@@ -20,11 +19,16 @@ try:
 except NameError:
     unicode = str
 
+# the channel test probes from several threads, a rejected session is renewed by one of them at a time
+_session_lock = threading.RLock()
+
 class APIError(Error):
     pass
 
 class API(object):
     def new_session(self, force=False, retry=True, channels=False):
+        from resources.lib.base.session import Session
+
         self.check_vars()
 
         if self._debug_mode:
@@ -35,14 +39,14 @@ class API(object):
         username = self._username
         password = self._password
 
-        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - 7200) and self._last_login_success:
+        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - SESSION_MAX_AGE) and self._last_login_success:
             self.logged_in = True
 
             try:
                 self._session
             except:
                 self._session = Session(cookies_key='_cookies')
-                self._session.headers = CONST_BASE_HEADERS
+                self._session.reset_headers()
                 self._session.headers.update({'Authorization': 'Bearer ' + self._session_token})
 
                 if self._debug_mode:
@@ -174,6 +178,8 @@ class API(object):
             log.debug('Execution Done: api.check_vars')
 
     def login(self, username, password, channels=False, retry=True):
+        from resources.lib.base.session import Session
+
         if self._debug_mode:
             log.debug('Executing: api.login')
             log.debug('Vars: username={username}, password={password}, channels={channels}, retry={retry}'.format(username=username, password=password, channels=channels, retry=retry))
@@ -185,7 +191,7 @@ class API(object):
         settings.remove(key='_session_token')
         self._session_token = ''
         self._session = Session(cookies_key='_cookies')
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         auth_url = '{login_url}/authenticate?redirect_uri=https%3A%2F%2Flivetv.canaldigitaal.nl%2Fauth.aspx&state={state}&response_type=code&scope=TVE&client_id=StreamGroup'.format(login_url=CONST_LOGIN_URL, state=int(time.time()))
 
         if self._debug_mode:
@@ -205,7 +211,7 @@ class API(object):
             self.clear_session()
             return False
 
-        self._session.headers = CONST_LOGIN_HEADERS
+        self._session.headers = dict(CONST_LOGIN_HEADERS)
         self._session.headers.update({'Referer': auth_url})
 
         session_post_data = {
@@ -258,7 +264,7 @@ class API(object):
             "oauthcode": oauth
         }
 
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Content-Type': 'application/json;charset=UTF-8'})
 
         if self._debug_mode:
@@ -282,7 +288,7 @@ class API(object):
 
         login_url = "{base_url}/m7be2iphone/login.aspx".format(base_url=CONST_BASE_URL)
 
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Content-Type': 'application/x-www-form-urlencoded; charset=UTF-8'})
 
         if self._debug_mode:
@@ -310,7 +316,7 @@ class API(object):
 
         ssotoken_url = "{base_url}/m7be2iphone/capi.aspx?z=ssotoken".format(base_url=CONST_BASE_URL)
 
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
 
         if self._debug_mode:
             log.debug('Request Session Headers')
@@ -339,7 +345,7 @@ class API(object):
             "brand": "cds"
         }
 
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Content-Type': 'application/json;charset=UTF-8'})
 
         if self._debug_mode:
@@ -379,7 +385,7 @@ class API(object):
             set_credentials(username=username, password='')
 
         self.logged_in = True
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Authorization': 'Bearer ' + self._session_token})
 
         if self._debug_mode:
@@ -398,6 +404,8 @@ class API(object):
         settings.remove(key='_session_token')
         self._session_token = ''
 
+        httpcache.clear()
+
         try:
             self._session.clear_cookies()
 
@@ -413,7 +421,7 @@ class API(object):
             return False
 
     def get_channels_for_user(self):
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Authorization': 'Bearer ' + self._session_token})
 
         if self._debug_mode:
@@ -474,11 +482,14 @@ class API(object):
         write_file(file="tv.m3u8", data=playlist, isJSON=False)
         write_file(file="tv_all.m3u8", data=playlist_all, isJSON=False)
         combine_playlist()
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.create_playlist')
 
     def test_channels(self, tested=False, channel=None):
+        from resources.lib.base import channeltest
+
         if self._debug_mode:
             log.debug('Executing: api.test_channels')
             log.debug('Vars: tested={tested}, channel={channel}'.format(tested=tested, channel=channel))
@@ -486,202 +497,116 @@ class API(object):
         if channel:
             channel = unicode(channel)
 
-        try:
-            if not self._last_login_success or not settings.getBool(key='run_tests'):
-                return 5
-
-            settings.setBool(key='_test_running', value=True)
-            channels = load_file(file="channels.json", isJSON=True)
-            results = load_file(file="channel_test.json", isJSON=True)
+        if not self._last_login_success or not settings.getBool(key='run_tests'):
+            return CHANNEL_TEST_LIMIT
 
-            count = 0
-            first = True
-            last_tested_found = False
-            test_run = False
-            user_agent = settings.get(key='_user_agent')
+        channels = collections.OrderedDict()
 
-            if not results:
-                results = {}
-
-            for row in channels:
-                if count == 5 or (count == 1 and tested):
-                    if test_run:
-                        self.update_prefs()
-
-                    settings.setBool(key='_test_running', value=False)
-                    return count
+        try:
+            results = load_file(file="channel_test.json", isJSON=True)
 
+            for row in load_file(file="channels.json", isJSON=True) or []:
                 channeldata = self.get_channel_data(row=row, channelno=1)
                 id = unicode(channeldata['channel_id'])
 
                 if len(id) > 0:
-                    if channel:
-                        if not id == channel:
-                            continue
-                    elif tested and check_key(results, 'last_tested'):
-                        if unicode(results['last_tested']) == id:
-                            last_tested_found = True
-                            continue
-                        elif last_tested_found:
-                            pass
-                        else:
-                            continue
-
-                    if check_key(results, id) and not tested and not first:
-                        continue
-
-                    livebandwidth = 0
-                    replaybandwidth = 0
-                    live = 'false'
-                    replay = 'false'
-                    epg = 'false'
-                    guide = 'false'
-
-                    if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    playdata = self.play_url(type='channel', channel=id, id=id, test=True)
-
-                    if first and not self._last_login_success:
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    if len(playdata['path']) > 0:
-                        CDMHEADERS = CONST_BASE_HEADERS
-                        CDMHEADERS['User-Agent'] = user_agent
-                        self._session2 = Session(headers=CDMHEADERS)
-                        resp = self._session2.get(playdata['path'])
-
-                        if resp.status_code == 200:
-                            livebandwidth = find_highest_bandwidth(xml=resp.text)
-                            live = 'true'
-
-                    if check_key(results, id) and first and not tested:
-                        first = False
-
-                        if live == 'true':
-                            continue
-                        else:
-                            if test_run:
-                                self.update_prefs()
-
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
-
-                    first = False
-                    counter = 0
-
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 5:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
-
-                        counter += 1
-
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+                    channels[id] = channeldata
+        except:
+            return CHANNEL_TEST_LIMIT
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+        if not results:
+            results = {}
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+        count = channeltest.run(channels=channels, results=results, probe=self.probe_channel, update=self.update_prefs, tested=tested, channel=channel, aborted=lambda: self._abortRequested)
 
-                    self._session.headers = CONST_BASE_HEADERS
-                    self._session.headers.update({'Authorization': 'Bearer ' + self._session_token})
-                    yesterday = datetime.datetime.now() - datetime.timedelta(1)
-                    fromtime = datetime.datetime.strftime(yesterday, '%Y-%m-%dT%H:%M:%S.000Z')
-                    tilltime = datetime.datetime.strftime(yesterday, '%Y-%m-%dT%H:%M:59.999Z')
+        if self._debug_mode:
+            log.debug('Execution Done: api.test_channels')
 
-                    program_url = "{api_url}/schedule?channels={id}&from={fromtime}&until={tilltime}".format(api_url=CONST_DEFAULT_API, id=id, fromtime=fromtime, tilltime=tilltime);
-                    data = self.download(url=program_url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=False, allow_redirects=False)
+        return count
 
-                    if data and check_key(data, 'epg') and check_key(data['epg'][0], 'id'):
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+    def probe_channel(self, channeldata, tester):
+        from resources.lib.base.mpd import find_highest_bandwidth
+        from resources.lib.base.session import Session
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+        id = unicode(channeldata['channel_id'])
+        user_agent = settings.get(key='_user_agent')
+        livebandwidth = 0
+        replaybandwidth = 0
+        live = 'false'
+        replay = 'false'
+        epg = 'false'
+        guide = 'false'
 
-                        playdata = self.play_url(type='program', channel=id, id=data['epg'][0]['id'], test=True)
+        if not tester.wait():
+            return None
 
-                        if len(playdata['path']) > 0:
-                            CDMHEADERS = CONST_BASE_HEADERS
-                            CDMHEADERS['User-Agent'] = user_agent
-                            self._session2 = Session(headers=CDMHEADERS)
-                            resp = self._session2.get(playdata['path'])
+        playdata = self.play_url(type='channel', channel=id, id=id, test=True)
 
-                            if resp.status_code == 200:
-                                replaybandwidth = find_highest_bandwidth(xml=resp.text)
-                                replay = 'true'
+        if not self._last_login_success:
+            return None
 
-                    if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
-                        guide = 'true'
+        if len(playdata['path']) > 0:
+            CDMHEADERS = dict(CONST_BASE_HEADERS)
+            CDMHEADERS['User-Agent'] = user_agent
 
-                        if live == 'true':
-                            epg = 'true'
+            if not tester.wait():
+                return None
 
-                    results[id] = {
-                        'id': id,
-                        'live': live,
-                        'replay': replay,
-                        'livebandwidth': livebandwidth,
-                        'replaybandwidth': replaybandwidth,
-                        'epg': epg,
-                        'guide': guide,
-                    }
+            resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-                    results['last_tested'] = id
+            if resp.status_code == 200:
+                livebandwidth = find_highest_bandwidth(xml=resp.text)
+                live = 'true'
 
-                    if not self._abortRequested:
-                        write_file(file="channel_test.json", data=results, isJSON=True)
+        if not tester.wait():
+            return None
 
-                    test_run = True
-                    counter = 0
+        yesterday = datetime.datetime.now() - datetime.timedelta(1)
+        fromtime = datetime.datetime.strftime(yesterday, '%Y-%m-%dT%H:%M:%S.000Z')
+        tilltime = datetime.datetime.strftime(yesterday, '%Y-%m-%dT%H:%M:59.999Z')
 
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 15:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
+        program_url = "{api_url}/schedule?channels={id}&from={fromtime}&until={tilltime}".format(api_url=CONST_DEFAULT_API, id=id, fromtime=fromtime, tilltime=tilltime);
+        data = self.download(url=program_url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=False, check_data=False, allow_redirects=False)
 
-                        counter += 1
+        if data and check_key(data, 'epg') and check_key(data['epg'][0], 'id'):
+            if not tester.wait():
+                return None
 
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+            playdata = self.play_url(type='program', channel=id, id=data['epg'][0]['id'], test=True)
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+            if len(playdata['path']) > 0:
+                CDMHEADERS = dict(CONST_BASE_HEADERS)
+                CDMHEADERS['User-Agent'] = user_agent
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+                if not tester.wait():
+                    return None
 
-                    count += 1
-        except:
-            if test_run:
-                self.update_prefs()
+                resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-            count = 5
+                if resp.status_code == 200:
+                    replaybandwidth = find_highest_bandwidth(xml=resp.text)
+                    replay = 'true'
 
-        settings.setBool(key='_test_running', value=False)
+        if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
+            guide = 'true'
 
-        if self._debug_mode:
-            log.debug('Execution Done: api.test_channels')
+            if live == 'true':
+                epg = 'true'
 
-        return count
+        return {
+            'id': id,
+            'live': live,
+            'replay': replay,
+            'livebandwidth': livebandwidth,
+            'replaybandwidth': replaybandwidth,
+            'epg': epg,
+            'guide': guide,
+        }
 
-    def update_prefs(self):
+    def update_prefs(self, changed=None):
         if self._debug_mode:
             log.debug('Executing: api.update_prefs')
+            log.debug('Vars: changed={changed}'.format(changed=changed))
 
         prefs = load_file(file="channel_prefs.json", isJSON=True)
         results = load_file(file="channel_test.json", isJSON=True)
@@ -700,7 +625,7 @@ class API(object):
             channeldata = self.get_channel_data(row=row, channelno=1)
             id = unicode(channeldata['channel_id'])
 
-            if len(unicode(id)) == 0:
+            if len(unicode(id)) == 0 or (changed is not None and not id in changed):
                 continue
 
             keys = ['live', 'replay', 'epg']
@@ -731,6 +656,7 @@ class API(object):
                     prefs[id][key] = results[id][key]
 
         write_file(file="channel_prefs.json", data=prefs, isJSON=True)
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.update_prefs')
@@ -781,7 +707,7 @@ class API(object):
         return channeldata
 
     def play_url(self, type, channel=None, id=None, test=False, from_beginning='False'):
-        self._session.headers = CONST_BASE_HEADERS
+        self._session.reset_headers()
         self._session.headers.update({'Authorization': 'Bearer ' + self._session_token})
 
         if self._debug_mode:
@@ -807,6 +733,8 @@ class API(object):
                     self._abortRequested = True
                     break
 
+                settings.invalidate()
+
             if self._abortRequested or xbmc.Monitor().abortRequested():
                 return playdata
 
@@ -817,42 +745,69 @@ class API(object):
 
         play_url = info_url + '/play'
 
+        session_post_data = {
+            "player": {
+                "name":"Bitmovin",
+                "version":"8.22.0",
+                "capabilities": {
+                    "mediaTypes": ["DASH","HLS","MSSS","Unspecified"],
+                    "drmSystems": ["Widevine"],
+                },
+                "drmSystems": ["Widevine"],
+            },
+        }
+
         if not test:
-            data = self.download(url=info_url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
+            if type == 'channel' and not settings.getBool(key='ask_start_from_beginning'):
+                # zapping only needs the live stream, the asset info is fetched alongside the play request
+                result = {}
+                info_session = self._info_session()
 
-            if not data or not check_key(data, 'id'):
-                if self._debug_mode:
-                    log.debug('Failure to retrieve expected data')
-                    log.debug('Execution Done: api.play_url')
+                def get_info():
+                    try:
+                        result['data'] = self.get_asset(url=info_url, retry=False, session=info_session)
+                    except:
+                        log.exception('Failed to fetch the asset info')
 
-                return playdata
+                thread = threading.Thread(target=get_info)
+                thread.start()
 
-            session_post_data = {
-                "player": {
-                    "name":"Bitmovin",
-                    "version":"8.22.0",
-                    "capabilities": {
-                        "mediaTypes": ["DASH","HLS","MSSS","Unspecified"],
-                        "drmSystems": ["Widevine"],
-                    },
-                    "drmSystems": ["Widevine"],
-                },
-            }
+                data = self.download(url=play_url, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
+                thread.join()
+
+                info = result.get('data') or self.get_asset(url=info_url, retry=True)
+
+                if not info:
+                    if self._debug_mode:
+                        log.debug('Failure to retrieve expected data')
+                        log.debug('Execution Done: api.play_url')
+
+                    return playdata
 
-            if type == 'channel' and check_key(data, 'params') and check_key(data['params'], 'now') and check_key(data['params']['now'], 'id'):
-                play_url2 = '{api_url}/assets/{id}/play'.format(api_url=CONST_DEFAULT_API, id=data['params']['now']['id'])
-                info = data['params']['now']
+                if check_key(info, 'params') and check_key(info['params'], 'now') and check_key(info['params']['now'], 'id'):
+                    info = info['params']['now']
+            else:
+                data = self.get_asset(url=info_url, retry=True)
 
-                data = self.download(url=play_url2, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
+                if not data:
+                    if self._debug_mode:
+                        log.debug('Failure to retrieve expected data')
+                        log.debug('Execution Done: api.play_url')
 
-                if data and check_key(data, 'url'):
-                    if not settings.getBool(key='ask_start_from_beginning') or not gui.yes_no(message=_.START_FROM_BEGINNING, heading=info['title']):
+                    return playdata
+
+                if type == 'channel' and check_key(data, 'params') and check_key(data['params'], 'now') and check_key(data['params']['now'], 'id'):
+                    play_url2 = '{api_url}/assets/{id}/play'.format(api_url=CONST_DEFAULT_API, id=data['params']['now']['id'])
+                    info = data['params']['now']
+
+                    data = self.download(url=play_url2, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
+
+                    # the program stream is only kept when playback starts from the beginning
+                    if not data or not check_key(data, 'url') or not gui.yes_no(message=_.START_FROM_BEGINNING, heading=info['title']):
                         data = self.download(url=play_url, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
                 else:
+                    info = data
                     data = self.download(url=play_url, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
-            else:
-                info = data
-                data = self.download(url=play_url, type="post", code=[200], data=session_post_data, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
         else:
             if self._abortRequested or xbmc.Monitor().abortRequested():
                 return playdata
@@ -890,6 +845,24 @@ class API(object):
 
         return playdata
 
+    def get_asset(self, url, retry=True, session=None):
+        data = self.download(url=url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=retry, check_data=True, allow_redirects=True, session=session)
+
+        if not data or not check_key(data, 'id'):
+            return None
+
+        if settings.getBool(key='enable_cache') and check_key(data, 'params') and check_key(data['params'], 'now') and check_key(data['params']['now'], 'params') and check_key(data['params']['now']['params'], 'end'):
+            try:
+                end = calendar.timegm(time.strptime(data['params']['now']['params']['end'], "%Y-%m-%dT%H:%M:%SZ"))
+            except:
+                end = 0
+
+            # a channel keeps the same program on air until it ends
+            if end > int(time.time()):
+                httpcache.set(url=url, data=data, ttl=end - int(time.time()))
+
+        return data
+
     def vod_seasons(self, id):
         if self._debug_mode:
             log.debug('Executing: api.vod_seasons')
@@ -925,7 +898,32 @@ class API(object):
 
         return True
 
-    def download(self, url, type, code=None, data=None, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True):
+    def _info_session(self):
+        from resources.lib.base.session import Session
+
+        # a copy of the current session, a login by the play request swaps self._session and rewrites its headers
+        session = Session(headers=dict(self._session.headers))
+        session.cookies.update(self._session.cookies)
+
+        return session
+
+    def _request(self, url, type, data, json_data, allow_redirects, session):
+        from requests.exceptions import RequestException
+
+        try:
+            if type == "post" and data:
+                if json_data:
+                    return session.post(url, json=data, allow_redirects=allow_redirects)
+
+                return session.post(url, data=data, allow_redirects=allow_redirects)
+
+            return getattr(session, type)(url, allow_redirects=allow_redirects)
+        except RequestException as e:
+            # an unreachable host or an open circuit fails this call, not the whole navigation
+            log.debug('Request failed: {error}'.format(error=e))
+            return None
+
+    def download(self, url, type, code=None, data=None, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True, session=None):
         if self._abortRequested or xbmc.Monitor().abortRequested():
             return None
 
@@ -933,13 +931,30 @@ class API(object):
             log.debug('Executing: api.download')
             log.debug('Vars: url={url}, type={type}, code={code}, data={data}, json_data={json_data}, data_return={data_return}, return_json={return_json}, retry={retry}, check_data={check_data}, allow_redirects={allow_redirects}'.format(url=url, type=type, code=code, data=data, json_data=json_data, data_return=data_return, return_json=return_json, retry=retry, check_data=check_data, allow_redirects=allow_redirects))
 
-        if type == "post" and data:
-            if json_data:
-                resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-            else:
-                resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-        else:
-            resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+        cache_ttl = 0
+
+        # posts are never cached, only gets of endpoints with a known lifetime
+        if type == "get" and data_return and return_json and settings.getBool(key='enable_cache'):
+            cache_ttl = httpcache.get_ttl(url=url, rules=CONST_CACHE_TTL)
+
+        if cache_ttl:
+            returned_data = httpcache.get(url=url)
+
+            if returned_data is not None:
+                if self._debug_mode:
+                    log.debug('Returned data from cache: {data}'.format(data=returned_data))
+                    log.debug('Execution Done: api.download')
+
+                return returned_data
+
+        resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects, session=session or self._session)
+
+        if resp is None:
+            if self._debug_mode:
+                log.debug('Returned data: None')
+                log.debug('Execution Done: api.download')
+
+            return None
 
         if self._debug_mode:
             log.debug('Response')
@@ -947,7 +962,8 @@ class API(object):
             log.debug('Response status code: {status_code}'.format(status_code=resp.status_code))
 
         if (code and not resp.status_code in code) or (check_data and not self.check_data(resp=resp)):
-            if not retry:
+            # an overloaded or failing server is not fixed by logging in again
+            if not retry or resp.status_code in SESSION_RETRY_STATUSES:
                 if self._debug_mode:
                     log.debug('Not retrying')
                     log.debug('Returned data: None')
@@ -958,7 +974,12 @@ class API(object):
             if self._debug_mode:
                 log.debug('Trying to update login data')
 
-            self.new_session(force=True, retry=False)
+            session_age = self._session_age
+
+            with _session_lock:
+                # a thread that waited on the lock finds the session already renewed by the one before it
+                if self._session_age == session_age:
+                    self.new_session(force=True, retry=False)
 
             if not self.logged_in:
                 if self._debug_mode:
@@ -968,13 +989,14 @@ class API(object):
 
                 return None
 
-            if type == "post" and data:
-                if json_data:
-                    resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-                else:
-                    resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-            else:
-                resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+            resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects, session=session or self._session)
+
+            if resp is None:
+                if self._debug_mode:
+                    log.debug('Returned data: None')
+                    log.debug('Execution Done: api.download')
+
+                return None
 
             if self._debug_mode:
                 log.debug('Response')
@@ -997,6 +1019,9 @@ class API(object):
                     except:
                         returned_data = resp.json()
 
+                    if cache_ttl:
+                        httpcache.set(url=url, data=returned_data, ttl=cache_ttl, headers=resp.headers)
+
                     if self._debug_mode:
                         log.debug('Returned data: {data}'.format(data=returned_data))
                         log.debug('Execution Done: api.download')
@@ -0,0 +1,119 @@
+import binascii, json, os, socket, threading, time
+
+from contextlib import closing
+from resources.lib.base import settings
+from resources.lib.base.constants import DISPATCH_TIMEOUT, SESSION_MAX_AGE
+from resources.lib.base.exceptions import Exit
+from resources.lib.base.log import log
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+_lock = threading.Lock()
+_unsupported = set()
+
+class DispatchHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        folder = None
+
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+
+            if request.get('token') == self.server.token:
+                folder = dispatch(argv=request['argv'])
+        except:
+            log.exception('Failed to dispatch in the service')
+
+        self.wfile.write(json.dumps({'folder': folder}).encode('utf-8') + b'\n')
+
+class DispatchServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+def dispatch(argv):
+    with _lock:
+        import resources.lib.plugin
+        from resources.lib.api import API
+        from resources.lib.base import gui, plugin, router, signals
+
+        function, params = router.parse_url(argv[2])
+        listing = plugin._listings.get(function.__name__)
+
+        # only listings are served here, anything playing, asking or changing state runs in the plugin itself
+        if not listing or function.__name__ in _unsupported:
+            return None
+
+        # the plugin writes the session from its own process, it is read again instead of trusting the cached values
+        settings.invalidate()
+
+        # the service never logs in for a listing, without a current session the plugin takes the route
+        if not settings.getBool(key='_last_login_success') or not settings.getInt(key='_session_age', default=0) > int(time.time() - SESSION_MAX_AGE):
+            return None
+
+        # the api caches the session it read, a fresh one picks up a login, logout or renewal since the last listing
+        api = API()
+        api.login = _no_login
+        resources.lib.plugin.api = api
+
+        try:
+            with gui.headless():
+                signals.emit(signals.BEFORE_DISPATCH)
+                folder = plugin._dump_folder(listing(**params))
+        except Exit:
+            return None
+        finally:
+            settings.flush()
+
+        # a listing that cannot travel as json is built by the plugin from now on, not built twice on every visit
+        if folder is None:
+            _unsupported.add(function.__name__)
+
+        return folder
+
+def _no_login(*args, **kwargs):
+    # the api did not accept the stored session, the plugin logs in when it takes the route back
+    raise Exit()
+
+def forward(argv):
+    port = settings.getInt(key='_dispatch_port', default=0)
+
+    if not port:
+        return False
+
+    try:
+        with closing(socket.create_connection(('127.0.0.1', port), timeout=DISPATCH_TIMEOUT)) as s:
+            s.sendall(json.dumps({'token': settings.get(key='_dispatch_token'), 'argv': list(argv)}).encode('utf-8') + b'\n')
+
+            with closing(s.makefile('rb')) as f:
+                folder = json.loads(f.readline().decode('utf-8'))['folder']
+    except:
+        return False
+
+    if not folder:
+        return False
+
+    from resources.lib.base import plugin
+    plugin._load_folder(folder).display()
+
+    return True
+
+def start():
+    server = DispatchServer(('127.0.0.1', 0), DispatchHandler)
+    server.token = binascii.hexlify(os.urandom(16)).decode('utf-8')
+
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    settings.setInt(key='_dispatch_port', value=server.server_address[1])
+    settings.set(key='_dispatch_token', value=server.token)
+
+    return server
+
+def stop(server):
+    settings.setInt(key='_dispatch_port', value=0)
+
+    server.shutdown()
+    server.server_close()
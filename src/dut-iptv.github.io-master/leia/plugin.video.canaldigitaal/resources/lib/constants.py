@@ -33,6 +33,11 @@ CONST_BASE_HEADERS = {
     'Accept-Language': 'en-US,en;q: 0.9,nl;q: 0.8',
 }
 
+CONST_CACHE_TTL = [
+    (r'/assets/[^/?]+$', 60),
+    (r'/assets\?query=channels,', 86400),
+]
+
 CONST_EPG = 'https://dut-epg.github.io/c.epg.xml.zip'
 CONST_IMAGES = 'https://dut-epg.github.io/c.images.zip'
 CONST_MD5 = 'https://dut-epg.github.io/c.md5.json'
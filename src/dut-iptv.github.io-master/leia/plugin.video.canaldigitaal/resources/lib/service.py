@@ -1,8 +1,9 @@
 import time, xbmc, xbmcaddon
 
 from resources.lib.api import API
-from resources.lib.base import settings
-from resources.lib.base.constants import ADDON_PROFILE
+from resources.lib.base import daemon, gui, settings
+from resources.lib.base.constants import ADDON_PROFILE, CHANNEL_TEST_LIMIT, SESSION_MAX_AGE, SESSION_RENEW_MARGIN
+from resources.lib.base.log import log
 from resources.lib.base.util import change_icon, check_iptv_link, clear_cache, download_files, find_free_port, get_system_arch
 from resources.lib.proxy import HTTPMonitor, RemoteControlBrowserService
 from resources.lib.util import update_os_browser
@@ -19,9 +20,31 @@ def hourly(type=0):
         download_files()
 
     if type > 0:
-        if api.test_channels(tested=False) < 5:
+        if api.test_channels(tested=False) < CHANNEL_TEST_LIMIT:
             api.test_channels(tested=True)
 
+def renew_session():
+    global api
+
+    # the session is renewed ahead of its expiry, so playback never has to wait for the login chain
+    if not settings.getBool(key='_last_login_success') or settings.getInt(key='_session_age', default=0) > int(time.time() - SESSION_MAX_AGE + SESSION_RENEW_MARGIN):
+        return
+
+    # a separate instance logs in without dialogs, the current token and cookies stay in place until the new ones are complete
+    renewer = API()
+
+    try:
+        with settings.staged(), gui.headless():
+            if not renewer.new_session(force=True, retry=False):
+                return
+
+            settings.commit()
+    except:
+        log.exception('Failed to renew the session')
+        return
+
+    api = renewer
+
 def startup():
     settings.setBool(key='_test_running', value=False)
     system, arch = get_system_arch()
@@ -49,6 +72,7 @@ def main():
     service.clearBrowserLock()
     monitor = HTTPMonitor(service)
     service.reloadHTTPServer()
+    dispatcher = daemon.start()
 
     k = 0
     z = 0
@@ -63,6 +87,8 @@ def main():
             k = 0
             z += 1
 
+            renew_session()
+
         if z == 60:
             z = 0
             l += 1
@@ -77,4 +103,6 @@ def main():
         k += 1
     
     api._abortRequested = True
-    service.shutdownHTTPServer()
\ No newline at end of file
+    daemon.stop(dispatcher)
+    service.shutdownHTTPServer()
+    settings.flush()
\ No newline at end of file
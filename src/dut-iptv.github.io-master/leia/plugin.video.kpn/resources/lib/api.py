@@ -1,12 +1,11 @@
-import os, time, xbmc
+import collections, os, threading, time, xbmc
 
-from resources.lib.base import gui, settings
-from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE
+from resources.lib.base import gui, httpcache, listcache, settings
+from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE, CHANNEL_TEST_LIMIT, SESSION_MAX_AGE, SESSION_RETRY_STATUSES
 from resources.lib.base.exceptions import Error
 from resources.lib.base.log import log
-from resources.lib.base.session import Session
-from resources.lib.base.util import check_key, clean_filename, combine_playlist, find_highest_bandwidth, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
-from resources.lib.constants import CONST_BASE_HEADERS, CONST_IMAGE_URL
+from resources.lib.base.util import check_key, clean_filename, combine_playlist, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
+from resources.lib.constants import CONST_BASE_HEADERS, CONST_CACHE_TTL, CONST_IMAGE_URL
 from resources.lib.language import _
 
 try:
@@ -19,11 +18,16 @@ try:
 except NameError:
     unicode = str
 
+# the channel test probes from several threads, a rejected session is renewed by one of them at a time
+_session_lock = threading.RLock()
+
 class APIError(Error):
     pass
 
 class API(object):
     def new_session(self, force=False, retry=True, channels=False):
+        from resources.lib.base.session import Session
+
         self.check_vars()
 
         if self._debug_mode:
@@ -34,7 +38,7 @@ class API(object):
         username = self._username
         password = self._password
 
-        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - 7200) and self._last_login_success:
+        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - SESSION_MAX_AGE) and self._last_login_success:
             self.logged_in = True
 
             try:
@@ -185,6 +189,8 @@ class API(object):
             log.debug('Execution Done: api.check_vars')
 
     def login(self, username, password, channels=False, retry=True):
+        from resources.lib.base.session import Session
+
         if self._debug_mode:
             log.debug('Executing: api.login')
             log.debug('Vars: username={username}, password={password}, channels={channels}, retry={retry}'.format(username=username, password=password, channels=channels, retry=retry))
@@ -289,6 +295,8 @@ class API(object):
         settings.remove(key='_cookies')
         self._cookies = ''
 
+        httpcache.clear()
+
         try:
             self._session.clear_cookies()
 
@@ -357,11 +365,14 @@ class API(object):
         write_file(file="tv.m3u8", data=playlist, isJSON=False)
         write_file(file="tv_all.m3u8", data=playlist_all, isJSON=False)
         combine_playlist()
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.create_playlist')
 
     def test_channels(self, tested=False, channel=None):
+        from resources.lib.base import channeltest
+
         if self._debug_mode:
             log.debug('Executing: api.test_channels')
             log.debug('Vars: tested={tested}, channel={channel}'.format(tested=tested, channel=channel))
@@ -369,198 +380,114 @@ class API(object):
         if channel:
             channel = unicode(channel)
 
-        try:
-            if not self._last_login_success or not settings.getBool(key='run_tests'):
-                return 5
-
-            settings.setBool(key='_test_running', value=True)
-            channels = load_file(file="channels.json", isJSON=True)
-            results = load_file(file="channel_test.json", isJSON=True)
-
-            count = 0
-            first = True
-            last_tested_found = False
-            test_run = False
-            user_agent = settings.get(key='_user_agent')
+        if not self._last_login_success or not settings.getBool(key='run_tests'):
+            return CHANNEL_TEST_LIMIT
 
-            if not results:
-                results = {}
+        channels = collections.OrderedDict()
 
-            for row in channels:
-                if count == 5 or (count == 1 and tested):
-                    if test_run:
-                        self.update_prefs()
-
-                    settings.setBool(key='_test_running', value=False)
-                    return count
+        try:
+            results = load_file(file="channel_test.json", isJSON=True)
 
+            for row in load_file(file="channels.json", isJSON=True) or []:
                 channeldata = self.get_channel_data(row=row)
                 id = unicode(channeldata['channel_id'])
 
                 if len(id) > 0:
-                    if channel:
-                        if not id == channel:
-                            continue
-                    elif tested and check_key(results, 'last_tested'):
-                        if unicode(results['last_tested']) == id:
-                            last_tested_found = True
-                            continue
-                        elif last_tested_found:
-                            pass
-                        else:
-                            continue
-
-                    if check_key(results, id) and not tested and not first:
-                        continue
-
-                    livebandwidth = 0
-                    replaybandwidth = 0
-                    live = 'false'
-                    replay = 'false'
-                    epg = 'false'
-                    guide = 'false'
-
-                    if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    playdata = self.play_url(type='channel', channel=id, id=channeldata['asset_id'], test=True)
-
-                    if first and not self._last_login_success:
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    if len(playdata['path']) > 0:
-                        CDMHEADERS = CONST_BASE_HEADERS
-                        CDMHEADERS['User-Agent'] = user_agent
-                        playdata['path'] = playdata['path'].split("&", 1)[0]
-                        self._session2 = Session(headers=CDMHEADERS)
-                        resp = self._session2.get(playdata['path'])
-
-                        if resp.status_code == 200:
-                            livebandwidth = find_highest_bandwidth(xml=resp.text)
-                            live = 'true'
-
-                    if check_key(results, id) and first and not tested:
-                        first = False
-
-                        if live == 'true':
-                            continue
-                        else:
-                            if test_run:
-                                self.update_prefs()
-
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
-
-                    first = False
-                    counter = 0
-
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 5:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
-
-                        counter += 1
-
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+                    channels[id] = channeldata
+        except:
+            return CHANNEL_TEST_LIMIT
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+        if not results:
+            results = {}
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+        count = channeltest.run(channels=channels, results=results, probe=self.probe_channel, update=self.update_prefs, tested=tested, channel=channel, aborted=lambda: self._abortRequested)
 
-                    program_url = '{api_url}/TRAY/AVA/TRENDING/YESTERDAY?maxResults=1&filter_channelIds={channel}'.format(api_url=self._api_url, channel=channeldata['channel_id'])
-                    data = self.download(url=program_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=False, check_data=True)
+        if self._debug_mode:
+            log.debug('Execution Done: api.test_channels')
 
-                    if data and check_key(data['resultObj'], 'containers') and check_key(data['resultObj']['containers'][0], 'id'):
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+        return count
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+    def probe_channel(self, channeldata, tester):
+        from resources.lib.base.mpd import find_highest_bandwidth
+        from resources.lib.base.session import Session
 
-                        playdata = self.play_url(type='program', channel=id, id=data['resultObj']['containers'][0]['id'], test=True)
+        id = unicode(channeldata['channel_id'])
+        user_agent = settings.get(key='_user_agent')
+        livebandwidth = 0
+        replaybandwidth = 0
+        live = 'false'
+        replay = 'false'
+        epg = 'false'
+        guide = 'false'
 
-                        if len(playdata['path']) > 0:
-                            CDMHEADERS = CONST_BASE_HEADERS
-                            CDMHEADERS['User-Agent'] = user_agent
-                            playdata['path'] = playdata['path'].split("&min_bitrate", 1)[0]
-                            self._session2 = Session(headers=CDMHEADERS)
-                            resp = self._session2.get(playdata['path'])
+        if not tester.wait():
+            return None
 
-                            if resp.status_code == 200:
-                                replaybandwidth = find_highest_bandwidth(xml=resp.text)
-                                replay = 'true'
+        playdata = self.play_url(type='channel', channel=id, id=channeldata['asset_id'], test=True)
 
-                    if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
-                        guide = 'true'
+        if not self._last_login_success:
+            return None
 
-                        if live == 'true':
-                            epg = 'true'
+        if len(playdata['path']) > 0:
+            CDMHEADERS = dict(CONST_BASE_HEADERS)
+            CDMHEADERS['User-Agent'] = user_agent
+            playdata['path'] = playdata['path'].split("&", 1)[0]
 
-                    results[id] = {
-                        'id': id,
-                        'live': live,
-                        'replay': replay,
-                        'livebandwidth': livebandwidth,
-                        'replaybandwidth': replaybandwidth,
-                        'epg': epg,
-                        'guide': guide,
-                    }
+            if not tester.wait():
+                return None
 
-                    results['last_tested'] = id
+            resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-                    if not self._abortRequested:
-                        write_file(file="channel_test.json", data=results, isJSON=True)
+            if resp.status_code == 200:
+                livebandwidth = find_highest_bandwidth(xml=resp.text)
+                live = 'true'
 
-                    test_run = True
-                    counter = 0
+        if not tester.wait():
+            return None
 
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 15:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
+        program_url = '{api_url}/TRAY/AVA/TRENDING/YESTERDAY?maxResults=1&filter_channelIds={channel}'.format(api_url=self._api_url, channel=channeldata['channel_id'])
+        data = self.download(url=program_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=False, check_data=True)
 
-                        counter += 1
+        if data and check_key(data['resultObj'], 'containers') and check_key(data['resultObj']['containers'][0], 'id'):
+            if not tester.wait():
+                return None
 
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+            playdata = self.play_url(type='program', channel=id, id=data['resultObj']['containers'][0]['id'], test=True)
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+            if len(playdata['path']) > 0:
+                CDMHEADERS = dict(CONST_BASE_HEADERS)
+                CDMHEADERS['User-Agent'] = user_agent
+                playdata['path'] = playdata['path'].split("&min_bitrate", 1)[0]
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+                if not tester.wait():
+                    return None
 
-                    count += 1
-        except:
-            if test_run:
-                self.update_prefs()
+                resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-            count = 5
+                if resp.status_code == 200:
+                    replaybandwidth = find_highest_bandwidth(xml=resp.text)
+                    replay = 'true'
 
-        settings.setBool(key='_test_running', value=False)
+        if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
+            guide = 'true'
 
-        if self._debug_mode:
-            log.debug('Execution Done: api.test_channels')
+            if live == 'true':
+                epg = 'true'
 
-        return count
+        return {
+            'id': id,
+            'live': live,
+            'replay': replay,
+            'livebandwidth': livebandwidth,
+            'replaybandwidth': replaybandwidth,
+            'epg': epg,
+            'guide': guide,
+        }
 
-    def update_prefs(self):
+    def update_prefs(self, changed=None):
         if self._debug_mode:
             log.debug('Executing: api.update_prefs')
+            log.debug('Vars: changed={changed}'.format(changed=changed))
 
         prefs = load_file(file="channel_prefs.json", isJSON=True)
         results = load_file(file="channel_test.json", isJSON=True)
@@ -579,7 +506,7 @@ class API(object):
             channeldata = self.get_channel_data(row=row)
             id = unicode(channeldata['channel_id'])
 
-            if len(unicode(id)) == 0:
+            if len(unicode(id)) == 0 or (changed is not None and not id in changed):
                 continue
 
             keys = ['live', 'replay', 'epg']
@@ -610,6 +537,7 @@ class API(object):
                     prefs[id][key] = results[id][key]
 
         write_file(file="channel_prefs.json", data=prefs, isJSON=True)
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.update_prefs')
@@ -664,6 +592,37 @@ class API(object):
 
         return channeldata
 
+    def get_live_info(self, channel, retry=True, session=None):
+        info_url = '{api_url}/TRAY/SEARCH/LIVE?maxResults=1&filter_airingTime=now&filter_channelIds={channel}&orderBy=airingStartTime&sortOrder=desc'.format(api_url=self._api_url, channel=channel)
+        data = self.download(url=info_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=retry, check_data=True, session=session)
+
+        if not data or not check_key(data['resultObj'], 'containers'):
+            return None
+
+        program_id = None
+        end = 0
+
+        for row in data['resultObj']['containers']:
+            program_id = row['id']
+
+            if check_key(row, 'metadata') and check_key(row['metadata'], 'airingEndTime'):
+                end = int(int(row['metadata']['airingEndTime']) / 1000)
+
+        # a channel keeps the same program on air until it ends
+        if settings.getBool(key='enable_cache') and end > int(time.time()):
+            httpcache.set(url=info_url, data=data, ttl=end - int(time.time()))
+
+        if not program_id:
+            return data
+
+        info_url = '{api_url}/CONTENT/DETAIL/PROGRAM/{id}'.format(api_url=self._api_url, id=program_id)
+        data = self.download(url=info_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=retry, check_data=True, session=session)
+
+        if not data or not check_key(data['resultObj'], 'containers'):
+            return None
+
+        return data
+
     def play_url(self, type, channel=None, id=None, test=False, from_beginning=False):
         if self._debug_mode:
             log.debug('Executing: api.play_url')
@@ -686,26 +645,12 @@ class API(object):
                     self._abortRequested = True
                     break
 
+                settings.invalidate()
+
             if self._abortRequested or xbmc.Monitor().abortRequested():
                 return playdata
 
         if type == 'channel':
-            if not test:
-                info_url = '{api_url}/TRAY/SEARCH/LIVE?maxResults=1&filter_airingTime=now&filter_channelIds={channel}&orderBy=airingStartTime&sortOrder=desc'.format(api_url=self._api_url, channel=channel)
-                data = self.download(url=info_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
-
-                if not data or not check_key(data['resultObj'], 'containers'):
-                    if self._debug_mode:
-                        log.debug('Failure to retrieve expected data')
-                        log.debug('Execution Done: api.play_url')
-
-                    return playdata
-
-                for row in data['resultObj']['containers']:
-                    program_id = row['id']
-
-                info = data
-
             play_url = '{api_url}/CONTENT/VIDEOURL/LIVE/{channel}/{id}/?deviceId={device_key}&profile=G02&time={time}'.format(api_url=self._api_url, channel=channel, id=id, device_key=self._devicekey, time=militime)
         else:
             if type == 'program':
@@ -753,23 +698,49 @@ class API(object):
         if self._abortRequested or xbmc.Monitor().abortRequested():
             return playdata
 
-        if program_id and not test:
-            info_url = '{api_url}/CONTENT/DETAIL/{type}/{id}'.format(api_url=self._api_url, type=typestr, id=program_id)
-            data = self.download(url=info_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
+        if type == 'channel' and not test:
+            # zapping only needs the live stream, the program info is fetched alongside the play request
+            result = {}
+            info_session = self._info_session()
 
-            if not data or not check_key(data['resultObj'], 'containers'):
+            def get_info():
+                try:
+                    result['info'] = self.get_live_info(channel=channel, retry=False, session=info_session)
+                except:
+                    log.exception('Failed to fetch the live info')
+
+            thread = threading.Thread(target=get_info)
+            thread.start()
+
+            data = self.download(url=play_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
+            thread.join()
+
+            info = result.get('info') or self.get_live_info(channel=channel, retry=True)
+
+            if not info:
                 if self._debug_mode:
                     log.debug('Failure to retrieve expected data')
                     log.debug('Execution Done: api.play_url')
 
                 return playdata
+        else:
+            if program_id and not test:
+                info_url = '{api_url}/CONTENT/DETAIL/{type}/{id}'.format(api_url=self._api_url, type=typestr, id=program_id)
+                data = self.download(url=info_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
 
-            info = data
+                if not data or not check_key(data['resultObj'], 'containers'):
+                    if self._debug_mode:
+                        log.debug('Failure to retrieve expected data')
+                        log.debug('Execution Done: api.play_url')
 
-        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-            return playdata
+                    return playdata
 
-        data = self.download(url=play_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
+                info = data
+
+            if self._abortRequested or xbmc.Monitor().waitForAbort(1):
+                return playdata
+
+            data = self.download(url=play_url, type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
 
         if not data or not check_key(data['resultObj'], 'token') or not check_key(data['resultObj'], 'src') or not check_key(data['resultObj']['src'], 'sources') or not check_key(data['resultObj']['src']['sources'], 'src'):
             if self._debug_mode:
@@ -939,7 +910,32 @@ class API(object):
 
         return True
 
-    def download(self, url, type, code=None, data=None, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True):
+    def _info_session(self):
+        from resources.lib.base.session import Session
+
+        # a copy of the current session, a login by the play request swaps self._session and rewrites its headers
+        session = Session(headers=dict(self._session.headers))
+        session.cookies.update(self._session.cookies)
+
+        return session
+
+    def _request(self, url, type, data, json_data, allow_redirects, session):
+        from requests.exceptions import RequestException
+
+        try:
+            if type == "post" and data:
+                if json_data:
+                    return session.post(url, json=data, allow_redirects=allow_redirects)
+
+                return session.post(url, data=data, allow_redirects=allow_redirects)
+
+            return getattr(session, type)(url, allow_redirects=allow_redirects)
+        except RequestException as e:
+            # an unreachable host or an open circuit fails this call, not the whole navigation
+            log.debug('Request failed: {error}'.format(error=e))
+            return None
+
+    def download(self, url, type, code=None, data=None, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True, session=None):
         if self._abortRequested or xbmc.Monitor().abortRequested():
             return None
 
@@ -947,13 +943,30 @@ class API(object):
             log.debug('Executing: api.download')
             log.debug('Vars: url={url}, type={type}, code={code}, data={data}, json_data={json_data}, data_return={data_return}, return_json={return_json}, retry={retry}, check_data={check_data}, allow_redirects={allow_redirects}'.format(url=url, type=type, code=code, data=data, json_data=json_data, data_return=data_return, return_json=return_json, retry=retry, check_data=check_data, allow_redirects=allow_redirects))
 
-        if type == "post" and data:
-            if json_data:
-                resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-            else:
-                resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-        else:
-            resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+        cache_ttl = 0
+
+        # posts are never cached, only gets of endpoints with a known lifetime
+        if type == "get" and data_return and return_json and settings.getBool(key='enable_cache'):
+            cache_ttl = httpcache.get_ttl(url=url, rules=CONST_CACHE_TTL)
+
+        if cache_ttl:
+            returned_data = httpcache.get(url=url)
+
+            if returned_data is not None:
+                if self._debug_mode:
+                    log.debug('Returned data from cache: {data}'.format(data=returned_data))
+                    log.debug('Execution Done: api.download')
+
+                return returned_data
+
+        resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects, session=session or self._session)
+
+        if resp is None:
+            if self._debug_mode:
+                log.debug('Returned data: None')
+                log.debug('Execution Done: api.download')
+
+            return None
 
         if self._debug_mode:
             log.debug('Response')
@@ -961,7 +974,8 @@ class API(object):
             log.debug('Response status code: {status_code}'.format(status_code=resp.status_code))
 
         if (code and not resp.status_code in code) or (check_data and not self.check_data(resp=resp)):
-            if not retry:
+            # an overloaded or failing server is not fixed by logging in again
+            if not retry or resp.status_code in SESSION_RETRY_STATUSES:
                 if self._debug_mode:
                     log.debug('Not retrying')
                     log.debug('Returned data: None')
@@ -972,7 +986,12 @@ class API(object):
             if self._debug_mode:
                 log.debug('Trying to update login data')
 
-            self.new_session(force=True, retry=False)
+            session_age = self._session_age
+
+            with _session_lock:
+                # a thread that waited on the lock finds the session already renewed by the one before it
+                if self._session_age == session_age:
+                    self.new_session(force=True, retry=False)
 
             if not self.logged_in:
                 if self._debug_mode:
@@ -982,13 +1001,14 @@ class API(object):
 
                 return None
 
-            if type == "post" and data:
-                if json_data:
-                    resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-                else:
-                    resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-            else:
-                resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+            resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects, session=session or self._session)
+
+            if resp is None:
+                if self._debug_mode:
+                    log.debug('Returned data: None')
+                    log.debug('Execution Done: api.download')
+
+                return None
 
             if self._debug_mode:
                 log.debug('Response')
@@ -1011,6 +1031,9 @@ class API(object):
                     except:
                         returned_data = resp.json()
 
+                    if cache_ttl:
+                        httpcache.set(url=url, data=returned_data, ttl=cache_ttl, headers=resp.headers)
+
                     if self._debug_mode:
                         log.debug('Returned data: {data}'.format(data=returned_data))
                         log.debug('Execution Done: api.download')
@@ -0,0 +1,106 @@
+import collections, hashlib, os, shutil, threading
+
+from resources.lib.base.constants import ADDON_PROFILE, PROXY_SEGMENT_DISK_SIZE, PROXY_SEGMENT_MEMORY_SIZE
+
+class SegmentCache(object):
+    def __init__(self, memory_size=PROXY_SEGMENT_MEMORY_SIZE, disk_size=PROXY_SEGMENT_DISK_SIZE, path=None):
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._memory_limit = memory_size
+        self._disk = collections.OrderedDict()
+        self._disk_size = 0
+        self._disk_limit = disk_size
+        self._path = path or os.path.join(ADDON_PROFILE, 'cache', 'segments')
+        self._lock = threading.Lock()
+
+        self.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_size = 0
+            self._disk.clear()
+            self._disk_size = 0
+
+        shutil.rmtree(self._path, ignore_errors=True)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                data = self._memory.pop(key)
+                self._memory[key] = data
+
+                return data
+
+            if not key in self._disk:
+                return None
+
+            file, size = self._disk.pop(key)
+            self._disk[key] = (file, size)
+
+        try:
+            with open(file, 'rb') as f:
+                return f.read()
+        except:
+            return None
+
+    def set(self, key, data):
+        if len(data) > self._memory_limit // 4:
+            return
+
+        spill = []
+
+        with self._lock:
+            if key in self._memory:
+                self._memory_size -= len(self._memory.pop(key))
+
+            self._memory[key] = data
+            self._memory_size += len(data)
+
+            while self._memory_size > self._memory_limit:
+                old_key, old_data = self._memory.popitem(last=False)
+                self._memory_size -= len(old_data)
+                spill.append((old_key, old_data))
+
+        # segments pushed out of memory stay on disk for seeking back, the files are written outside the lock
+        for old_key, old_data in spill:
+            self._spill(key=old_key, data=old_data)
+
+    def _spill(self, key, data):
+        if not self._disk_limit or len(data) > self._disk_limit:
+            return
+
+        file = os.path.join(self._path, hashlib.md5(key.encode('utf-8')).hexdigest())
+
+        try:
+            if not os.path.isdir(self._path):
+                os.makedirs(self._path)
+
+            with open(file, 'wb') as f:
+                f.write(data)
+        except:
+            return
+
+        remove = []
+
+        with self._lock:
+            if key in self._disk:
+                self._disk_size -= self._disk.pop(key)[1]
+
+            self._disk[key] = (file, len(data))
+            self._disk_size += len(data)
+
+            while self._disk_size > self._disk_limit:
+                old_key, (old_file, old_size) = self._disk.popitem(last=False)
+                self._disk_size -= old_size
+                remove.append(old_file)
+
+        for old_file in remove:
+            try:
+                os.remove(old_file)
+            except:
+                pass
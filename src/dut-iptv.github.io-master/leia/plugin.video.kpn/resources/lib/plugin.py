@@ -1,14 +1,13 @@
 import _strptime
 
-import datetime, json, pytz, random, string, sys, time, xbmc, xbmcplugin
+import calendar, datetime, json, random, string, sys, time, xbmc, xbmcplugin
 
-from fuzzywuzzy import fuzz
 from resources.lib.api import API
-from resources.lib.base import plugin, gui, signals, inputstream, settings
+from resources.lib.base import plugin, gui, signals, inputstream, replay, settings
 from resources.lib.base.constants import ADDON_ID
 from resources.lib.base.exceptions import Error
 from resources.lib.base.log import log
-from resources.lib.base.util import check_key, convert_datetime_timezone, date_to_nl_dag, date_to_nl_maand, get_credentials, load_file, write_file
+from resources.lib.base.util import check_key, convert_datetime_timezone, convert_timestamp_timezone, date_to_nl_dag, date_to_nl_maand, decode_cursor, encode_cursor, get_credentials, load_file, write_file
 from resources.lib.constants import CONST_IMAGE_URL, CONST_BASE_HEADERS
 from resources.lib.language import _
 
@@ -17,7 +16,7 @@ try:
 except NameError:
     unicode = str
 
-ADDON_HANDLE = int(sys.argv[1])
+ADDON_HANDLE = plugin._handle()
 api = API()
 backend = ''
 query_channel = {}
@@ -51,10 +50,10 @@ def home(**kwargs):
             log.debug('Setting showMoviesSeries: {moviesseries}'.format(moviesseries=settings.getBool('showMoviesSeries')))
 
         if settings.getBool('showMoviesSeries'):
-            folder.add_item(label=_(_.SERIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='series', label=_.SERIES, start=0))
-            folder.add_item(label=_(_.MOVIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='movies', label=_.MOVIES, start=0))
-            folder.add_item(label=_(_.KIDS_SERIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='kidsseries', label=_.KIDS_SERIES, start=0))
-            folder.add_item(label=_(_.KIDS_MOVIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='kidsmovies', label=_.KIDS_MOVIES, start=0))
+            folder.add_item(label=_(_.SERIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='series', label=_.SERIES))
+            folder.add_item(label=_(_.MOVIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='movies', label=_.MOVIES))
+            folder.add_item(label=_(_.KIDS_SERIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='kidsseries', label=_.KIDS_SERIES))
+            folder.add_item(label=_(_.KIDS_MOVIES, _bold=True), path=plugin.url_for(func_or_url=vod, file='kidsmovies', label=_.KIDS_MOVIES))
 
         folder.add_item(label=_(_.SEARCH, _bold=True), path=plugin.url_for(func_or_url=search_menu))
 
@@ -134,6 +133,7 @@ def login(**kwargs):
         log.debug('Execution Done: plugin.login')
 
 @plugin.route()
+@plugin.cache_listing(files=['channels.json', 'channel_prefs.json'], keys=['enable_simple_iptv'])
 def live_tv(**kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.live_tv')
@@ -161,6 +161,7 @@ def live_tv(**kwargs):
     return folder
 
 @plugin.route()
+@plugin.cache_listing(files=['channels.json', 'channel_prefs.json'])
 def replaytv(**kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.replaytv')
@@ -202,7 +203,7 @@ def replaytv_alphabetical(**kwargs):
     folder.add_item(
         label = label,
         info = {'plot': _.OTHERTITLESDESC},
-        path = plugin.url_for(func_or_url=replaytv_list, label=label, start=0, character='other'),
+        path = plugin.url_for(func_or_url=replaytv_list, label=label, character='other'),
     )
 
     for character in string.ascii_uppercase:
@@ -211,7 +212,7 @@ def replaytv_alphabetical(**kwargs):
         folder.add_item(
             label = label,
             info = {'plot': _.TITLESWITHDESC + character},
-            path = plugin.url_for(func_or_url=replaytv_list, label=label, start=0, character=character),
+            path = plugin.url_for(func_or_url=replaytv_list, label=label, character=character),
         )
 
     if _debug_mode:
@@ -220,32 +221,26 @@ def replaytv_alphabetical(**kwargs):
     return folder
 
 @plugin.route()
-def replaytv_list(character, label='', start=0, **kwargs):
+def replaytv_list(character, label='', cursor=None, **kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.replaytv_list')
-        log.debug('Vars: character={character}, label={label}, start={start}'.format(character=character, label=label, start=start))
+        log.debug('Vars: character={character}, label={label}, cursor={cursor}'.format(character=character, label=label, cursor=cursor))
 
-    start = int(start)
     folder = plugin.Folder(title=label)
 
-    data = load_file(file='list_replay.json', isJSON=True)
+    processed = process_replaytv_list(character=character, cursor=cursor)
 
-    if not data:
+    if not processed:
         gui.ok(message=_.NO_REPLAY_TV_INFO, heading=_.NO_REPLAY_TV_INFO)
         return folder
 
-    if not check_key(data, character):
-        return folder
-
-    processed = process_replaytv_list(data=data[character], start=start)
-
     if check_key(processed, 'items'):
         folder.add_items(processed['items'])
 
-    if check_key(processed, 'count') and len(data[character]) > processed['count']:
+    if check_key(processed, 'cursor'):
         folder.add_item(
             label = _(_.NEXT_PAGE, _bold=True),
-            path = plugin.url_for(func_or_url=replaytv_list, character=character, label=label, start=processed['count']),
+            path = plugin.url_for(func_or_url=replaytv_list, character=character, label=label, cursor=processed['cursor']),
         )
 
     if _debug_mode:
@@ -289,33 +284,25 @@ def replaytv_by_day(label='', image='', description='', station='', **kwargs):
     return folder
 
 @plugin.route()
-def replaytv_item(ids=None, label=None, start=0, **kwargs):
+def replaytv_item(ids=None, label=None, cursor=None, **kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.replaytv_item')
-        log.debug('Vars: ids={ids}, label={label}, start={start}'.format(ids=ids, label=label, start=start))
-
-    start = int(start)
-    first = label[0]
+        log.debug('Vars: ids={ids}, label={label}, cursor={cursor}'.format(ids=ids, label=label, cursor=cursor))
 
     folder = plugin.Folder(title=label)
 
-    if first.isalpha():
-        data = load_file(file=first + "_replay.json", isJSON=True)
-    else:
-        data = load_file(file='other_replay.json', isJSON=True)
+    processed = process_replaytv_list_content(ids=ids, cursor=cursor)
 
-    if not data:
+    if not processed:
         return folder
 
-    processed = process_replaytv_list_content(data=data, ids=ids, start=start)
-
     if check_key(processed, 'items'):
         folder.add_items(processed['items'])
 
-    if check_key(processed, 'totalrows') and check_key(processed, 'count') and processed['totalrows'] > processed['count']:
+    if check_key(processed, 'cursor'):
         folder.add_item(
             label = _(_.NEXT_PAGE, _bold=True),
-            path = plugin.url_for(func_or_url=replaytv_item, ids=ids, label=label, start=processed['count']),
+            path = plugin.url_for(func_or_url=replaytv_item, ids=ids, label=label, cursor=processed['cursor']),
         )
 
     if _debug_mode:
@@ -324,31 +311,28 @@ def replaytv_item(ids=None, label=None, start=0, **kwargs):
     return folder
 
 @plugin.route()
-def replaytv_content(label, day, station='', start=0, **kwargs):
+@plugin.cache_listing(files=['replay.db'])
+def replaytv_content(label, day, station='', cursor=None, **kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.replaytv_content')
-        log.debug('Vars: label={label}, day={day}, station={station}, start={start}'.format(label=label, day=day, station=station, start=start))
+        log.debug('Vars: label={label}, day={day}, station={station}, cursor={cursor}'.format(label=label, day=day, station=station, cursor=cursor))
 
     day = int(day)
-    start = int(start)
     folder = plugin.Folder(title=label)
 
-    data = load_file(file=station + "_replay.json", isJSON=True)
+    processed = process_replaytv_content(station=station, day=day, cursor=cursor)
 
-    if not data:
+    if not processed:
         gui.ok(_.DISABLE_ONLY_STANDARD, _.NO_REPLAY_TV_INFO)
         return folder
 
-    totalrows = len(data)
-    processed = process_replaytv_content(data=data, day=day, start=start)
-
     if check_key(processed, 'items'):
         folder.add_items(processed['items'])
 
-    if check_key(processed, 'count') and totalrows > processed['count']:
+    if check_key(processed, 'cursor'):
         folder.add_item(
             label = _(_.NEXT_PAGE, _bold=True),
-            path = plugin.url_for(func_or_url=replaytv_content, label=label, day=day, station=station, start=processed['count']),
+            path = plugin.url_for(func_or_url=replaytv_content, label=label, day=day, station=station, cursor=processed['cursor']),
         )
 
     if _debug_mode:
@@ -357,12 +341,12 @@ def replaytv_content(label, day, station='', start=0, **kwargs):
     return folder
 
 @plugin.route()
-def vod(file, label, start=0, **kwargs):
+@plugin.cache_listing(files=['vod.json'])
+def vod(file, label, cursor=None, **kwargs):
     if _debug_mode:
         log.debug('Executing: plugin.vod')
-        log.debug('Vars: file={file}, label={label}, start={start}'.format(file=file, label=label, start=start))
+        log.debug('Vars: file={file}, label={label}, cursor={cursor}'.format(file=file, label=label, cursor=cursor))
 
-    start = int(start)
     folder = plugin.Folder(title=label)
 
     data = load_file(file='vod.json', isJSON=True)[file]
@@ -370,15 +354,15 @@ def vod(file, label, start=0, **kwargs):
     if not data:
         return folder
 
-    processed = process_vod_content(data=data, start=start, type=label)
+    processed = process_vod_content(data=data, cursor=cursor, type=label)
 
     if check_key(processed, 'items'):
         folder.add_items(processed['items'])
 
-    if check_key(processed, 'count') and len(data) > processed['count']:
+    if check_key(processed, 'cursor'):
         folder.add_item(
             label = _(_.NEXT_PAGE, _bold=True),
-            path = plugin.url_for(func_or_url=vod, file=file, label=label, start=processed['count']),
+            path = plugin.url_for(func_or_url=vod, file=file, label=label, cursor=processed['cursor']),
         )
 
     if _debug_mode:
@@ -507,18 +491,17 @@ def search(query=None, **kwargs):
 
     folder = plugin.Folder(title=_(_.SEARCH_FOR, query=query))
 
-    data = load_file(file='list_replay.json', isJSON=True)
-    processed = process_replaytv_search(data=data, start=0, search=query)
+    processed = process_replaytv_search(search=query)
     items += processed['items']
 
     if settings.getBool('showMoviesSeries'):
-        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['series'], start=0, search=query, type=_.SERIES)
+        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['series'], search=query, type=_.SERIES)
         items += processed['items']
-        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['movies'], start=0, search=query, type=_.MOVIES)
+        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['movies'], search=query, type=_.MOVIES)
         items += processed['items']
-        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['kidsseries'], start=0, search=query, type=_.KIDS_SERIES)
+        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['kidsseries'], search=query, type=_.KIDS_SERIES)
         items += processed['items']
-        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['kidsmovies'], start=0, search=query, type=_.KIDS_MOVIES)
+        processed = process_vod_content(data=load_file(file='vod.json', isJSON=True)['kidsmovies'], search=query, type=_.KIDS_MOVIES)
         items += processed['items']
 
     items[:] = sorted(items, key=_sort_replay_items, reverse=True)
@@ -651,6 +634,8 @@ def test_channel(channel, **kwargs):
             api._abortRequested = True
             break
 
+        settings.invalidate()
+
     if api._abortRequested or xbmc.Monitor().abortRequested():
         return None
 
@@ -763,7 +748,7 @@ def play_video(type=None, channel=None, id=None, title=None, from_beginning='Fal
     if not playdata or not check_key(playdata, 'path') or not check_key(playdata, 'token'):
         return False
 
-    CDMHEADERS = CONST_BASE_HEADERS
+    CDMHEADERS = dict(CONST_BASE_HEADERS)
     CDMHEADERS['User-Agent'] = _user_agent
 
     if type == 'channel':
@@ -1037,36 +1022,22 @@ def get_replay_channels(retry=True):
 
     return channels
 
-def process_replaytv_list(data, start=0):
+def process_replaytv_list(character, cursor=None):
     if _debug_mode:
         log.debug('Executing: plugin.process_replaytv_list')
-        log.debug('Vars: data={data}, start={start}'.format(data=data, start=start))
+        log.debug('Vars: character={character}, cursor={cursor}'.format(character=character, cursor=cursor))
 
     prefs = load_file(file="channel_prefs.json", isJSON=True)
-    start = int(start)
-    items = []
-    count = 0
-    item_count = 0
     time_now = int((datetime.datetime.utcnow() - datetime.datetime(1970, 1, 1)).total_seconds())
 
-    for row in sorted(data):
-        currow = data[row]
-
-        if item_count == 51:
-            break
-
-        if count < start:
-            count += 1
-            continue
-
-        count += 1
+    data = replay.get_titles(letter=character, now=time_now, after=decode_cursor(cursor), limit=52, hide_adult=False)
 
-        if not check_key(currow, 'orig') or not check_key(currow, 'ids'):
-            continue
+    if data is None:
+        return None
 
-        if check_key(currow, 'a') and check_key(currow, 'e') and (time_now < int(currow['a']) or time_now > int(currow['e'])):
-            continue
+    items = []
 
+    for currow in data[:51]:
         if check_key(currow, 'cn') and prefs and check_key(prefs, unicode(currow['cn'])) and prefs[unicode(currow['cn'])]['replay'] == 'false':
             continue
 
@@ -1074,12 +1045,10 @@ def process_replaytv_list(data, start=0):
 
         items.append(plugin.Item(
             label = label,
-            path = plugin.url_for(func_or_url=replaytv_item, ids=json.dumps(currow['ids']), label=label, start=0),
+            path = plugin.url_for(func_or_url=replaytv_item, ids=currow['ids'], label=label),
         ))
 
-        item_count += 1
-
-    returnar = {'items': items, 'count': count}
+    returnar = {'items': items, 'cursor': encode_cursor(data[50]['name']) if len(data) > 51 else None}
 
     if _debug_mode:
         log.debug('Returned Data: {returnar}'.format(returnar=returnar))
@@ -1087,58 +1056,38 @@ def process_replaytv_list(data, start=0):
 
     return returnar
 
-def process_replaytv_search(data, start=0, search=None):
+def process_replaytv_search(search):
+    from fuzzywuzzy import process
+
     if _debug_mode:
         log.debug('Executing: plugin.process_replaytv_search')
-        log.debug('Vars: data={data}, start={start}, search={search}'.format(data=data, start=start, search=search))
+        log.debug('Vars: search={search}'.format(search=search))
 
     prefs = load_file(file="channel_prefs.json", isJSON=True)
-    start = int(start)
     items = []
-    count = 0
-    item_count = 0
     time_now = int((datetime.datetime.utcnow() - datetime.datetime(1970, 1, 1)).total_seconds())
 
-    for row in data:
-        letter_row = data[row]
-
-        for row2 in letter_row:
-            currow = data[row][row2]
-
-            if item_count == 51:
-                break
-
-            if count < start:
-                count += 1
-                continue
+    data = replay.search_titles(query=search, now=time_now, hide_adult=False)
 
-            count += 1
-
-            if not check_key(currow, 'orig') or not check_key(currow, 'ids'):
-                continue
-
-            if check_key(currow, 'a') and check_key(currow, 'e') and (time_now < int(currow['a']) or time_now > int(currow['e'])):
-                continue
-
-            if check_key(currow, 'cn') and prefs and check_key(prefs, unicode(currow['cn'])) and prefs[unicode(currow['cn'])]['replay'] == 'false':
-                continue
+    if not data:
+        data = []
 
-            label = currow['orig'] + ' (ReplayTV)'
+    data = [currow for currow in data if not (check_key(currow, 'cn') and prefs and check_key(prefs, unicode(currow['cn'])) and prefs[unicode(currow['cn'])]['replay'] == 'false')]
 
-            fuzz_set = fuzz.token_set_ratio(label, search)
-            fuzz_partial = fuzz.partial_ratio(label, search)
-            fuzz_sort = fuzz.token_sort_ratio(label, search)
+    for currow, scores in process.extractRatios(query=search, choices=data, processor=_replay_search_label, score_cutoff=161):
+        if len(items) == 51:
+            break
 
-            if (fuzz_set + fuzz_partial + fuzz_sort) > 160:
-                items.append(plugin.Item(
-                    label = label,
-                    properties = {"fuzz_set": fuzz_set, "fuzz_sort": fuzz_sort, "fuzz_partial": fuzz_partial, "fuzz_total": fuzz_set + fuzz_partial + fuzz_sort},
-                    path = plugin.url_for(func_or_url=replaytv_item, ids=json.dumps(currow['ids']), label=label, start=0),
-                ))
+        label = _replay_search_label(currow)
+        fuzz_set, fuzz_partial, fuzz_sort = scores
 
-                item_count += 1
+        items.append(plugin.Item(
+            label = label,
+            properties = {"fuzz_set": fuzz_set, "fuzz_sort": fuzz_sort, "fuzz_partial": fuzz_partial, "fuzz_total": fuzz_set + fuzz_partial + fuzz_sort},
+            path = plugin.url_for(func_or_url=replaytv_item, ids=currow['ids'], label=label),
+        ))
 
-    returnar = {'items': items, 'count': count}
+    returnar = {'items': items}
 
     if _debug_mode:
         log.debug('Returned Data: {returnar}'.format(returnar=returnar))
@@ -1146,71 +1095,44 @@ def process_replaytv_search(data, start=0, search=None):
 
     return returnar
 
-def process_replaytv_content(data, day=0, start=0):
+def process_replaytv_content(station, day=0, cursor=None):
     if _debug_mode:
         log.debug('Executing: plugin.process_replaytv_content')
-        log.debug('Vars: data={data}, day={day}, start={start}'.format(data=data, day=day, start=start))
+        log.debug('Vars: station={station}, day={day}, cursor={cursor}'.format(station=station, day=day, cursor=cursor))
 
     day = int(day)
-    start = int(start)
     curdate = datetime.date.today() - datetime.timedelta(days=day)
 
     startDate = convert_datetime_timezone(datetime.datetime(curdate.year, curdate.month, curdate.day, 0, 0, 0), "Europe/Amsterdam", "UTC")
     endDate = convert_datetime_timezone(datetime.datetime(curdate.year, curdate.month, curdate.day, 23, 59, 59), "Europe/Amsterdam", "UTC")
-    startTime = startDate.strftime("%Y%m%d%H%M%S")
-    endTime = endDate.strftime("%Y%m%d%H%M%S")
-
-    items = []
-    count = 0
-    item_count = 0
+    startTime = calendar.timegm(startDate.utctimetuple())
+    endTime = calendar.timegm(endDate.utctimetuple())
+    minEnd = int(time.time()) - 7 * 86400
 
-    for row in data:
-        currow = data[row]
+    data = replay.get_channel_programs(channel=station, start_time=startTime, end_time=endTime, min_end=minEnd, after=decode_cursor(cursor), limit=52, hide_adult=False)
 
-        if item_count == 51:
-            break
-
-        if count < start:
-            count += 1
-            continue
-
-        count += 1
-
-        if not check_key(currow, 's') or not check_key(currow, 't') or not check_key(currow, 'c') or not check_key(currow, 'e'):
-            continue
-
-        startsplit = unicode(currow['s'].split(' ', 1)[0])
-        endsplit = unicode(currow['e'].split(' ', 1)[0])
-
-        if not startsplit.isdigit() or not len(startsplit) == 14 or startsplit < startTime or not endsplit.isdigit() or not len(endsplit) == 14 or startsplit >= endTime:
-            continue
+    if data is None:
+        return None
 
-        startT = datetime.datetime.fromtimestamp(time.mktime(time.strptime(startsplit, "%Y%m%d%H%M%S")))
-        startT = convert_datetime_timezone(startT, "UTC", "Europe/Amsterdam")
-        endT = datetime.datetime.fromtimestamp(time.mktime(time.strptime(endsplit, "%Y%m%d%H%M%S")))
-        endT = convert_datetime_timezone(endT, "UTC", "Europe/Amsterdam")
+    items = []
 
-        if endT < (datetime.datetime.now(pytz.timezone("Europe/Amsterdam")) - datetime.timedelta(days=7)):
-            continue
+    for currow in data[:51]:
+        startT = convert_timestamp_timezone(currow['s'], "Europe/Amsterdam")
 
-        label = startT.strftime("%H:%M") + " - " + currow['t']
+        label = '{hour:02d}:{minute:02d}'.format(hour=startT // 3600 % 24, minute=startT // 60 % 60) + " - " + currow['t']
         description = ''
-        channel = ''
         program_image = ''
         program_image_large = ''
 
         if check_key(currow, 'desc'):
             description = currow['desc']
 
-        duration = int((endT - startT).total_seconds())
+        duration = currow['e'] - currow['s']
 
         if check_key(currow, 'i'):
             program_image = currow['i'].replace(_img_size, '1920x1080')
             program_image_large = currow['i'].replace(_img_size, '1920x1080')
 
-        if check_key(currow, 'c'):
-            channel = currow['c']
-
         items.append(plugin.Item(
             label = label,
             info = {
@@ -1222,13 +1144,11 @@ def process_replaytv_content(data, day=0, start=0):
                 'thumb': program_image,
                 'fanart': program_image_large
             },
-            path = plugin.url_for(func_or_url=play_video, type='program', channel=channel, id=row, duration=duration, _is_live=False),
+            path = plugin.url_for(func_or_url=play_video, type='program', channel=currow['c'], id=currow['id'], duration=duration, _is_live=False),
             playable = True,
         ))
 
-        item_count += 1
-
-    returnar = {'items': items, 'count': count}
+    returnar = {'items': items, 'cursor': encode_cursor(data[50]['s'], data[50]['id']) if len(data) > 51 else None}
 
     if _debug_mode:
         log.debug('Returned Data: {returnar}'.format(returnar=returnar))
@@ -1236,55 +1156,32 @@ def process_replaytv_content(data, day=0, start=0):
 
     return returnar
 
-def process_replaytv_list_content(data, ids, start=0):
+def process_replaytv_list_content(ids, cursor=None):
     if _debug_mode:
         log.debug('Executing: plugin.process_replaytv_list_content')
-        log.debug('Vars: data={data}, ids={ids}, start={start}'.format(data=data, ids=ids, start=start))
+        log.debug('Vars: ids={ids}, cursor={cursor}'.format(ids=ids, cursor=cursor))
 
-    start = int(start)
-    items = []
-    count = 0
-    item_count = 0
+    maxStart = int(time.time())
+    minEnd = maxStart - 7 * 86400
 
-    ids = json.loads(ids)
-    totalrows = len(ids)
+    data = replay.get_programs_by_ids(ids=json.loads(ids), max_start=maxStart, min_end=minEnd, after=decode_cursor(cursor), limit=52, hide_adult=False)
 
-    for id in ids:
-        currow = data[id]
-
-        if item_count == 51:
-            break
-
-        if count < start:
-            count += 1
-            continue
-
-        count += 1
-
-        if not check_key(currow, 's') or not check_key(currow, 't') or not check_key(currow, 'c') or not check_key(currow, 'e'):
-            continue
-
-        startsplit = unicode(currow['s'].split(' ', 1)[0])
-        endsplit = unicode(currow['e'].split(' ', 1)[0])
+    if data is None:
+        return None
 
-        if not startsplit.isdigit() or not len(startsplit) == 14 or not endsplit.isdigit() or not len(endsplit) == 14:
-            continue
+    items = []
 
-        startT = datetime.datetime.fromtimestamp(time.mktime(time.strptime(startsplit, "%Y%m%d%H%M%S")))
-        startT = convert_datetime_timezone(startT, "UTC", "Europe/Amsterdam")
-        endT = datetime.datetime.fromtimestamp(time.mktime(time.strptime(endsplit, "%Y%m%d%H%M%S")))
-        endT = convert_datetime_timezone(endT, "UTC", "Europe/Amsterdam")
+    nl = xbmc.getLanguage(xbmc.ISO_639_1) == 'nl'
 
-        if startT > datetime.datetime.now(pytz.timezone("Europe/Amsterdam")) or endT < (datetime.datetime.now(pytz.timezone("Europe/Amsterdam")) - datetime.timedelta(days=7)):
-            continue
+    for currow in data[:51]:
+        startT = datetime.datetime.utcfromtimestamp(convert_timestamp_timezone(currow['s'], "Europe/Amsterdam"))
 
-        if xbmc.getLanguage(xbmc.ISO_639_1) == 'nl':
+        if nl:
             itemlabel = '{weekday} {day} {month} {yearhourminute} '.format(weekday=date_to_nl_dag(startT), day=startT.strftime("%d"), month=date_to_nl_maand(startT), yearhourminute=startT.strftime("%Y %H:%M"))
         else:
             itemlabel = startT.strftime("%A %d %B %Y %H:%M ").capitalize()
 
-        itemlabel += currow['t'] + " (" + currow['cn'] + ")"
-        channel = ''
+        itemlabel += currow['t'] + " (" + (currow['cn'] or '') + ")"
         description = ''
         program_image = ''
         program_image_large = ''
@@ -1292,15 +1189,12 @@ def process_replaytv_list_content(data, ids, start=0):
         if check_key(currow, 'desc'):
             description = currow['desc']
 
-        duration = int((endT - startT).total_seconds())
+        duration = currow['e'] - currow['s']
 
         if check_key(currow, 'i'):
             program_image = currow['i'].replace(_img_size, '1920x1080')
             program_image_large = currow['i'].replace(_img_size, '1920x1080')
 
-        if check_key(currow, 'c'):
-            channel = currow['c']
-
         items.append(plugin.Item(
             label = itemlabel,
             info = {
@@ -1312,13 +1206,11 @@ def process_replaytv_list_content(data, ids, start=0):
                 'thumb': program_image,
                 'fanart': program_image_large
             },
-            path = plugin.url_for(func_or_url=play_video, type='program', channel=channel, id=id, duration=duration, _is_live=False),
+            path = plugin.url_for(func_or_url=play_video, type='program', channel=currow['c'], id=currow['id'], duration=duration, _is_live=False),
             playable = True,
         ))
 
-        item_count = item_count + 1
-
-    returnar = {'items': items, 'totalrows': totalrows, 'count': count}
+    returnar = {'items': items, 'cursor': encode_cursor(data[50]['s'], data[50]['id']) if len(data) > 51 else None}
 
     if _debug_mode:
         log.debug('Returned Data: {returnar}'.format(returnar=returnar))
@@ -1326,30 +1218,38 @@ def process_replaytv_list_content(data, ids, start=0):
 
     return returnar
 
-def process_vod_content(data, start=0, search=None, type=None):
+def process_vod_content(data, cursor=None, search=None, type=None):
+    from fuzzywuzzy import process
+
     if _debug_mode:
         log.debug('Executing: plugin.process_vod_content')
-        log.debug('Vars: data={data}, start={start}, search={search}, type={type}'.format(data=data, start=start, search=search, type=type))
+        log.debug('Vars: data={data}, cursor={cursor}, search={search}, type={type}'.format(data=data, cursor=cursor, search=search, type=type))
 
     subscription = load_file(file='vod_subscription.json', isJSON=True)
-    start = int(start)
+    after = decode_cursor(cursor)
+    start = int(after[0]) if after else 0
     items = []
-    count = 0
-    item_count = 0
+    count = start
+    rows = enumerate(data[start:], start)
+
+    if search:
+        rows = process.extractRatios(query=search, choices=rows, processor=_vod_search_label, score_cutoff=161)
 
     if sys.version_info >= (3, 0):
         subscription = list(subscription)
 
-    for row in data:
-        currow = row
-
-        if item_count == 50:
+    for row in rows:
+        if len(items) == 50:
             break
 
-        if count < start:
-            count += 1
-            continue
+        properties = {}
+
+        if search:
+            row, scores = row
+            fuzz_set, fuzz_partial, fuzz_sort = scores
+            properties = {"fuzz_set": fuzz_set, "fuzz_sort": fuzz_sort, "fuzz_partial": fuzz_partial, "fuzz_total": fuzz_set + fuzz_partial + fuzz_sort}
 
+        count, currow = row
         count += 1
 
         if not check_key(currow, 'id') or not check_key(currow, 'title'):
@@ -1362,21 +1262,12 @@ def process_vod_content(data, start=0, search=None, type=None):
             continue
 
         if search:
-            fuzz_set = fuzz.token_set_ratio(label,search)
-            fuzz_partial = fuzz.partial_ratio(label,search)
-            fuzz_sort = fuzz.token_sort_ratio(label,search)
-
-            if (fuzz_set + fuzz_partial + fuzz_sort) > 160:
-                properties = {"fuzz_set": fuzz.token_set_ratio(label,search), "fuzz_sort": fuzz.token_sort_ratio(label,search), "fuzz_partial": fuzz.partial_ratio(label,search), "fuzz_total": fuzz.token_set_ratio(label,search) + fuzz.partial_ratio(label,search) + fuzz.token_sort_ratio(label,search)}
-                label = label + " (" + type + ")"
-            else:
-                continue
+            label = label + " (" + type + ")"
 
         description = ''
         program_image = ''
         program_image_large = ''
         duration = 0
-        properties = []
 
         if check_key(currow, 'desc'):
             description = currow['desc']
@@ -1412,9 +1303,7 @@ def process_vod_content(data, start=0, search=None, type=None):
             playable = playable,
         ))
 
-        item_count += 1
-
-    returnar = {'items': items, 'count': count}
+    returnar = {'items': items, 'cursor': encode_cursor(count) if len(data) > count else None}
 
     if _debug_mode:
         log.debug('Returned Data: {returnar}'.format(returnar=returnar))
@@ -1425,5 +1314,14 @@ def process_vod_content(data, start=0, search=None, type=None):
 def _sort_live(element):
     return element['chno']
 
+def _replay_search_label(row):
+    return row['orig'] + ' (ReplayTV)'
+
 def _sort_replay_items(element):
-    return element.get_li().getProperty('fuzz_total')
\ No newline at end of file
+    return element.get_li().getProperty('fuzz_total')
+
+def _vod_search_label(row):
+    if not check_key(row[1], 'id') or not check_key(row[1], 'title'):
+        return None
+
+    return row[1]['title']
@@ -16,6 +16,12 @@ CONST_BASE_HEADERS = {
 }
 
 CONST_BASE_URL = 'https://www.nlziet.nl'
+
+CONST_CACHE_TTL = [
+    (r'/v6/epg/channels$', 86400),
+    (r'/v6/search/', 600),
+]
+
 CONST_EPG = 'https://dut-epg.github.io/n.epg.xml.zip'
 CONST_IMAGES = 'https://dut-epg.github.io/n.images.zip'
 CONST_IMAGE_URL = 'https://nlzietprodstorage.blob.core.windows.net'
@@ -1,15 +1,46 @@
-import time, os, re, requests, sys, threading, xbmc, xbmcaddon
+import collections, time, os, re, requests, sys, threading, xbmc, xbmcaddon
 
 try:
     import http.server as ProxyServer
 except ImportError:
     import BaseHTTPServer as ProxyServer
 
-from resources.lib.base import settings
-from resources.lib.base.constants import ADDON_ID, ADDON_PATH, ADDON_PROFILE
+try:
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from SocketServer import ThreadingMixIn
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from resources.lib.base import mpd, settings
+from resources.lib.base.constants import ADDON_ID, ADDON_PATH, ADDON_PROFILE, PROXY_PREFETCH_SEGMENTS, PROXY_PREFETCH_WORKERS
 from resources.lib.base.log import log
+from resources.lib.base.segments import SegmentCache
 from resources.lib.base.session import Session
-from resources.lib.base.util import force_highest_bandwidth, set_duration
+
+CONST_MANIFEST_CACHE_SIZE = 16
+CONST_SEGMENT_INDEX_SIZE = 4
+
+def get_options():
+    return (settings.getInt(key='_stream_duration'), settings.getInt(key='add_duration'), settings.getBool(key='force_highest_bandwidth'))
+
+def get_url(host, path):
+    return host + path
+
+def rewrite_manifest(xml, options):
+    duration, add_duration, highest = options
+    transforms = []
+
+    if duration and duration > 0:
+        transforms.append(mpd.set_duration(duration=duration + add_duration))
+
+    if highest:
+        transforms.append(mpd.force_highest_bandwidth)
+
+    return mpd.rewrite(xml=xml, transforms=transforms)
 
 class HTTPMonitor(xbmc.Monitor):
     def __init__(self, addon):
@@ -17,6 +48,8 @@ class HTTPMonitor(xbmc.Monitor):
         self.addon = addon
 
 class HTTPRequestHandler(ProxyServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
     def do_GET(self):
         try:
             self._stream_url
@@ -24,59 +57,291 @@ class HTTPRequestHandler(ProxyServer.BaseHTTPRequestHandler):
             self._stream_url = settings.get(key='_stream_hostname')
 
         if ".mpd" in self.path:
+            # a new manifest means playback was just set up by the add-on, its stream settings are read fresh
+            settings.invalidate()
             self._stream_url = settings.get(key='_stream_hostname')
 
-            session = Session(cookies_key='_cookies')
-            r = session.get(self._stream_url + str(self.path))
-
-            xml = r.text
-
-            xml = set_duration(xml=xml)
-
-            if settings.getBool(key='force_highest_bandwidth'):
-                xml = force_highest_bandwidth(xml=xml)
-
-            self.send_response(r.status_code)
+            status, headers, xml = self.server.get_manifest(host=self._stream_url, path=str(self.path), options=get_options(), prefetch=settings.getBool(key='enable_prefetch'))
 
-            r.headers['Content-Length'] = len(xml)
+            self.send_response(status)
 
-            for header in r.headers:
-                if not 'Content-Encoding' in header and not 'Transfer-Encoding' in header:
-                    self.send_header(header, r.headers[header])
+            for header, value in headers:
+                self.send_header(header, value)
 
+            self.send_header('Content-Length', len(xml))
             self.end_headers()
 
-            try:
-                xml = xml.encode('utf-8')
-            except:
-                pass
-
             try:
                 self.wfile.write(xml)
             except:
                 pass
         else:
-            self._now_playing = time.time()
+            self.server.set_playing()
 
-            try:
-                if self._last_playing + 60 < self._now_playing:
-                    self._last_playing = time.time()
-                    settings.setInt(key='_last_playing', value=self._last_playing)
-            except:
-                self._last_playing = time.time()
-                settings.setInt(key='_last_playing', value=self._last_playing)
+            data = None
 
-            self.send_response(302)
-            self.send_header('Location', self._stream_url + str(self.path))
-            self.end_headers()
+            if not 'Range' in self.headers:
+                data = self.server.get_segment(path=str(self.path))
+
+            if data is None:
+                self.send_response(302)
+                self.send_header('Location', get_url(host=self._stream_url, path=str(self.path)))
+                self.send_header('Content-Length', 0)
+                self.end_headers()
+            else:
+                self.send_response(200)
+                self.send_header('Content-Length', len(data))
+                self.end_headers()
+
+                try:
+                    self.wfile.write(data)
+                except:
+                    pass
 
     def log_message(self, format, *args):
         return
 
-class HTTPServer(ProxyServer.HTTPServer):
+class HTTPServer(ThreadingMixIn, ProxyServer.HTTPServer):
+    daemon_threads = True
+
     def __init__(self, addon, server_address):
         ProxyServer.HTTPServer.__init__(self, server_address, HTTPRequestHandler)
         self.addon = addon
+        self._cookies = None
+        self._last_playing = 0
+        self._manifests = {}
+        self._manifests_lock = threading.Lock()
+        self._downloads = {}
+        self._downloads_lock = threading.Lock()
+        self._prefetch_queue = queue.Queue()
+        self._prefetch_workers = []
+        self._segment_cache = SegmentCache()
+        self._segments = collections.OrderedDict()
+        self._segments_lock = threading.Lock()
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    def get_session(self):
+        cookies = settings.get(key='_cookies')
+
+        with self._session_lock:
+            if not self._session:
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+
+                self._session = Session(cookies_key='_cookies')
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+            elif cookies != self._cookies:
+                self._session.cookies.clear()
+                self._session.cookies.update(settings.getDict('_cookies', {}))
+
+            self._cookies = cookies
+
+        return self._session
+
+    def download_segment(self, host, path, headers=None):
+        key = host + path
+        data = self._segment_cache.get(key)
+
+        if data is not None:
+            return data
+
+        # a segment the player asks for while it is being prefetched is not downloaded twice
+        with self._downloads_lock:
+            download = self._downloads.get(key)
+            fetch = not download
+
+            if fetch:
+                download = {'data': None, 'ready': threading.Event()}
+                self._downloads[key] = download
+
+        if fetch:
+            try:
+                r = self.get_session().get(get_url(host=host, path=path), headers=headers)
+
+                if r.status_code == 200:
+                    download['data'] = r.content
+                    self._segment_cache.set(key, r.content)
+            except:
+                log.debug('Failed to download segment {path}'.format(path=path))
+            finally:
+                with self._downloads_lock:
+                    del self._downloads[key]
+
+                download['ready'].set()
+        else:
+            download['ready'].wait()
+
+        return download['data']
+
+    def get_manifest(self, host, path, options, prefetch, headers=None):
+        url = get_url(host=host, path=path)
+        now = time.time()
+
+        # players asking for the same manifest share the upstream request already underway instead of starting their own
+        with self._manifests_lock:
+            manifest = self._manifests.get(url)
+            fetch = not manifest or (manifest['ready'].is_set() and manifest['expires'] < now)
+
+            if fetch:
+                manifest = {
+                    'expires': now,
+                    'headers': [],
+                    'lock': threading.Lock(),
+                    'options': None,
+                    'prefetch': None,
+                    'ready': threading.Event(),
+                    'status': 502,
+                    'text': '',
+                    'xml': None,
+                }
+
+                self._manifests[url] = manifest
+
+        if fetch:
+            try:
+                r = self.get_session().get(url, headers=headers)
+
+                manifest['status'] = r.status_code
+                manifest['headers'] = [(header, r.headers[header]) for header in r.headers if not header.lower() in ('connection', 'content-encoding', 'content-length', 'keep-alive', 'transfer-encoding')]
+                manifest['text'] = r.text
+
+                if r.status_code == 200:
+                    timing = mpd.get_timing(manifest['text'])
+
+                    # a live manifest stays valid until the player is told to refresh it
+                    if timing['type'] == 'dynamic':
+                        manifest['expires'] = time.time() + timing['minimumUpdatePeriod']
+            except:
+                log.exception('Failed to download manifest')
+            finally:
+                manifest['ready'].set()
+                self.prune_manifests()
+        else:
+            manifest['ready'].wait()
+
+        with manifest['lock']:
+            if manifest['options'] != options or manifest['prefetch'] != prefetch:
+                xml = rewrite_manifest(xml=manifest['text'], options=options)
+                segments = []
+
+                if prefetch and manifest['status'] == 200:
+                    try:
+                        segments = mpd.get_segments(xml=xml, path=path)
+                    except:
+                        log.exception('Failed to index manifest segments')
+
+                self.set_segments(url=url, host=host, segments=segments, headers=headers)
+
+                try:
+                    xml = xml.encode('utf-8')
+                except:
+                    pass
+
+                manifest['options'] = options
+                manifest['prefetch'] = prefetch
+                manifest['xml'] = xml
+
+            return manifest['status'], manifest['headers'], manifest['xml']
+
+    def get_segment(self, path, headers=None):
+        with self._segments_lock:
+            for host, manifest_headers, index in reversed(list(self._segments.values())):
+                if path in index:
+                    break
+            else:
+                return None
+
+        paths, position = index[path]
+        data = self.download_segment(host=host, path=path, headers=headers or manifest_headers)
+
+        if data is not None:
+            for next_path in paths[position + 1:position + 1 + PROXY_PREFETCH_SEGMENTS]:
+                self.prefetch_segment(host=host, path=next_path, headers=manifest_headers)
+
+        return data
+
+    def prefetch_segment(self, host, path, headers=None):
+        key = host + path
+
+        if key in self._segment_cache:
+            return
+
+        with self._downloads_lock:
+            if key in self._downloads:
+                return
+
+            if len(self._prefetch_workers) < PROXY_PREFETCH_WORKERS:
+                worker = threading.Thread(target=self.prefetch_worker)
+                worker.daemon = True
+                worker.start()
+                self._prefetch_workers.append(worker)
+
+        self._prefetch_queue.put((host, path, headers))
+
+    def prefetch_worker(self):
+        while True:
+            job = self._prefetch_queue.get()
+
+            if job is None:
+                break
+
+            host, path, headers = job
+            key = host + path
+
+            if key in self._segment_cache:
+                continue
+
+            self.download_segment(host=host, path=path, headers=headers)
+
+    def prune_manifests(self):
+        now = time.time()
+
+        with self._manifests_lock:
+            for url in list(self._manifests):
+                if self._manifests[url]['ready'].is_set() and self._manifests[url]['expires'] < now:
+                    del self._manifests[url]
+
+            while len(self._manifests) > CONST_MANIFEST_CACHE_SIZE:
+                del self._manifests[min(self._manifests, key=lambda url: self._manifests[url]['expires'])]
+
+    def set_playing(self):
+        now = time.time()
+
+        if self._last_playing + 60 < now:
+            self._last_playing = now
+            settings.setInt(key='_last_playing', value=now)
+
+    def set_segments(self, url, host, segments, headers=None):
+        index = {}
+
+        # every listed segment knows the ones after it in the same representation, those are prefetched once it is played
+        for paths in segments:
+            for position, path in enumerate(paths):
+                index[path] = (paths, position)
+
+        with self._segments_lock:
+            self._segments.pop(url, None)
+
+            if index:
+                self._segments[url] = (host, headers, index)
+
+            while len(self._segments) > CONST_SEGMENT_INDEX_SIZE:
+                self._segments.popitem(last=False)
+
+    def server_close(self):
+        ProxyServer.HTTPServer.server_close(self)
+
+        for worker in self._prefetch_workers:
+            self._prefetch_queue.put(None)
+
+        self._prefetch_workers = []
+        self._segment_cache.clear()
+
+        with self._session_lock:
+            if self._session:
+                self._session.close()
+                self._session = None
 
 class RemoteControlBrowserService(xbmcaddon.Addon):
     def __init__(self):
@@ -124,6 +389,7 @@ class RemoteControlBrowserService(xbmcaddon.Addon):
     def stopHTTPServer(self):
         if self.HTTPServer is not None:
             self.HTTPServer.shutdown()
+            self.HTTPServer.server_close()
             self.HTTPServer = None
         if self.HTTPServerThread is not None:
             self.HTTPServerThread.join()
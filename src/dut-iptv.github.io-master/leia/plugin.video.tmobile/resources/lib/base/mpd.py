@@ -0,0 +1,313 @@
+import math, re
+
+from xml.sax.saxutils import unescape
+from resources.lib.base.log import log
+
+try:
+    from urllib.parse import urljoin
+except ImportError:
+    from urlparse import urljoin
+
+_TOKEN = re.compile(r'<(?:!--.*?-->|(/?)([mM][pP][dD]|[pP]eriod|[aA]daptation[sS]et|[rR]epresentation)(?=[\s/>])[^>]*>)', re.S)
+_SEGMENT_TOKEN = re.compile(r'<(?:!--.*?-->|(/?)([mM][pP][dD]|[pP]eriod|[aA]daptation[sS]et|[rR]epresentation|[bB]ase[uU][rR][lL]|[sS]egment[tT]emplate|[sS]egment[tT]imeline|[sS])(?=[\s/>])[^>]*>)', re.S)
+_ATTR = re.compile(r'([^\s=/<>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_MPD = re.compile(r'<[mM][pP][dD](?=[\s/>])[^>]*>')
+_BANDWIDTH = re.compile(r'bandwidth="([0-9]+)"')
+_DURATION = re.compile(r'^P(?:([0-9.]+)D)?(?:T(?:([0-9.]+)H)?(?:([0-9.]+)M)?(?:([0-9.]+)S)?)?$')
+_TEMPLATE = re.compile(r'\$(RepresentationID|Number|Bandwidth|Time)(?:%0([0-9]+)d)?\$|\$\$')
+_UNESCAPE = {'&quot;': '"', '&apos;': "'"}
+
+CONST_MAX_SEGMENTS = 20000
+
+class Element(object):
+    def __init__(self, name, start, tag_end, attrs, parent):
+        self.name = name
+        self.start = start
+        self.tag_end = tag_end
+        self.close = tag_end
+        self.end = tag_end
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+class Manifest(object):
+    def __init__(self, xml, token=_TOKEN):
+        self.xml = xml
+        self.elements = []
+        self._token = token
+        self._parse()
+
+    def find(self, name):
+        return [element for element in self.elements if element.name == name]
+
+    def _parse(self):
+        # only the elements transforms work on are tokenized, everything in between is skipped by the regex engine
+        stack = []
+
+        for match in self._token.finditer(self.xml):
+            if not match.group(2):
+                continue
+
+            name = match.group(2).lower()
+
+            if match.group(1):
+                while stack:
+                    element = stack.pop()
+                    element.close = match.start()
+                    element.end = match.end()
+
+                    if element.name == name:
+                        break
+
+                continue
+
+            tag = match.group(0)
+            attrs = {}
+
+            for attr in _ATTR.finditer(tag, match.end(2) - match.start()):
+                group = 2 if attr.group(2) is not None else 3
+                attrs[attr.group(1)] = (attr.group(group), match.start() + attr.start(group), match.start() + attr.end(group))
+
+            element = Element(name=name, start=match.start(), tag_end=match.end(), attrs=attrs, parent=stack[-1] if stack else None)
+            self.elements.append(element)
+
+            if element.parent:
+                element.parent.children.append(element)
+
+            if not tag.endswith('/>'):
+                stack.append(element)
+
+def find_highest_bandwidth(xml):
+    try:
+        manifest = Manifest(xml)
+    except:
+        return 0
+
+    bandwidth = 0
+
+    for period, representation, span in _video_representations(manifest):
+        if representation > bandwidth:
+            bandwidth = representation
+
+    return bandwidth
+
+def force_highest_bandwidth(manifest):
+    periods = {}
+    edits = []
+
+    for period, bandwidth, span in _video_representations(manifest):
+        periods.setdefault(period, []).append((bandwidth, span))
+
+    # every period keeps its own best representation, a multi-period manifest may not offer the same bitrates throughout
+    for representations in periods.values():
+        highest = max(bandwidth for bandwidth, span in representations)
+        edits.extend((span[0], span[1], '') for bandwidth, span in representations if bandwidth != highest)
+
+    return edits
+
+def get_segments(xml, path):
+    manifest = Manifest(xml, token=_SEGMENT_TOKEN)
+    timing = get_timing(xml)
+    segments = []
+
+    for representation in manifest.find('representation'):
+        chain = []
+        element = representation
+
+        while element:
+            chain.insert(0, element)
+            element = element.parent
+
+        base = path
+        template = {}
+        timeline = None
+        period_duration = 0
+
+        # BaseURL and SegmentTemplate are inherited from the MPD down to the representation, the innermost one wins
+        for element in chain:
+            if element.name == 'mpd':
+                period_duration = parse_duration(_value(element, 'mediaPresentationDuration'))
+            elif element.name == 'period' and 'duration' in element.attrs:
+                period_duration = parse_duration(_value(element, 'duration'))
+
+            for child in element.children:
+                if child.name == 'baseurl':
+                    base = urljoin(base, unescape(manifest.xml[child.tag_end:child.close].strip(), _UNESCAPE))
+                elif child.name == 'segmenttemplate':
+                    template.update((name, _value(child, name)) for name in child.attrs)
+                    timeline = next((timeline for timeline in child.children if timeline.name == 'segmenttimeline'), timeline)
+
+        if not template.get('media'):
+            continue
+
+        values = {'RepresentationID': _value(representation, 'id') or '', 'Bandwidth': _value(representation, 'bandwidth') or 0}
+        number = int(template.get('startNumber') or 1)
+        media = []
+
+        if timeline:
+            time = 0
+            timeline = [child for child in timeline.children if child.name == 's']
+
+            for i, s in enumerate(timeline):
+                if 't' in s.attrs:
+                    time = int(_value(s, 't'))
+
+                duration = int(_value(s, 'd'))
+                repeat = int(_value(s, 'r') or 0)
+
+                # a negative repeat runs up to the next entry, at the end of the timeline its length is unknown
+                if repeat < 0:
+                    repeat = (int(_value(timeline[i + 1], 't')) - time) // duration - 1 if i + 1 < len(timeline) and 't' in timeline[i + 1].attrs else 0
+
+                for j in range(repeat + 1):
+                    media.append((number, time))
+                    number += 1
+                    time += duration
+
+                if len(media) > CONST_MAX_SEGMENTS:
+                    break
+        elif template.get('duration') and timing['type'] == 'static' and period_duration:
+            # without a timeline the segments of a live manifest depend on the wall clock, only a fixed length can be listed
+            count = int(math.ceil(period_duration * float(template.get('timescale') or 1) / float(template['duration'])))
+            media = [(number + i, None) for i in range(min(count, CONST_MAX_SEGMENTS))]
+
+        template['media'] = unescape(template['media'], _UNESCAPE)
+        urls = []
+
+        for number, time in media:
+            values['Number'] = number
+            values['Time'] = time
+            urls.append(urljoin(base, _expand(template=template['media'], values=values)))
+
+        if urls:
+            segments.append(urls)
+
+    return segments
+
+def get_timing(xml):
+    match = _MPD.search(xml)
+    attrs = {}
+
+    if match:
+        for attr in _ATTR.finditer(match.group(0), 4):
+            attrs[attr.group(1)] = attr.group(2) if attr.group(2) is not None else attr.group(3)
+
+    return {
+        'type': attrs.get('type', 'static'),
+        'minimumUpdatePeriod': parse_duration(attrs.get('minimumUpdatePeriod')),
+    }
+
+def parse_duration(value):
+    match = _DURATION.match(value or '')
+
+    if not match or not any(match.groups()):
+        return 0
+
+    days, hours, minutes, seconds = [float(group or 0) for group in match.groups()]
+
+    return int(days * 86400 + hours * 3600 + minutes * 60 + seconds)
+
+def remove_codec(codec):
+    def transform(manifest):
+        edits = []
+        needle = 'codecs="{codec}"'.format(codec=codec)
+
+        for adaptationset in manifest.find('adaptationset'):
+            if needle in manifest.xml[adaptationset.start:adaptationset.end]:
+                edits.append((adaptationset.start, adaptationset.end, ''))
+
+        return edits
+
+    return transform
+
+def rewrite(xml, transforms):
+    if not transforms:
+        return xml
+
+    try:
+        manifest = Manifest(xml)
+        edits = []
+
+        for transform in transforms:
+            edits.extend(transform(manifest))
+
+        if not edits:
+            return xml
+
+        output = []
+        pos = 0
+
+        for start, end, value in sorted(edits, key=lambda edit: (edit[0], -edit[1])):
+            # an edit inside a removed element has nothing left to change
+            if start < pos:
+                continue
+
+            output.append(xml[pos:start])
+            output.append(value)
+            pos = end
+
+        output.append(xml[pos:])
+
+        return ''.join(output)
+    except:
+        log.exception('Failed to rewrite manifest')
+        return xml
+
+def set_duration(duration):
+    def transform(manifest):
+        edits = []
+        given_duration = 0
+
+        for element in manifest.find('mpd'):
+            if 'mediaPresentationDuration' in element.attrs:
+                given_duration = parse_duration(element.attrs['mediaPresentationDuration'][0])
+
+        if given_duration > 0 and not given_duration > duration:
+            return edits
+
+        minute, second = divmod(duration, 60)
+        hour, minute = divmod(minute, 60)
+        value = "PT{hour}H{minute}M{second}S".format(hour=hour, minute=minute, second=second)
+
+        for element in manifest.find('mpd'):
+            if 'mediaPresentationDuration' in element.attrs:
+                edits.append((element.attrs['mediaPresentationDuration'][1], element.attrs['mediaPresentationDuration'][2], value))
+
+        for element in manifest.find('period'):
+            if 'duration' in element.attrs:
+                edits.append((element.attrs['duration'][1], element.attrs['duration'][2], value))
+
+        return edits
+
+    return transform
+
+def _expand(template, values):
+    def replace(match):
+        if not match.group(1):
+            return '$'
+
+        if match.group(2):
+            return '%0*d' % (int(match.group(2)), int(values[match.group(1)]))
+
+        return '%s' % values[match.group(1)]
+
+    return _TEMPLATE.sub(replace, template)
+
+def _value(element, name):
+    return element.attrs[name][0] if name in element.attrs else None
+
+def _video_representations(manifest):
+    for adaptationset in manifest.find('adaptationset'):
+        representations = [child for child in adaptationset.children if child.name == 'representation']
+
+        for i, representation in enumerate(representations):
+            # like the manifest text, a representation runs up to the next one or the end of its adaptation set
+            end = representations[i + 1].start if i + 1 < len(representations) else adaptationset.close
+            span = manifest.xml[representation.start:end]
+
+            if not 'id="video' in span and not 'id="Video' in span:
+                continue
+
+            bandwidth = _BANDWIDTH.search(span)
+
+            yield adaptationset.parent, int(bandwidth.group(1)) if bandwidth else 0, (representation.start, end)
@@ -1,21 +1,152 @@
-import requests, sys
+import hashlib, io, json, os, random, requests, threading, time, xbmc
 
+from requests.packages.urllib3.exceptions import NewConnectionError
 from resources.lib.base import settings
-from resources.lib.base.constants import SESSION_CHUNKSIZE
+from resources.lib.base.constants import ADDON_PROFILE, SESSION_BACKOFF, SESSION_BACKOFF_MAX, SESSION_CHUNKSIZE, SESSION_CIRCUIT_FAILURES, SESSION_CIRCUIT_RESET, SESSION_RETRY_STATUSES
 from resources.lib.base.log import log
 from resources.lib.constants import CONST_BASE_HEADERS
 
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
+
+IDEMPOTENT_METHODS = ['DELETE', 'GET', 'HEAD', 'OPTIONS', 'PUT']
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+class CircuitBreaker(object):
+    def __init__(self, file='circuits.json', failures=SESSION_CIRCUIT_FAILURES, reset=SESSION_CIRCUIT_RESET):
+        self._file = os.path.join(ADDON_PROFILE, file)
+        self._failures = failures
+        self._reset = reset
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._state = {}
+
+    def allow(self, host):
+        with self._lock:
+            self._load()
+            state = self._state.get(host)
+            now = time.time()
+
+            if not state or not 'until' in state:
+                return True
+
+            if state['until'] > now or state.get('trial', 0) > now:
+                return False
+
+            # once the reset time has passed a single request is let through to probe the host, the others are
+            # turned away until it succeeded, a trial that never reported back expires after another reset time
+            state['trial'] = int(now + self._reset)
+            self._save()
+
+            return True
+
+    def failure(self, host):
+        with self._lock:
+            self._load()
+            state = self._state.setdefault(host, {'failures': 0})
+            state['failures'] += 1
+
+            if state['failures'] >= self._failures:
+                state['until'] = int(time.time() + self._reset)
+                state.pop('trial', None)
+                log.debug('Circuit open for {host} until {until}'.format(host=host, until=state['until']))
+
+            self._save()
+
+    def success(self, host):
+        with self._lock:
+            self._load()
+
+            if not host in self._state:
+                return
+
+            del self._state[host]
+            self._save()
+
+    def _load(self):
+        # other plugin invocations and the service share the file, it is only parsed again when it changed
+        try:
+            mtime = os.path.getmtime(self._file)
+        except:
+            mtime = None
+
+        if mtime == self._mtime:
+            return
+
+        try:
+            with io.open(self._file, 'r', encoding='utf-8') as f:
+                self._state = json.loads(f.read())
+        except:
+            self._state = {}
+
+        self._mtime = mtime
+
+    def _save(self):
+        try:
+            with io.open(self._file, 'w', encoding='utf-8') as f:
+                f.write(u'' + json.dumps(self._state))
+
+            self._mtime = os.path.getmtime(self._file)
+        except:
+            pass
+
+class RetryPolicy(object):
+    def __init__(self, attempts=2, backoff=SESSION_BACKOFF, backoff_max=SESSION_BACKOFF_MAX, statuses=SESSION_RETRY_STATUSES):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.statuses = statuses
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after:
+            try:
+                return float(retry_after)
+            except:
+                pass
+
+        # full jitter keeps clients that failed together from retrying together
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+
+    def is_failure(self, status_code):
+        return status_code in self.statuses
+
+    def should_retry(self, method, attempt, status_code=None, sent=True):
+        if attempt >= self.attempts:
+            return False
+
+        # a request that never reached the server is always retried, any other only when sending it twice is harmless,
+        # a failed post may already have had its effect
+        if status_code is None:
+            return not sent or method.upper() in IDEMPOTENT_METHODS
+
+        return self.is_failure(status_code) and method.upper() in IDEMPOTENT_METHODS
+
+def _sent(error):
+    # a connect timeout or a refused connection fails before anything is sent, a read timeout or a dropped connection
+    # may come after the server got the request
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return False
+
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return not (isinstance(error, requests.exceptions.ConnectionError) and isinstance(reason, NewConnectionError))
+
+circuits = CircuitBreaker()
+
 class Session(requests.Session):
     def __init__(self, headers=None, cookies_key=None, base_url='{}', timeout=None, attempts=None):
         super(Session, self).__init__()
 
-        user_agent = settings.get(key='_user_agent')
-        CONST_BASE_HEADERS.update({'User-Agent': user_agent})
+        # a copy per session, the service keeps the module around and other sessions must not see these headers
+        self._headers = dict(CONST_BASE_HEADERS)
+        self._headers.update({'User-Agent': settings.get(key='_user_agent')})
 
         if headers:
-            CONST_BASE_HEADERS.update(headers)
+            self._headers.update(headers)
 
-        self._headers = CONST_BASE_HEADERS or {}
         self._cookies_key = cookies_key
         self._base_url = base_url
         self._timeout = timeout or (5, 10)
@@ -26,48 +157,94 @@ class Session(requests.Session):
         if self._cookies_key:
             self.cookies.update(settings.getDict(self._cookies_key, {}))
 
+        self._saved_cookies = self.cookies.get_dict()
+
     def request(self, method, url, timeout=None, attempts=None, **kwargs):
         if not url.startswith('http'):
             url = self._base_url.format(url)
 
         kwargs['timeout'] = timeout or self._timeout
-        attempts = attempts or self._attempts
+        policy = RetryPolicy(attempts=attempts or self._attempts)
+        host = urlparse(url).netloc
+
+        if not circuits.allow(host):
+            raise CircuitOpenError('Circuit open for {host}'.format(host=host))
 
-        if sys.version_info < (3, 0):
-            rngattempts = range(1, attempts+1)
-        else:
-            rngattempts = list(range(1, attempts+1))
+        attempt = 0
 
-        for i in rngattempts:
-            log.debug('Attempt {}/{}: {} {} {}'.format(i, attempts, method, url, kwargs if method.lower() != 'post' else ""))
+        while True:
+            attempt += 1
+            log.debug('Attempt {}/{}: {} {} {}'.format(attempt, policy.attempts, method, url, kwargs if method.lower() != 'post' else ""))
 
             try:
                 data = super(Session, self).request(method, url, **kwargs)
+            except Exception as e:
+                if not policy.should_retry(method=method, attempt=attempt, sent=_sent(e)):
+                    circuits.failure(host)
+                    raise
 
-                if self._cookies_key:
-                    self.save_cookies()
+                self._wait(policy.delay(attempt=attempt))
+                continue
 
-                return data
-            except:
-                if i == attempts:
-                    raise
+            if policy.should_retry(method=method, attempt=attempt, status_code=data.status_code):
+                delay = policy.delay(attempt=attempt, retry_after=data.headers.get('Retry-After'))
+
+                if not delay > policy.backoff_max:
+                    data.close()
+                    self._wait(delay)
+                    continue
+
+            if policy.is_failure(data.status_code):
+                circuits.failure(host)
+            else:
+                circuits.success(host)
+
+            if self._cookies_key:
+                self.save_cookies(force=False)
+
+            return data
+
+    def reset_headers(self):
+        self.headers = dict(self._headers)
 
-    def save_cookies(self):
+    def save_cookies(self, force=True):
         if not self._cookies_key:
             raise Exception('A cookies key needs to be set to save cookies')
 
-        settings.setDict(self._cookies_key, self.cookies.get_dict())
+        cookies = self.cookies.get_dict()
+
+        # most responses do not touch the jar, an unchanged jar is not serialized again
+        # changed ones are coalesced by the settings write-behind and flushed at dispatch end or service shutdown
+        if not force and cookies == self._saved_cookies:
+            return
+
+        settings.setDict(self._cookies_key, cookies)
+        self._saved_cookies = cookies
 
     def clear_cookies(self):
         if self._cookies_key:
             settings.remove(self._cookies_key)
 
         self.cookies.clear()
+        self._saved_cookies = {}
+
+    def chunked_dl(self, url, dst_path, method='GET', timeout=None):
+        resp = self.request(method, url, timeout=timeout, stream=True)
+
+        try:
+            resp.raise_for_status()
+
+            md5 = hashlib.md5()
+
+            with open(dst_path, 'wb') as f:
+                for chunk in resp.iter_content(chunk_size=SESSION_CHUNKSIZE):
+                    f.write(chunk)
+                    md5.update(chunk)
+        finally:
+            resp.close()
 
-    def chunked_dl(self, url, dst_path, method='GET'):
-        resp = self.request(method, url, stream=True)
-        resp.raise_for_status()
+        return md5.hexdigest()
 
-        with open(dst_path, 'wb') as f:
-            for chunk in resp.iter_content(chunk_size=SESSION_CHUNKSIZE):
-                f.write(chunk)
\ No newline at end of file
+    def _wait(self, delay):
+        if delay > 0 and xbmc.Monitor().waitForAbort(delay):
+            raise requests.exceptions.ConnectionError('Abort requested')
\ No newline at end of file
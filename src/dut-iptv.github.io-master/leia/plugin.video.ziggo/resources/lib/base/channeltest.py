@@ -0,0 +1,176 @@
+import threading, time, xbmc
+
+from resources.lib.base import settings
+from resources.lib.base.constants import CHANNEL_TEST_HISTORY, CHANNEL_TEST_INTERVAL, CHANNEL_TEST_LIMIT, CHANNEL_TEST_RATE, CHANNEL_TEST_VOLATILITY, CHANNEL_TEST_WORKERS
+from resources.lib.base.log import log
+from resources.lib.base.util import write_file
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+PREF_KEYS = ['live', 'replay', 'epg']
+RESULT_KEYS = ['live', 'replay', 'epg', 'guide', 'livebandwidth', 'replaybandwidth']
+
+class ChannelTester(object):
+    def __init__(self, rate=CHANNEL_TEST_RATE, aborted=None):
+        self.stopped = threading.Event()
+        self._aborted = aborted
+        self._interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._monitor = xbmc.Monitor()
+        self._next = 0
+
+    def check(self):
+        # playback always wins, a running test stops at the next request it would make
+        if self._monitor.abortRequested() or (self._aborted and self._aborted()) or settings.getInt(key='_last_playing') > int(time.time() - 300):
+            self.stopped.set()
+
+        return not self.stopped.is_set()
+
+    def sleep(self, seconds):
+        for i in range(int(seconds)):
+            if not self.check() or self._monitor.waitForAbort(1):
+                self.stopped.set()
+                break
+
+        return self.check()
+
+    def wait(self):
+        if not self.check():
+            return False
+
+        # every worker takes its turn in the same requests per second budget
+        with self._lock:
+            now = time.time()
+            delay = max(self._next - now, 0)
+            self._next = now + delay + self._interval
+
+        if delay > 0 and self._monitor.waitForAbort(delay):
+            self.stopped.set()
+
+        return self.check()
+
+def priority(result, now=None):
+    if not result or not isinstance(result, dict) or not 'tested' in result:
+        return float('inf')
+
+    age = max((now or time.time()) - result['tested'], 0)
+
+    # a channel that flipped between most of its last tests is retested much sooner than one that never changed
+    return age * (1 + CHANNEL_TEST_VOLATILITY * volatility(result))
+
+def record(previous, result, now=None):
+    result = dict(result)
+    result['tested'] = int(now or time.time())
+    history = []
+
+    if previous and isinstance(previous, dict):
+        history = list(previous.get('history', []))
+
+        if not history:
+            history = [[previous.get(key) for key in RESULT_KEYS]]
+
+    history.append([result.get(key) for key in RESULT_KEYS])
+    result['history'] = history[-CHANNEL_TEST_HISTORY:]
+
+    return result
+
+def volatility(result):
+    history = result.get('history', [])
+
+    if len(history) < 2:
+        return 0
+
+    flips = sum(1 for i in range(1, len(history)) if history[i] != history[i - 1])
+
+    return float(flips) / (len(history) - 1)
+
+def run(channels, results, probe, update, tested=False, channel=None, aborted=None, workers=CHANNEL_TEST_WORKERS):
+    ids = list(channels)
+    canary = None
+    limit = CHANNEL_TEST_LIMIT
+
+    if channel:
+        queue = [channel] if channel in channels else []
+    elif tested:
+        now = time.time()
+        queue = sorted((id for id in ids if id in results and priority(result=results[id], now=now) >= CHANNEL_TEST_INTERVAL), key=lambda id: -priority(result=results[id], now=now))
+    else:
+        queue = [id for id in ids if not id in results]
+
+        # a known channel is probed first, new channels are only marked unavailable if testing works at all
+        if queue and ids[0] in results:
+            canary = ids[0]
+
+    queue = queue[:limit]
+    tester = ChannelTester(aborted=aborted)
+    lock = threading.Lock()
+    changed = set()
+    state = {'count': 0}
+
+    def save(id, result):
+        with lock:
+            previous = results.get(id)
+            results[id] = record(previous=previous, result=result)
+            state['count'] += 1
+
+            # only a flip in what the preferences are built from needs them updated
+            if not isinstance(previous, dict) or any(previous.get(key) != result.get(key) for key in PREF_KEYS):
+                changed.add(id)
+
+            write_file(file="channel_test.json", data=results, isJSON=True)
+
+    def worker():
+        while not tester.stopped.is_set():
+            with lock:
+                if not queue:
+                    return
+
+                id = queue.pop(0)
+
+            try:
+                result = probe(channeldata=channels[id], tester=tester)
+            except:
+                log.exception('Failed to test channel {id}'.format(id=id))
+                result = None
+
+            if not result:
+                tester.stopped.set()
+                return
+
+            save(id=id, result=result)
+
+    settings.setBool(key='_test_running', value=True)
+
+    try:
+        if canary:
+            try:
+                result = probe(channeldata=channels[canary], tester=tester)
+            except:
+                log.exception('Failed to test channel {id}'.format(id=canary))
+                result = None
+
+            if not result or not result['live'] == 'true':
+                tester.stopped.set()
+            else:
+                save(id=canary, result=result)
+
+        threads = [threading.Thread(target=worker) for i in range(min(workers, len(queue)))]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+    finally:
+        if changed:
+            update(changed=changed)
+
+        settings.setBool(key='_test_running', value=False)
+
+    if tester.stopped.is_set():
+        return limit
+
+    return state['count']
@@ -0,0 +1,106 @@
+import collections, hashlib, io, json, os, re, shutil, threading, time
+
+from resources.lib.base.constants import ADDON_PROFILE, HTTP_CACHE_MEMORY_SIZE
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+_MAX_AGE = re.compile(r'(?:^|,)\s*(?:s-)?max-age\s*=\s*"?([0-9]+)', re.I)
+_NO_STORE = re.compile(r'(?:^|,)\s*(?:no-store|no-cache)\b', re.I)
+
+_memory = collections.OrderedDict()
+_memory_size = [0]
+_lock = threading.Lock()
+_path = os.path.join(ADDON_PROFILE, 'cache', 'http')
+
+def clear():
+    with _lock:
+        _memory.clear()
+        _memory_size[0] = 0
+
+    shutil.rmtree(_path, ignore_errors=True)
+
+def get(url):
+    key = _key(url)
+    now = time.time()
+
+    with _lock:
+        if key in _memory:
+            expires, text = _memory.pop(key)
+
+            if expires > now:
+                _memory[key] = (expires, text)
+
+                return json.loads(text)
+
+            _memory_size[0] -= len(text)
+
+    try:
+        with io.open(os.path.join(_path, key + '.json'), 'r', encoding='utf-8') as f:
+            entry = json.loads(f.read())
+
+        if not entry['expires'] > now:
+            return None
+
+        _remember(key=key, expires=entry['expires'], text=entry['data'])
+
+        return json.loads(entry['data'])
+    except:
+        return None
+
+def get_ttl(url, rules):
+    for rule, ttl in rules:
+        if re.search(rule, url):
+            return ttl
+
+    return 0
+
+def set(url, data, ttl, headers=None):
+    # the response may only shorten the lifetime the endpoint rules allow, or forbid storing it
+    value = (headers or {}).get('Cache-Control', '')
+
+    if value:
+        if _NO_STORE.search(value):
+            return
+
+        max_age = _MAX_AGE.search(value)
+
+        if max_age:
+            ttl = min(ttl, int(max_age.group(1)))
+
+    if not ttl > 0:
+        return
+
+    key = _key(url)
+    expires = int(time.time() + ttl)
+    text = unicode(json.dumps(data, ensure_ascii=False))
+
+    _remember(key=key, expires=expires, text=text)
+
+    try:
+        if not os.path.isdir(_path):
+            os.makedirs(_path)
+
+        with io.open(os.path.join(_path, key + '.json'), 'w', encoding='utf-8') as f:
+            f.write(unicode(json.dumps({'expires': expires, 'data': text}, ensure_ascii=False)))
+    except:
+        pass
+
+def _key(url):
+    return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+def _remember(key, expires, text):
+    if len(text) > HTTP_CACHE_MEMORY_SIZE // 4:
+        return
+
+    with _lock:
+        if key in _memory:
+            _memory_size[0] -= len(_memory.pop(key)[1])
+
+        _memory[key] = (expires, text)
+        _memory_size[0] += len(text)
+
+        while _memory_size[0] > HTTP_CACHE_MEMORY_SIZE:
+            _memory_size[0] -= len(_memory.popitem(last=False)[1][1])
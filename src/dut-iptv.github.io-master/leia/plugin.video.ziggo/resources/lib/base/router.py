@@ -12,18 +12,26 @@ except NameError:
     unicode = str
 
 try:
-    from urllib.parse import parse_qsl, urlencode, unquote
+    from urllib.parse import parse_qsl, quote_plus, unquote
 except ImportError:
     from urlparse import parse_qsl, unquote
-    from urllib import urlencode
+    from urllib import quote_plus
 
+_builders = {}
+_keys = {}
 _routes = {}
+_urls = {}
 
 # @router.add('_settings', settings)
 def add(url, f):
     if url == None:
         url = f.__name__
     _routes[url] = f
+    _builders[url] = _compile(url)
+
+    # the first url registered for a function is the one url_for keeps returning
+    if not f.__name__ in _urls:
+        _urls[f.__name__] = url
 
 # @router.route('_settings')
 def route(url):
@@ -56,11 +64,12 @@ def parse_url(url):
     return function, params
 
 def url_for_func(func, **kwargs):
-    for url in _routes:
-        if _routes[url].__name__ == func.__name__:
-            return build_url(url, **kwargs)
+    url = _urls.get(func.__name__)
+
+    if url == None:
+        raise RouterError(_(_.ROUTER_NO_URL, function_name=func.__name__))
 
-    raise RouterError(_(_.ROUTER_NO_URL, function_name=func.__name__))
+    return build_url(url, **kwargs)
 
 def url_for(func_or_url, **kwargs):
     if callable(func_or_url):
@@ -69,21 +78,12 @@ def url_for(func_or_url, **kwargs):
         return build_url(func_or_url, **kwargs)
 
 def build_url(url, addon_id=ADDON_ID, **kwargs):
-    kwargs['_'] = url
-    is_live = kwargs.pop('_is_live', False)
-
-    params = []
-    for k in sorted(kwargs):
-        if kwargs[k] == None:
-            continue
-
-        try: params.append((k, str(kwargs[k]).encode('utf-8')))
-        except: params.append((k, kwargs[k]))
+    try:
+        builder = _builders[url]
+    except KeyError:
+        builder = _builders[url] = _compile(url)
 
-    if is_live:
-        params.append(('_l', '.pvr'))
-
-    return 'plugin://{0}/?{1}'.format(addon_id, urlencode(encode_obj(params)))
+    return builder(addon_id, kwargs)
 
 # router.dispatch('?_=_settings')
 def dispatch(url):
@@ -124,4 +124,43 @@ def encode_obj(in_obj):
     elif isinstance(in_obj, dict):
         return encode_dict(in_obj)
 
-    return in_obj
\ No newline at end of file
+    return in_obj
+
+def _compile(url):
+    # the route and the addon prefix are encoded once, a call only encodes its own arguments
+    static = ('_', '_=' + _quote(url))
+    prefix = 'plugin://{0}/?'.format(ADDON_ID)
+
+    def builder(addon_id, kwargs):
+        is_live = kwargs.pop('_is_live', False)
+
+        params = [static]
+        for k in kwargs:
+            if k == '_' or kwargs[k] == None:
+                continue
+
+            try:
+                key = _keys[k]
+            except KeyError:
+                key = _keys[k] = _quote(k) + '='
+
+            params.append((k, key + _quote(kwargs[k])))
+
+        params.sort()
+        query = '&'.join(param for k, param in params)
+
+        if is_live:
+            query += '&_l=.pvr'
+
+        if not addon_id == ADDON_ID:
+            return 'plugin://{0}/?{1}'.format(addon_id, query)
+
+        return prefix + query
+
+    return builder
+
+def _quote(value):
+    try: value = str(value).encode('utf-8')
+    except: value = encode_obj(value)
+
+    return quote_plus(value)
\ No newline at end of file
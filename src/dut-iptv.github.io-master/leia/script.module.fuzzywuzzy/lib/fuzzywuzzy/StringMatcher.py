@@ -8,7 +8,10 @@ ported from python-Levenshtein
 License available here: https://github.com/miohtama/python-Levenshtein/blob/master/COPYING
 """
 
-from Levenshtein import *
+try:
+    from Levenshtein import *
+except ImportError:
+    from .bitparallel import distance, editops, matching_blocks, opcodes, ratio
 from warnings import warn
 
 
@@ -1,7 +1,8 @@
-import sys, traceback, xbmc, xbmcgui
+import sys, threading, traceback, xbmc, xbmcgui
 
 from contextlib import contextmanager
 from resources.lib.base.constants import ADDON_ID, ADDON_NAME, ADDON_ICON
+from resources.lib.base.exceptions import Exit
 from resources.lib.base.language import _
 
 try:
@@ -14,6 +15,23 @@ try:
 except ImportError:
     from urllib import quote
 
+_kodi_version = []
+_local = threading.local()
+
+@contextmanager
+def headless():
+    # listings built in the service have nobody to answer a dialog, asking one gives the route back to the plugin
+    _local.headless = True
+
+    try:
+        yield
+    finally:
+        _local.headless = False
+
+def _check_headless():
+    if getattr(_local, 'headless', False):
+        raise Exit()
+
 def _make_heading(heading=None):
     return heading if heading else ADDON_NAME
 
@@ -27,6 +45,7 @@ def refresh():
     xbmc.executebuiltin('Container.Refresh')
 
 def select(heading=None, options=None, **kwargs):
+    _check_headless()
     heading = _make_heading(heading)
     return xbmcgui.Dialog().select(heading, options, **kwargs)
 
@@ -49,6 +68,7 @@ def exception(heading=None):
 
 @contextmanager
 def progress(message, heading=None, percent=0):
+    _check_headless()
     heading = _make_heading(heading)
     dialog = xbmcgui.DialogProgress()
     dialog.create(heading, message)
@@ -60,24 +80,29 @@ def progress(message, heading=None, percent=0):
         dialog.close()
 
 def input(message, default='', hide_input=False, **kwargs):
+    _check_headless()
     if hide_input:
         kwargs['option'] = xbmcgui.ALPHANUM_HIDE_INPUT
 
     return xbmcgui.Dialog().input(message, default, **kwargs)
 
 def numeric(message, default='', type=0, **kwargs):
+    _check_headless()
     return xbmcgui.Dialog().numeric(type, message, defaultt=str(default), **kwargs)
 
 def ok(message, heading=None):
+    _check_headless()
     heading = _make_heading(heading)
     return xbmcgui.Dialog().ok(heading, message)
 
 def text(message, heading=None, **kwargs):
+    _check_headless()
     heading = _make_heading(heading)
 
     return xbmcgui.Dialog().textviewer(heading, message)
 
 def yes_no(message, heading=None, autoclose=120000, **kwargs):
+    _check_headless()
     heading = _make_heading(heading)
 
     if autoclose:
@@ -87,10 +112,18 @@ def yes_no(message, heading=None, autoclose=120000, **kwargs):
 
 def get_kodi_version():
     try:
-        return int(xbmc.getInfoLabel("System.BuildVersion").split('.')[0])
+        return _kodi_version[0]
+    except IndexError:
+        pass
+
+    # the version cannot change while the add-on runs, so the InfoLabel is only queried once
+    try:
+        _kodi_version.append(int(xbmc.getInfoLabel("System.BuildVersion").split('.')[0]))
     except:
         return 0
 
+    return _kodi_version[0]
+
 class Item(object):
     def __init__(self, id=None, label='', label2='', path=None, playable=False, info=None, context=None,
             headers=None, cookies=None, properties=None, is_folder=None, art=None, inputstream=None,
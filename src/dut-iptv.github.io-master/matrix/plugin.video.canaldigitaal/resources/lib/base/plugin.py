@@ -1,8 +1,8 @@
 import shutil, sys, time, xbmc, xbmcaddon, xbmcplugin
 
 from functools import wraps
-from resources.lib.base import router, gui, settings, inputstream, signals
-from resources.lib.base.constants import ADDON_ICON, ADDON_FANART, ADDON_ID, ADDON_NAME, ADDON_PROFILE
+from resources.lib.base import router, gui, listcache, settings, inputstream, signals
+from resources.lib.base.constants import ADDON_ICON, ADDON_FANART, ADDON_ID, ADDON_NAME, ADDON_PROFILE, LISTING_CACHE_TTL
 from resources.lib.base.exceptions import PluginError
 from resources.lib.base.language import _
 from resources.lib.base.log import log
@@ -23,6 +23,7 @@ def exception(msg=''):
     raise PluginError(msg)
 
 logged_in = False
+_listings = {}
 
 # @plugin.login_required()
 def login_required():
@@ -36,6 +37,44 @@ def login_required():
         return decorated_function
     return lambda f: decorator(f)
 
+# @plugin.cache_listing(files=['channels.json', '{station}_replay.json'], keys=['enable_simple_iptv'])
+def cache_listing(files, keys=None, ttl=LISTING_CACHE_TTL):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not settings.getBool(key='enable_cache'):
+                return f(*args, **kwargs)
+
+            params = dict((key, kwargs[key]) for key in kwargs if not key == '_url')
+
+            for key in keys or []:
+                params[key] = settings.get(key=key)
+
+            try:
+                paths = [file.format(**params) for file in files]
+            except:
+                return f(*args, **kwargs)
+
+            data = listcache.get(route=f.__name__, params=params, files=paths)
+
+            if data:
+                return _load_folder(data)
+
+            folder = f(*args, **kwargs)
+
+            if isinstance(folder, Folder) and folder.items:
+                data = _dump_folder(folder)
+
+                if data:
+                    listcache.set(route=f.__name__, params=params, files=paths, data=data, ttl=ttl)
+
+            return folder
+
+        # the service may build these listings for the plugin, see base/daemon.py
+        _listings[f.__name__] = decorated_function
+        return decorated_function
+    return lambda f: decorator(f)
+
 # @plugin.route()
 def route(url=None):
     def decorator(f, url):
@@ -97,6 +136,7 @@ def reboot():
 @signals.on(signals.AFTER_DISPATCH)
 def _close():
     signals.emit(signals.ON_CLOSE)
+    settings.flush()
 
 @route('_settings')
 def _settings(**kwargs):
@@ -275,6 +315,53 @@ def _handle():
         return -1
 
 #Plugin.Item()
+def _dump_folder(folder):
+    items = []
+
+    # empty rows are dropped on display as well
+    for item in [i for i in folder.items if i]:
+        # only plain listing rows survive a round trip through json
+        if not isinstance(item, Item) or item.inputstream or item.headers or item.cookies or item.mimetype:
+            return None
+
+        items.append({
+            'label': item.label,
+            'label2': item.label2,
+            'path': item.path,
+            'playable': item.playable,
+            'info': item.info,
+            'context': item.context,
+            'properties': item.properties,
+            'is_folder': item._is_folder,
+            'art': item.art,
+            'video': item.video,
+            'audio': item.audio,
+            'subtitles': item.subtitles,
+        })
+
+    return {
+        'items': items,
+        'title': folder.title,
+        'content': folder.content,
+        'updateListing': folder.updateListing,
+        'cacheToDisc': folder.cacheToDisc,
+        'sort_methods': folder.sort_methods,
+        'thumb': folder.thumb,
+        'fanart': folder.fanart,
+        'no_items_label': folder.no_items_label,
+    }
+
+def _load_folder(data):
+    items = []
+
+    for row in data['items']:
+        row['context'] = [tuple(context) for context in row['context']]
+        items.append(Item(**row))
+
+    data['items'] = items
+
+    return Folder(**data)
+
 class Item(gui.Item):
     def __init__(self, cache_key=None, playback_error=None, *args, **kwargs):
         super(Item, self).__init__(self, *args, **kwargs)
@@ -297,6 +384,9 @@ class Item(gui.Item):
         li = self.get_li()
         handle = _handle()
 
+        # the proxy in the service reads the stream settings as soon as playback starts
+        settings.flush()
+
         if handle > 0:
             xbmcplugin.setResolvedUrl(handle, result, li)
         elif result:
@@ -340,12 +430,17 @@ class Folder(object):
                 is_folder = False,
             ))
 
+        listing = []
+
         for item in items:
             item.art['thumb'] = item.art.get('thumb') or self.thumb
             item.art['fanart'] = item.art.get('fanart') or self.fanart
 
             li = item.get_li()
-            xbmcplugin.addDirectoryItem(handle, item.path, li, item.is_folder)
+            listing.append((item.path, li, item.is_folder))
+
+        # the whole listing is handed to Kodi in one call instead of one call per row
+        xbmcplugin.addDirectoryItems(handle, listing, len(listing))
 
         if self.content: xbmcplugin.setContent(handle, self.content)
         if self.title: xbmcplugin.setPluginCategory(handle, self.title)
@@ -1,6 +1,8 @@
-from resources.lib.base import settings, uaparser
+from resources.lib.base import settings
 
 def update_os_browser():
+    from resources.lib.base import uaparser
+
     user_agent = settings.get(key='_user_agent')
     settings.set(key='_browser_name', value=uaparser.detect(user_agent)['browser']['name'])
     settings.set(key='_browser_version', value=uaparser.detect(user_agent)['browser']['version'])
@@ -19,5 +19,41 @@ ADDON_FANART = ADDON.getAddonInfo('fanart')
 DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/79.0.3945.130 Safari/537.36'
 
 #### SESSION ####
+SESSION_BACKOFF = 0.5
+SESSION_BACKOFF_MAX = 8
 SESSION_CHUNKSIZE = 4096
+SESSION_CIRCUIT_FAILURES = 3
+SESSION_CIRCUIT_RESET = 30
+SESSION_DOWNLOAD_TIMEOUT = (5, 30)
+SESSION_MAX_AGE = 7200
+SESSION_RENEW_MARGIN = 900
+SESSION_RETRY_STATUSES = [429, 500, 502, 503, 504]
+#################
+
+#### DISPATCH ####
+DISPATCH_TIMEOUT = 10
+#################
+
+#### HTTP CACHE ####
+HTTP_CACHE_MEMORY_SIZE = 4 * 1024 * 1024
+#################
+
+#### LISTING CACHE ####
+LISTING_CACHE_TTL = 3600
+#################
+
+#### CHANNEL TESTS ####
+CHANNEL_TEST_HISTORY = 10
+CHANNEL_TEST_INTERVAL = 21600
+CHANNEL_TEST_LIMIT = 20
+CHANNEL_TEST_RATE = 0.5
+CHANNEL_TEST_VOLATILITY = 5
+CHANNEL_TEST_WORKERS = 3
+#################
+
+#### PROXY ####
+PROXY_PREFETCH_SEGMENTS = 3
+PROXY_PREFETCH_WORKERS = 2
+PROXY_SEGMENT_DISK_SIZE = 128 * 1024 * 1024
+PROXY_SEGMENT_MEMORY_SIZE = 32 * 1024 * 1024
 #################
\ No newline at end of file
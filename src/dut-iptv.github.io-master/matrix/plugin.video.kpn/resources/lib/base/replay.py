@@ -0,0 +1,262 @@
+import calendar, glob, io, json, os, re, string, threading
+
+from resources.lib.base.constants import ADDON_PROFILE
+from resources.lib.base.log import log
+from resources.lib.base.util import replace_file
+
+try:
+    from sqlite3 import dbapi2 as sqlite
+except ImportError:
+    from pysqlite2 import dbapi2 as sqlite
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+REPLAY_DB = 'replay.db'
+REPLAY_DB_VERSION = 3
+LETTER_FILES = list(string.ascii_uppercase) + ['other']
+
+_FIELDS = 'id, channel AS c, channel_name AS cn, start AS s, stop AS e, title AS t, description AS "desc", image AS i, image_large AS h'
+_ADULT = "COALESCE(channel_name, '') NOT LIKE '%18+%'"
+_NON_ALNUM = re.compile(r'\W+', re.UNICODE)
+_lock = threading.RLock()
+
+def create_db():
+    db_file = ADDON_PROFILE + REPLAY_DB
+    # the plugin and the service can build at the same time, each process writes its own temporary file
+    tmp_file = '{db_file}.{pid}.tmp'.format(db_file=db_file, pid=os.getpid())
+
+    with _lock:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+
+        try:
+            _write_db(path=tmp_file)
+            replace_file(src=tmp_file, dst=db_file)
+        finally:
+            if os.path.isfile(tmp_file):
+                os.remove(tmp_file)
+
+def connect():
+    db = _open()
+
+    if db or not glob.glob(ADDON_PROFILE + "*_replay.json"):
+        return db
+
+    with _lock:
+        # another thread may have built it while this one was waiting
+        db = _open()
+
+        if db:
+            return db
+
+        try:
+            create_db()
+        except:
+            log.exception('Failed to create {db}'.format(db=REPLAY_DB))
+            return None
+
+    return _open()
+
+def get_channel_programs(channel, start_time, end_time, min_end, after=None, limit=51, hide_adult=True):
+    db = connect()
+
+    if not db:
+        return None
+
+    channels = [unicode(channel), re.sub(r'[^a-z0-9.]+', '_', unicode(channel)).lower()]
+    seek, params = _seek(after)
+
+    try:
+        rows = db.execute('SELECT {fields} FROM programs WHERE channel IN (?, ?) AND start >= ? AND start < ? AND stop >= ? AND {adult}{seek} ORDER BY start, id LIMIT ?'.format(fields=_FIELDS, adult=_adult(hide_adult), seek=seek),
+            [channels[0], channels[1], int(start_time), int(end_time), int(min_end)] + params + [int(limit)]).fetchall()
+    finally:
+        db.close()
+
+    return [dict(row) for row in rows]
+
+def get_grams(text):
+    grams = set()
+
+    for token in _NON_ALNUM.sub(' ', unicode(text).lower()).split():
+        token = ' ' + token + ' '
+
+        for i in range(len(token) - 2):
+            grams.add(token[i:i + 3])
+
+    return grams
+
+def get_programs_by_ids(ids, max_start, min_end, after=None, limit=51, hide_adult=True):
+    db = connect()
+
+    if not db:
+        return None
+
+    seek, params = _seek(after)
+
+    try:
+        db.execute('CREATE TEMP TABLE ids (id TEXT PRIMARY KEY)')
+        db.executemany('INSERT OR IGNORE INTO ids VALUES (?)', [(unicode(id),) for id in ids])
+
+        rows = db.execute('SELECT {fields} FROM programs JOIN ids USING (id) WHERE start <= ? AND stop >= ? AND {adult}{seek} ORDER BY start, id LIMIT ?'.format(fields=_FIELDS, adult=_adult(hide_adult), seek=seek),
+            [int(max_start), int(min_end)] + params + [int(limit)]).fetchall()
+    finally:
+        db.close()
+
+    return [dict(row) for row in rows]
+
+def get_titles(letter, now, after=None, limit=51, hide_adult=True):
+    db = connect()
+
+    if not db:
+        return None
+
+    seek = ''
+    params = []
+
+    if after:
+        seek = ' AND name > ?'
+        params = [after[0]]
+
+    try:
+        rows = db.execute("SELECT name, orig, ids, channel_name AS cn FROM titles WHERE letter = ? AND (available_from IS NULL OR available_till IS NULL OR (available_from <= ? AND available_till >= ?)) AND {adult}{seek} ORDER BY name LIMIT ?".format(adult=_adult(hide_adult), seek=seek),
+            [unicode(letter), int(now), int(now)] + params + [int(limit)]).fetchall()
+    finally:
+        db.close()
+
+    return [dict(row) for row in rows]
+
+def search_titles(query, now, limit=250, hide_adult=True):
+    grams = list(get_grams(query))
+
+    if not grams:
+        return []
+
+    db = connect()
+
+    if not db:
+        return None
+
+    try:
+        rows = db.execute("SELECT titles.name, titles.orig, titles.ids, titles.channel_name AS cn FROM (SELECT title, COUNT(*) AS hits FROM title_grams WHERE gram IN ({grams}) GROUP BY title) AS matches JOIN titles ON titles.rowid = matches.title WHERE (available_from IS NULL OR available_till IS NULL OR (available_from <= ? AND available_till >= ?)) AND {adult} ORDER BY matches.hits DESC, titles.name LIMIT ?".format(grams=', '.join('?' * len(grams)), adult=_adult(hide_adult)),
+            grams + [int(now), int(now), int(limit)]).fetchall()
+    finally:
+        db.close()
+
+    return [dict(row) for row in rows]
+
+def _open():
+    db_file = ADDON_PROFILE + REPLAY_DB
+
+    if not os.path.isfile(db_file):
+        return None
+
+    db = sqlite.connect(db_file)
+
+    if db.execute('PRAGMA user_version').fetchone()[0] == REPLAY_DB_VERSION:
+        db.row_factory = sqlite.Row
+        return db
+
+    db.close()
+
+    return None
+
+def _write_db(path):
+    db = sqlite.connect(path)
+
+    try:
+        db.execute('PRAGMA journal_mode = OFF')
+        db.execute('PRAGMA synchronous = OFF')
+        db.execute('CREATE TABLE programs (id TEXT PRIMARY KEY, channel TEXT, channel_name TEXT, start INTEGER, stop INTEGER, title TEXT, description TEXT, image TEXT, image_large TEXT)')
+        db.execute('CREATE TABLE titles (letter TEXT, name TEXT, orig TEXT, ids TEXT, available_from INTEGER, available_till INTEGER, channel_name TEXT)')
+        db.execute('CREATE TABLE title_grams (gram TEXT, title INTEGER)')
+
+        station_files = []
+        letter_files = []
+
+        for file in glob.glob(ADDON_PROFILE + "*_replay.json"):
+            name = os.path.basename(file)[:-len('_replay.json')]
+
+            if name == 'list':
+                db.executemany('INSERT INTO titles VALUES (?, ?, ?, ?, ?, ?, ?)', _read_titles(file=file))
+                continue
+            elif name in LETTER_FILES or name.lower() in LETTER_FILES:
+                letter_files.append(file)
+            else:
+                station_files.append((name, file))
+
+        for name, file in station_files:
+            db.executemany('INSERT OR REPLACE INTO programs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _read_rows(file=file, channel=name))
+
+        for file in letter_files:
+            db.executemany('INSERT OR IGNORE INTO programs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', _read_rows(file=file))
+
+        db.execute('CREATE INDEX idx_programs_channel_start ON programs (channel, start)')
+        db.execute('CREATE INDEX idx_programs_title ON programs (title)')
+        db.execute('CREATE UNIQUE INDEX idx_titles_letter_name ON titles (letter, name)')
+
+        titles = db.execute('SELECT rowid, orig FROM titles').fetchall()
+        db.executemany('INSERT INTO title_grams VALUES (?, ?)', ((gram, rowid) for rowid, orig in titles for gram in get_grams(orig)))
+        db.execute('CREATE INDEX idx_title_grams_gram ON title_grams (gram)')
+        db.execute('PRAGMA user_version = {version}'.format(version=REPLAY_DB_VERSION))
+        db.commit()
+    finally:
+        db.close()
+
+def _adult(hide_adult):
+    # only some providers hide the 18+ channels, the others list them like any other channel
+    return _ADULT if hide_adult else '1'
+
+def _seek(after):
+    if not after:
+        return '', []
+
+    return ' AND (start > ? OR (start = ? AND id > ?))', [int(after[0]), int(after[0]), unicode(after[1])]
+
+def _read_rows(file, channel=None):
+    with io.open(file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    for id in data:
+        row = data[id]
+
+        try:
+            start = _timestamp(row['s'])
+            end = _timestamp(row['e'])
+        except:
+            continue
+
+        if not row.get('t') or not row.get('c'):
+            continue
+
+        yield (unicode(id), unicode(channel or row['c']), row.get('cn'), start, end, row['t'], row.get('desc'), row.get('i'), row.get('h'))
+
+def _read_titles(file):
+    with io.open(file, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    for letter in data:
+        for name in data[letter]:
+            row = data[letter][name]
+
+            if not row.get('orig') or not row.get('ids'):
+                continue
+
+            try:
+                available_from = int(row['a']) if row.get('a') else None
+                available_till = int(row['e']) if row.get('e') else None
+            except:
+                available_from = None
+                available_till = None
+
+            yield (unicode(letter), unicode(name), row['orig'], json.dumps(row['ids']), available_from, available_till, row.get('cn'))
+
+def _timestamp(value):
+    value = unicode(value).split(' ', 1)[0]
+
+    if not value.isdigit() or not len(value) == 14:
+        raise ValueError(value)
+
+    return calendar.timegm((int(value[0:4]), int(value[4:6]), int(value[6:8]), int(value[8:10]), int(value[10:12]), int(value[12:14])))
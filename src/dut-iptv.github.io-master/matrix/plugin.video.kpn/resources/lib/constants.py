@@ -15,6 +15,13 @@ CONST_BASE_HEADERS = {
     'Accept-Language': 'en-US,en;q: 0.9,nl;q: 0.8',
 }
 
+CONST_CACHE_TTL = [
+    (r'/CONTENT/DETAIL/', 60),
+    (r'/TRAY/LIVECHANNELS\?', 86400),
+    (r'/TRAY/SEARCH/LIVE\?', 60),
+    (r'/TRAY/SEARCH/VOD\?', 600),
+]
+
 CONST_DEFAULT_API = 'https://api.tv.kpn.com/101/1.2.0/A/nld/pctv/kpn'
 CONST_DEFAULT_IMG_SIZE = '325x220'
 CONST_EPG = 'https://dut-epg.github.io/k.epg.xml.zip'
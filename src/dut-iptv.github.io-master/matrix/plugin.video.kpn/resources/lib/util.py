@@ -1,4 +1,4 @@
-from resources.lib.base import settings, uaparser
+from resources.lib.base import settings
 from resources.lib.base.util import load_file
 from resources.lib.constants import CONST_DEFAULT_API, CONST_DEFAULT_IMG_SIZE
 
@@ -25,6 +25,8 @@ def update_img_size():
         settings.set(key='_img_size', value=CONST_DEFAULT_IMG_SIZE)
 
 def update_os_browser():
+    from resources.lib.base import uaparser
+
     user_agent = settings.get(key='_user_agent')
     settings.set(key='_browser_name', value=uaparser.detect(user_agent)['browser']['name'])
     settings.set(key='_browser_version', value=uaparser.detect(user_agent)['browser']['version'])
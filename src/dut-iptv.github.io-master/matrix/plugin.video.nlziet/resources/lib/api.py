@@ -1,13 +1,12 @@
-import base64, datetime, hmac, os, random, re, string, time, xbmc
+import base64, collections, datetime, hmac, os, random, re, string, threading, time, xbmc
 
 from hashlib import sha1
-from resources.lib.base import gui, settings
-from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE
+from resources.lib.base import gui, httpcache, listcache, settings
+from resources.lib.base.constants import ADDON_ID, ADDON_PROFILE, CHANNEL_TEST_LIMIT, SESSION_MAX_AGE, SESSION_RETRY_STATUSES
 from resources.lib.base.exceptions import Error
 from resources.lib.base.log import log
-from resources.lib.base.session import Session
-from resources.lib.base.util import check_key, clean_filename, combine_playlist, find_highest_bandwidth, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
-from resources.lib.constants import CONST_API_URL, CONST_BASE_URL, CONST_IMAGE_URL
+from resources.lib.base.util import check_key, combine_playlist, get_credentials, is_file_older_than_x_minutes, load_file, set_credentials, write_file
+from resources.lib.constants import CONST_API_URL, CONST_BASE_URL, CONST_CACHE_TTL, CONST_IMAGE_URL
 from resources.lib.language import _
 
 try:
@@ -21,11 +20,16 @@ try:
 except NameError:
     unicode = str
 
+# the channel test probes from several threads, a rejected session is renewed by one of them at a time
+_session_lock = threading.RLock()
+
 class APIError(Error):
     pass
 
 class API(object):
     def new_session(self, force=False, retry=False, channels=False):
+        from resources.lib.base.session import Session
+
         self.check_vars()
 
         if self._debug_mode:
@@ -36,7 +40,7 @@ class API(object):
         username = self._username
         password = self._password
 
-        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - 7200) and self._last_login_success:
+        if len(self._cookies) > 0 and len(username) > 0 and not force and not channels and self._session_age > int(time.time() - SESSION_MAX_AGE) and self._last_login_success:
             self.logged_in = True
 
             try:
@@ -168,6 +172,8 @@ class API(object):
             log.debug('Execution Done: api.check_vars')
 
     def login(self, username, password, channels=False, retry=False):
+        from resources.lib.base.session import Session
+
         if self._debug_mode:
             log.debug('Executing: api.login')
             log.debug('Vars: username={username}, password={password}, channels={channels}, retry={retry}'.format(username=username, password=password, channels=channels, retry=retry))
@@ -371,6 +377,8 @@ class API(object):
         settings.remove(key='_cookies')
         self._cookies = ''
 
+        httpcache.clear()
+
         try:
             self._session.clear_cookies()
 
@@ -432,11 +440,14 @@ class API(object):
         write_file(file="tv.m3u8", data=playlist, isJSON=False)
         write_file(file="tv_all.m3u8", data=playlist_all, isJSON=False)
         combine_playlist()
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.create_playlist')
 
     def test_channels(self, tested=False, channel=None):
+        from resources.lib.base import channeltest
+
         if self._debug_mode:
             log.debug('Executing: api.test_channels')
             log.debug('Vars: tested={tested}, channel={channel}'.format(tested=tested, channel=channel))
@@ -444,224 +455,136 @@ class API(object):
         if channel:
             channel = unicode(channel)
 
-        try:
-            if not self._last_login_success or not settings.getBool(key='run_tests'):
-                return 5
-
-            settings.setBool(key='_test_running', value=True)
-            channels = load_file(file="channels.json", isJSON=True)
-            results = load_file(file="channel_test.json", isJSON=True)
-
-            count = 0
-            first = True
-            last_tested_found = False
-            test_run = False
+        if not self._last_login_success or not settings.getBool(key='run_tests'):
+            return CHANNEL_TEST_LIMIT
 
-            if not results:
-                results = {}
+        channels = collections.OrderedDict()
 
-            for row in channels:
-                if count == 5 or (count == 1 and tested):
-                    if test_run:
-                        self.update_prefs()
-
-                    settings.setBool(key='_test_running', value=False)
-                    return count
+        try:
+            results = load_file(file="channel_test.json", isJSON=True)
 
+            for row in load_file(file="channels.json", isJSON=True) or []:
                 channeldata = self.get_channel_data(row=row, channelno=1)
                 id = unicode(channeldata['channel_id'])
 
                 if len(id) > 0:
-                    if channel:
-                        if not id == channel:
-                            continue
-                    elif tested and check_key(results, 'last_tested'):
-                        if unicode(results['last_tested']) == id:
-                            last_tested_found = True
-                            continue
-                        elif last_tested_found:
-                            pass
-                        else:
-                            continue
-
-                    if check_key(results, id) and not tested and not first:
-                        continue
-
-                    livebandwidth = 0
-                    replaybandwidth = 0
-                    live = 'false'
-                    replay = 'false'
-                    epg = 'false'
-                    guide = 'false'
-
-                    if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    playdata = self.play_url(type='channel', channel=id, friendly=channeldata['channel_friendly'], id=None, test=True)
-
-                    if first and not self._last_login_success:
-                        if test_run:
-                            self.update_prefs()
-
-                        settings.setBool(key='_test_running', value=False)
-                        return 5
-
-                    if len(playdata['path']) > 0:
-                        CDMHEADERS = {}
-
-                        if check_key(playdata, 'license') and check_key(playdata['license'], 'drmConfig') and check_key(playdata['license']['drmConfig'], 'widevine'):
-                            if 'nlznl.solocoo.tv' in playdata['license']['drmConfig']['widevine']['drmServerUrl']:
-                                if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                                    self._abortRequested = True
-                                    return 5
-
-                            if check_key(playdata['license']['drmConfig']['widevine'], 'customHeaders'):
-                                for row in playdata['license']['drmConfig']['widevine']['customHeaders']:
-                                    CDMHEADERS[row] = playdata['license']['drmConfig']['widevine']['customHeaders'][row]
-
-                        self._session2 = Session(headers=CDMHEADERS)
-                        resp = self._session2.get(playdata['path'])
-
-                        if resp.status_code == 200:
-                            livebandwidth = find_highest_bandwidth(xml=resp.text)
-                            live = 'true'
-
-                    if check_key(results, id) and first and not tested:
-                        first = False
-
-                        if live == 'true':
-                            continue
-                        else:
-                            if test_run:
-                                self.update_prefs()
-
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
-
-                    first = False
-                    counter = 0
-
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 5:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
-
-                        counter += 1
+                    channels[id] = channeldata
+        except:
+            return CHANNEL_TEST_LIMIT
 
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+        if not results:
+            results = {}
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+        count = channeltest.run(channels=channels, results=results, probe=self.probe_channel, update=self.update_prefs, tested=tested, channel=channel, aborted=lambda: self._abortRequested)
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+        if self._debug_mode:
+            log.debug('Execution Done: api.test_channels')
 
-                    yesterday = datetime.datetime.now() - datetime.timedelta(1)
-                    fromtime = datetime.datetime.strftime(yesterday, "%Y-%m-%dT%H%M%S")
-                    channel_url = '{base_url}/v6/epg/locations/{friendly}/live/1?fromDate={date}'.format(base_url=CONST_API_URL, friendly=channeldata['channel_friendly'], date=fromtime)
-                    data = self.download(url=channel_url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True)
-                    program_id = None
+        return count
 
-                    if data:
-                        for row in data:
-                            if check_key(row, 'Channel') and check_key(row, 'Locations'):
-                                for row2 in row['Locations']:
-                                    program_id = row2['LocationId']
+    def probe_channel(self, channeldata, tester):
+        from resources.lib.base.mpd import find_highest_bandwidth
+        from resources.lib.base.session import Session
 
-                    if program_id:
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+        id = unicode(channeldata['channel_id'])
+        livebandwidth = 0
+        replaybandwidth = 0
+        live = 'false'
+        replay = 'false'
+        epg = 'false'
+        guide = 'false'
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+        if not tester.wait():
+            return None
 
-                        playdata = self.play_url(type='program', channel=id, friendly=channeldata['channel_friendly'], id=program_id, test=True)
+        playdata = self.play_url(type='channel', channel=id, friendly=channeldata['channel_friendly'], id=None, test=True)
 
-                        if len(playdata['path']) > 0:
-                            CDMHEADERS = {}
+        if not self._last_login_success:
+            return None
 
-                            if check_key(playdata, 'license') and check_key(playdata['license'], 'drmConfig') and check_key(playdata['license']['drmConfig'], 'widevine'):
-                                if 'nlznl.solocoo.tv' in playdata['license']['drmConfig']['widevine']['drmServerUrl']:
-                                    if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                                        self._abortRequested = True
-                                        return 5
+        if len(playdata['path']) > 0:
+            CDMHEADERS = {}
 
-                                if check_key(playdata['license']['drmConfig']['widevine'], 'customHeaders'):
-                                    for row in playdata['license']['drmConfig']['widevine']['customHeaders']:
-                                        CDMHEADERS[row] = playdata['license']['drmConfig']['widevine']['customHeaders'][row]
+            if check_key(playdata, 'license') and check_key(playdata['license'], 'drmConfig') and check_key(playdata['license']['drmConfig'], 'widevine'):
+                if 'nlznl.solocoo.tv' in playdata['license']['drmConfig']['widevine']['drmServerUrl']:
+                    if not tester.sleep(1):
+                        return None
 
-                            self._session2 = Session(headers=CDMHEADERS)
-                            resp = self._session2.get(playdata['path'])
+                if check_key(playdata['license']['drmConfig']['widevine'], 'customHeaders'):
+                    for row in playdata['license']['drmConfig']['widevine']['customHeaders']:
+                        CDMHEADERS[row] = playdata['license']['drmConfig']['widevine']['customHeaders'][row]
 
-                            if resp.status_code == 200:
-                                replaybandwidth = find_highest_bandwidth(xml=resp.text)
-                                replay = 'true'
+            if not tester.wait():
+                return None
 
-                    if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
-                        guide = 'true'
+            resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-                        if live == 'true':
-                            epg = 'true'
+            if resp.status_code == 200:
+                livebandwidth = find_highest_bandwidth(xml=resp.text)
+                live = 'true'
 
-                    results[id] = {
-                        'id': id,
-                        'live': live,
-                        'replay': replay,
-                        'livebandwidth': livebandwidth,
-                        'replaybandwidth': replaybandwidth,
-                        'epg': epg,
-                        'guide': guide,
-                    }
+        if not tester.wait():
+            return None
 
-                    results['last_tested'] = id
+        yesterday = datetime.datetime.now() - datetime.timedelta(1)
+        fromtime = datetime.datetime.strftime(yesterday, "%Y-%m-%dT%H%M%S")
+        channel_url = '{base_url}/v6/epg/locations/{friendly}/live/1?fromDate={date}'.format(base_url=CONST_API_URL, friendly=channeldata['channel_friendly'], date=fromtime)
+        data = self.download(url=channel_url, type="get", code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=False, check_data=True, allow_redirects=True)
+        program_id = None
 
-                    if not self._abortRequested:
-                        write_file(file="channel_test.json", data=results, isJSON=True)
+        if data:
+            for row in data:
+                if check_key(row, 'Channel') and check_key(row, 'Locations'):
+                    for row2 in row['Locations']:
+                        program_id = row2['LocationId']
 
-                    test_run = True
-                    counter = 0
+        if program_id:
+            if not tester.wait():
+                return None
 
-                    while not self._abortRequested and not xbmc.Monitor().abortRequested() and counter < 15:
-                        if self._abortRequested or xbmc.Monitor().waitForAbort(1):
-                            self._abortRequested = True
-                            break
+            playdata = self.play_url(type='program', channel=id, friendly=channeldata['channel_friendly'], id=program_id, test=True)
 
-                        counter += 1
+            if len(playdata['path']) > 0:
+                CDMHEADERS = {}
 
-                        if settings.getInt(key='_last_playing') > int(time.time() - 300):
-                            if test_run:
-                                self.update_prefs()
+                if check_key(playdata, 'license') and check_key(playdata['license'], 'drmConfig') and check_key(playdata['license']['drmConfig'], 'widevine'):
+                    if 'nlznl.solocoo.tv' in playdata['license']['drmConfig']['widevine']['drmServerUrl']:
+                        if not tester.sleep(1):
+                            return None
 
-                            settings.setBool(key='_test_running', value=False)
-                            return 5
+                    if check_key(playdata['license']['drmConfig']['widevine'], 'customHeaders'):
+                        for row in playdata['license']['drmConfig']['widevine']['customHeaders']:
+                            CDMHEADERS[row] = playdata['license']['drmConfig']['widevine']['customHeaders'][row]
 
-                    if self._abortRequested or xbmc.Monitor().abortRequested():
-                        return 5
+                if not tester.wait():
+                    return None
 
-                    count += 1
-        except:
-            if test_run:
-                self.update_prefs()
+                resp = Session(headers=CDMHEADERS).get(playdata['path'])
 
-            count = 5
+                if resp.status_code == 200:
+                    replaybandwidth = find_highest_bandwidth(xml=resp.text)
+                    replay = 'true'
 
-        settings.setBool(key='_test_running', value=False)
+        if os.path.isfile(ADDON_PROFILE + id + '_replay.json'):
+            guide = 'true'
 
-        if self._debug_mode:
-            log.debug('Execution Done: api.test_channels')
+            if live == 'true':
+                epg = 'true'
 
-        return count
+        return {
+            'id': id,
+            'live': live,
+            'replay': replay,
+            'livebandwidth': livebandwidth,
+            'replaybandwidth': replaybandwidth,
+            'epg': epg,
+            'guide': guide,
+        }
 
-    def update_prefs(self):
+    def update_prefs(self, changed=None):
         if self._debug_mode:
             log.debug('Executing: api.update_prefs')
+            log.debug('Vars: changed={changed}'.format(changed=changed))
 
         prefs = load_file(file="channel_prefs.json", isJSON=True)
         results = load_file(file="channel_test.json", isJSON=True)
@@ -680,7 +603,7 @@ class API(object):
             channeldata = self.get_channel_data(row=row, channelno=1)
             id = unicode(channeldata['channel_id'])
 
-            if len(unicode(id)) == 0:
+            if len(unicode(id)) == 0 or (changed is not None and not id in changed):
                 continue
 
             keys = ['live', 'replay', 'epg']
@@ -711,6 +634,7 @@ class API(object):
                     prefs[id][key] = results[id][key]
 
         write_file(file="channel_prefs.json", data=prefs, isJSON=True)
+        listcache.clear()
 
         if self._debug_mode:
             log.debug('Execution Done: api.update_prefs')
@@ -780,6 +704,8 @@ class API(object):
                     self._abortRequested = True
                     break
 
+                settings.invalidate()
+
             if self._abortRequested or xbmc.Monitor().abortRequested():
                 return playdata
 
@@ -1069,15 +995,8 @@ class API(object):
         return self.process_vod(data=data)
 
     def search(self, query):
-        file = "cache" + os.sep + "search_" + clean_filename(query) + ".json"
-
-        if self._enable_cache and not is_file_older_than_x_minutes(file=ADDON_PROFILE + file, minutes=10):
-            data = load_file(file=file, isJSON=True)
-        else:
-            data = self.download(url='{base_url}/v6/search/v2/combined?searchterm={query}&maxSerieResults=99999999&maxVideoResults=99999999&expand=true&expandlist=true'.format(base_url=CONST_API_URL, query=query), type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
-
-            if data and self._enable_cache:
-                write_file(file=file, data=data, isJSON=True)
+        # cached by download through the /v6/search/ rule in CONST_CACHE_TTL
+        data = self.download(url='{base_url}/v6/search/v2/combined?searchterm={query}&maxSerieResults=99999999&maxVideoResults=99999999&expand=true&expandlist=true'.format(base_url=CONST_API_URL, query=query), type='get', code=[200], data=None, json_data=False, data_return=True, return_json=True, retry=True, check_data=True)
 
         if not data:
             return None
@@ -1281,6 +1200,22 @@ class API(object):
 
         return True
 
+    def _request(self, url, type, data, json_data, allow_redirects):
+        from requests.exceptions import RequestException
+
+        try:
+            if type == "post" and data:
+                if json_data:
+                    return self._session.post(url, json=data, allow_redirects=allow_redirects)
+
+                return self._session.post(url, data=data, allow_redirects=allow_redirects)
+
+            return getattr(self._session, type)(url, allow_redirects=allow_redirects)
+        except RequestException as e:
+            # an unreachable host or an open circuit fails this call, not the whole navigation
+            log.debug('Request failed: {error}'.format(error=e))
+            return None
+
     def download(self, url, type, code=None, data=None, json_data=True, data_return=True, return_json=True, retry=True, check_data=True, allow_redirects=True):
         if self._abortRequested or xbmc.Monitor().abortRequested():
             return None
@@ -1289,13 +1224,30 @@ class API(object):
             log.debug('Executing: api.download')
             log.debug('Vars: url={url}, type={type}, code={code}, data={data}, json_data={json_data}, data_return={data_return}, return_json={return_json}, retry={retry}, check_data={check_data}, allow_redirects={allow_redirects}'.format(url=url, type=type, code=code, data=data, json_data=json_data, data_return=data_return, return_json=return_json, retry=retry, check_data=check_data, allow_redirects=allow_redirects))
 
-        if type == "post" and data:
-            if json_data:
-                resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-            else:
-                resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-        else:
-            resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+        cache_ttl = 0
+
+        # posts are never cached, only gets of endpoints with a known lifetime
+        if type == "get" and data_return and return_json and settings.getBool(key='enable_cache'):
+            cache_ttl = httpcache.get_ttl(url=url, rules=CONST_CACHE_TTL)
+
+        if cache_ttl:
+            returned_data = httpcache.get(url=url)
+
+            if returned_data is not None:
+                if self._debug_mode:
+                    log.debug('Returned data from cache: {data}'.format(data=returned_data))
+                    log.debug('Execution Done: api.download')
+
+                return returned_data
+
+        resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects)
+
+        if resp is None:
+            if self._debug_mode:
+                log.debug('Returned data: None')
+                log.debug('Execution Done: api.download')
+
+            return None
 
         if self._debug_mode:
             log.debug('Response')
@@ -1303,7 +1255,8 @@ class API(object):
             log.debug('Response status code: {status_code}'.format(status_code=resp.status_code))
 
         if (code and not resp.status_code in code) or (check_data and not self.check_data(resp=resp)):
-            if not retry:
+            # an overloaded or failing server is not fixed by logging in again
+            if not retry or resp.status_code in SESSION_RETRY_STATUSES:
                 if self._debug_mode:
                     log.debug('Not retrying')
                     log.debug('Returned data: None')
@@ -1314,7 +1267,12 @@ class API(object):
             if self._debug_mode:
                 log.debug('Trying to update login data')
 
-            self.new_session(force=True, retry=False)
+            session_age = self._session_age
+
+            with _session_lock:
+                # a thread that waited on the lock finds the session already renewed by the one before it
+                if self._session_age == session_age:
+                    self.new_session(force=True, retry=False)
 
             if not self.logged_in:
                 if self._debug_mode:
@@ -1324,13 +1282,14 @@ class API(object):
 
                 return None
 
-            if type == "post" and data:
-                if json_data:
-                    resp = self._session.post(url, json=data, allow_redirects=allow_redirects)
-                else:
-                    resp = self._session.post(url, data=data, allow_redirects=allow_redirects)
-            else:
-                resp = getattr(self._session, type)(url, allow_redirects=allow_redirects)
+            resp = self._request(url=url, type=type, data=data, json_data=json_data, allow_redirects=allow_redirects)
+
+            if resp is None:
+                if self._debug_mode:
+                    log.debug('Returned data: None')
+                    log.debug('Execution Done: api.download')
+
+                return None
 
             if self._debug_mode:
                 log.debug('Response')
@@ -1353,6 +1312,9 @@ class API(object):
                     except:
                         returned_data = resp.json()
 
+                    if cache_ttl:
+                        httpcache.set(url=url, data=returned_data, ttl=cache_ttl, headers=resp.headers)
+
                     if self._debug_mode:
                         log.debug('Returned data: {data}'.format(data=returned_data))
                         log.debug('Execution Done: api.download')
@@ -13,6 +13,8 @@ CONST_BASE_HEADERS = {
     'Sec-Fetch-Site': 'same-origin',
 }
 
+CONST_CACHE_TTL = []
+
 CONST_EPG = 'https://dut-epg.github.io/t.epg.xml.zip'
 CONST_IMAGES = 'https://dut-epg.github.io/t.images.zip'
 CONST_MD5 = 'https://dut-epg.github.io/t.md5.json'
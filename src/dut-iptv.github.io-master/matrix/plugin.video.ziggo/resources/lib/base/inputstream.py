@@ -1,4 +1,4 @@
-import base64, glob, json, os, platform, shutil, sys, time, xbmc, xbmcaddon
+import base64, glob, json, os, shutil, sys, time, xbmc, xbmcaddon
 
 from resources.lib.base import gui, settings
 from resources.lib.base.constants import ADDON_PROFILE, SESSION_CHUNKSIZE
@@ -15,8 +15,6 @@ try:
 except NameError:
     unicode = str
 
-from zipfile import ZipFile
-
 class InputstreamItem(object):
     manifest_type = ''
     license_type = ''
@@ -188,6 +186,8 @@ def install_widevine(reinstall=False):
     return True
 
 def _get_system_arch():
+    import platform
+
     if xbmc.getCondVisibility('system.platform.android'):
         system = 'Android'
     elif 'WindowsApps' in xbmc.translatePath('special://xbmcbin/'):
@@ -259,6 +259,8 @@ def _download(url, dst, dst_path, arch, md5=None):
                 with open(dst_path, "wb") as decoded_file:
                     decoded_file.write(decoded_string)
             else:
+                from zipfile import ZipFile
+
                 with ZipFile(tmp, 'r') as zipObj:
                    zipObj.extractall(ADDON_PROFILE + "tmp" + os.sep)
 
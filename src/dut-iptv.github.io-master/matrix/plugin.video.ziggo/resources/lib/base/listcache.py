@@ -0,0 +1,60 @@
+import hashlib, io, json, os, shutil, time, xbmc
+
+from resources.lib.base.constants import ADDON_PROFILE
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+_path = os.path.join(ADDON_PROFILE, 'cache', 'listings')
+
+def clear():
+    shutil.rmtree(_path, ignore_errors=True)
+
+def fingerprint(files):
+    result = []
+
+    for file in files:
+        try:
+            stat = os.stat(ADDON_PROFILE + file)
+            result.append([file, stat.st_mtime, stat.st_size])
+        except OSError:
+            result.append([file, None, None])
+
+    return result
+
+def get(route, params, files):
+    try:
+        with io.open(os.path.join(_path, _key(route=route, params=params) + '.json'), 'r', encoding='utf-8') as f:
+            entry = json.loads(f.read())
+    except:
+        return None
+
+    # a listing is only reused while every file it was built from is still the same file
+    if not entry['expires'] > time.time() or not entry['fingerprint'] == fingerprint(files=files):
+        return None
+
+    return entry['data']
+
+def set(route, params, files, data, ttl):
+    entry = {
+        'expires': int(time.time() + ttl),
+        'fingerprint': fingerprint(files=files),
+        'data': data,
+    }
+
+    try:
+        if not os.path.isdir(_path):
+            os.makedirs(_path)
+
+        with io.open(os.path.join(_path, _key(route=route, params=params) + '.json'), 'w', encoding='utf-8') as f:
+            f.write(unicode(json.dumps(entry, ensure_ascii=False)))
+    except:
+        pass
+
+def _key(route, params):
+    # labels depend on the interface language and relative days on the date, so both are part of the key
+    key = json.dumps([route, params, xbmc.getLanguage(xbmc.ISO_639_1), time.strftime('%Y%m%d')], sort_keys=True)
+
+    return hashlib.md5(key.encode('utf-8')).hexdigest()
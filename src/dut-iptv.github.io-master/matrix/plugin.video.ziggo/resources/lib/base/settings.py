@@ -1,5 +1,6 @@
-import json, xbmcaddon
+import json, threading, xbmc, xbmcaddon
 
+from contextlib import contextmanager
 from resources.lib.base.constants import ADDON_ID
 
 try:
@@ -7,8 +8,75 @@ try:
 except NameError:
     unicode = str
 
+_addon = None
+_monitor = None
+_cache = {}
+_pending = {}
+_lock = threading.RLock()
+_local = threading.local()
+_timer = None
+
+FLUSH_DELAY = 1
+
+class SettingsMonitor(xbmc.Monitor):
+    def onSettingsChanged(self):
+        invalidate()
+
 def open():
-    xbmcaddon.Addon(ADDON_ID).openSettings()
+    flush()
+    _get_addon().openSettings()
+    invalidate()
+
+def flush():
+    global _timer
+
+    with _lock:
+        if _timer:
+            _timer.cancel()
+            _timer = None
+
+        if not _pending:
+            return
+
+        addon = _get_addon()
+
+        for key in sorted(_pending):
+            addon.setSetting(key, _pending[key])
+            _cache[key] = unicode(_pending[key])
+
+        _pending.clear()
+
+@contextmanager
+def staged():
+    # writes from this thread are held back and only seen by it, until commit() hands them to the write-behind
+    _local.staged = {}
+
+    try:
+        yield
+    finally:
+        _local.staged = None
+
+def commit():
+    staged = getattr(_local, 'staged', None)
+
+    if not staged:
+        return
+
+    _local.staged = None
+
+    for key in sorted(staged):
+        set(key, staged[key])
+
+    _local.staged = {}
+
+def invalidate():
+    global _addon
+
+    # writes still waiting go out first, the snapshot is then rebuilt from what Kodi has stored
+    with _lock:
+        flush()
+        _cache.clear()
+        _addon = None
 
 def getDict(key, default=None):
     try:
@@ -52,10 +120,54 @@ def setBool(key, value=True):
     set(key, 'true' if value else 'false')
 
 def get(key, default=''):
-    return unicode(xbmcaddon.Addon(ADDON_ID).getSetting(key)) or unicode(default)
+    staged = getattr(_local, 'staged', None)
+
+    if staged and key in staged:
+        return unicode(staged[key]) or unicode(default)
+
+    with _lock:
+        if key in _pending:
+            value = _pending[key]
+        elif key in _cache:
+            value = _cache[key]
+        else:
+            value = unicode(_get_addon().getSetting(key))
+            _cache[key] = value
+
+    return unicode(value) or unicode(default)
 
 def set(key, value=''):
-    xbmcaddon.Addon(ADDON_ID).setSetting(key, str(value))
+    global _timer
+
+    value = str(value)
+    staged = getattr(_local, 'staged', None)
+
+    if staged is not None:
+        staged[key] = value
+        return
+
+    with _lock:
+        if _pending.get(key, _cache.get(key)) == value:
+            return
+
+        _pending[key] = value
+
+        if not _timer:
+            _timer = threading.Timer(FLUSH_DELAY, flush)
+            _timer.daemon = True
+            _timer.start()
+
+def _get_addon():
+    global _addon, _monitor
+
+    with _lock:
+        if not _addon:
+            _addon = xbmcaddon.Addon(ADDON_ID)
+
+        if not _monitor:
+            _monitor = SettingsMonitor()
+
+        return _addon
 
 FRESH = getBool('_fresh', True)
 if FRESH:
@@ -1,26 +1,22 @@
-import collections, glob, hashlib, io, json, os, platform, pytz, re, requests, shutil, string, struct, socket, sys, time, unicodedata, xbmc, xbmcaddon
+import base64, collections, datetime, glob, hashlib, io, json, os, re, shutil, string, sys, time, xbmc, xbmcaddon
 
 from contextlib import closing
-from resources.lib.base import settings
-from resources.lib.base.constants import ADDON_ID, ADDON_PATH, ADDON_PROFILE, DEFAULT_USER_AGENT
-from resources.lib.base.encrypt import Credentials
+from resources.lib.base import listcache, settings
+from resources.lib.base.constants import ADDON_ID, ADDON_PATH, ADDON_PROFILE, DEFAULT_USER_AGENT, SESSION_CHUNKSIZE, SESSION_DOWNLOAD_TIMEOUT
 from resources.lib.base.log import log
 from resources.lib.constants import CONST_EPG, CONST_IMAGES, CONST_MD5, CONST_MINIMALEPG, CONST_RADIO, CONST_SETTINGS, CONST_VOD
 
-try:
-    from io import BytesIO
-except ImportError:
-    from StringIO import StringIO as BytesIO
-
 try:
     unicode
 except NameError:
     unicode = str
 
-from zipfile import ZipFile
-
 debug_mode = settings.getBool(key='enable_debug')
 
+_kodi_version = []
+_timezones = {}
+_utc_offsets = {}
+
 def change_icon():
     try:
         settingsJSON = load_file(file='settings.json', isJSON=True)
@@ -38,6 +34,8 @@ def change_icon():
                     log.debug('No icon.png found in Addon Path or ICON settings MD5 does not match Addon Path icon.png MD5, attempting to change ICON')
                     log.debug('Downloading ICON from {url}'.format(url=settingsJSON['icon']['url']))
 
+                import requests
+
                 r = requests.get(settingsJSON['icon']['url'], stream=True)
 
                 if r.status_code == 200:
@@ -157,6 +155,8 @@ def clean_filename(filename):
     for r in ' ':
         filename = filename.replace(r,'_')
 
+    import unicodedata
+
     cleaned_filename = unicodedata.normalize('NFKD', filename).encode('ASCII', 'ignore').decode()
     whitelist = "-_.() %s%s" % (string.ascii_letters, string.digits)
 
@@ -168,7 +168,7 @@ def clear_cache():
     if not os.path.isdir(ADDON_PROFILE + "cache"):
         os.makedirs(ADDON_PROFILE + "cache")
 
-    for file in glob.glob(ADDON_PROFILE + "cache" + os.sep + "*.json"):
+    for file in glob.glob(ADDON_PROFILE + "cache" + os.sep + "*.json") + glob.glob(ADDON_PROFILE + "cache" + os.sep + "http" + os.sep + "*.json") + glob.glob(ADDON_PROFILE + "cache" + os.sep + "listings" + os.sep + "*.json"):
         if is_file_older_than_x_days(file=file, days=1):
             os.remove(file)
 
@@ -189,14 +189,19 @@ def combine_playlist():
     write_file(file='playlist.m3u8', data=tv + radio, isJSON=False)
 
 def convert_datetime_timezone(dt, tz1, tz2):
-    tz1 = pytz.timezone(tz1)
-    tz2 = pytz.timezone(tz2)
+    tz1 = get_timezone(tz1)
+    tz2 = get_timezone(tz2)
 
     dt = tz1.localize(dt)
     dt = dt.astimezone(tz2)
 
     return dt
 
+def convert_timestamp_timezone(timestamp, tz):
+    timestamp = int(timestamp)
+
+    return timestamp + get_utc_offset(timestamp=timestamp, tz=tz)
+
 def date_to_nl_dag(curdate):
     dag = {
         "Mon": "Maandag",
@@ -228,6 +233,15 @@ def date_to_nl_maand(curdate):
 
     return maand.get(curdate.strftime("%B"), "")
 
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+
+    try:
+        return json.loads(base64.urlsafe_b64decode(str(cursor)).decode('utf-8'))
+    except:
+        return None
+
 def download_epg():
     settings.setInt(key='_epgrun', value=1)
     settings.setInt(key='_epgruntime', value=time.time())
@@ -240,13 +254,14 @@ def download_epg():
     if ADDON_ID == "plugin.video.ziggo" and settings.getBool(key='_base_v3') == True:
         url = url.replace('epg.xml.', 'epg.xml.v3.')
 
-    resp = requests.get(url=url)
+    md5 = download_zip(url=url)
+    settings.set(key='_epg_md5', value=md5)
 
-    settings.set(key='_epg_md5', value=hashlib.md5(resp.content).hexdigest())
-
-    zipfile = ZipFile(BytesIO(resp.content))
-    zipfile.extractall(ADDON_PROFILE)
-    zipfile.close()
+    try:
+        from resources.lib.base.replay import create_db
+        create_db()
+    except:
+        log.exception('Failed to create replay database')
 
     for file in glob.glob(ADDON_PROFILE + "*_replay.xml"):
         if is_file_older_than_x_days(file=file, days=7):
@@ -256,8 +271,48 @@ def download_epg():
         if is_file_older_than_x_days(file=file, days=7):
             os.remove(file)
 
+    listcache.clear()
     settings.setInt("_epgrun", 0)
 
+def download_file(url, file):
+    validators = load_file(file='validators.json', isJSON=True)
+    headers = {}
+
+    if not validators:
+        validators = {}
+
+    if os.path.isfile(ADDON_PROFILE + file) and check_key(validators, url):
+        if check_key(validators[url], 'etag'):
+            headers['If-None-Match'] = validators[url]['etag']
+
+        if check_key(validators[url], 'last_modified'):
+            headers['If-Modified-Since'] = validators[url]['last_modified']
+
+    import requests
+
+    resp = requests.get(url=url, headers=headers)
+
+    if resp.status_code == 304:
+        os.utime(ADDON_PROFILE + file, None)
+        return False
+
+    with open(ADDON_PROFILE + file + '.tmp', 'wb') as f:
+        f.write(resp.content)
+
+    replace_file(src=ADDON_PROFILE + file + '.tmp', dst=ADDON_PROFILE + file)
+
+    if resp.status_code == 200 and (resp.headers.get('ETag') or resp.headers.get('Last-Modified')):
+        validators[url] = {
+            'etag': resp.headers.get('ETag', ''),
+            'last_modified': resp.headers.get('Last-Modified', ''),
+        }
+    else:
+        validators.pop(url, None)
+
+    write_file(file='validators.json', data=validators, isJSON=True)
+
+    return True
+
 def download_files():
     download_mdfive()
     renew_images()
@@ -266,31 +321,26 @@ def download_files():
     renew_vod()
 
 def download_images():
-    resp = requests.get(url=CONST_IMAGES)
-
-    settings.set(key='_images_md5', value=hashlib.md5(resp.content).hexdigest())
-
-    zipfile = ZipFile(BytesIO(resp.content))
-    zipfile.extractall(ADDON_PROFILE)
-    zipfile.close()
+    md5 = download_zip(url=CONST_IMAGES)
+    settings.set(key='_images_md5', value=md5)
 
     for file in glob.glob(ADDON_PROFILE + "images" + os.sep + "*.png"):
         if is_file_older_than_x_days(file=file, days=7):
             os.remove(file)
 
 def download_mdfive():
-    resp = requests.get(url=CONST_MD5)
-    write_file(file='md5.json', data=resp.text, isJSON=False)
+    download_file(url=CONST_MD5, file='md5.json')
 
 def download_settings():
-    resp = requests.get(url=CONST_SETTINGS)
-    write_file(file='settings.json', data=resp.text, isJSON=False)
+    changed = download_file(url=CONST_SETTINGS, file='settings.json')
 
     if settings.getBool(key='enable_radio') == True:
-        resp = requests.get(url=CONST_RADIO)
-        write_file(file='radio.m3u8', data=resp.text, isJSON=False)
+        download_file(url=CONST_RADIO, file='radio.m3u8')
         combine_playlist()
 
+    if not changed and len(settings.get(key='_user_agent')) > 0:
+        return
+
     settingsJSON = load_file(file='settings.json', isJSON=True)
 
     try:
@@ -304,67 +354,63 @@ def download_vod():
     if ADDON_ID == "plugin.video.ziggo" and settings.getBool(key='_base_v3') == True:
         url = url.replace('vod.', 'vod.v3.')
 
-    resp = requests.get(url=url)
-    write_file(file='vod.json', data=resp.text, isJSON=False)
-
-    settings.set(key='_vod_md5', value=hashlib.md5(resp.content).hexdigest())
+    download_file(url=url, file='vod.json')
 
-def find_free_port():
-    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
-        s.bind(('', 0))
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        return s.getsockname()[1]
+    settings.set(key='_vod_md5', value=md5sum(ADDON_PROFILE + 'vod.json'))
 
-def find_highest_bandwidth(xml):
-    bandwidth = 0
+def download_zip(url):
+    from resources.lib.base.session import Session
 
-    result = re.findall(r'<[rR]epresentation(?:(?!<[rR]epresentation)(?!</[aA]daptationSet>)[\S\s])+', xml)
-    bandwidth_regex = r"bandwidth=\"([0-9]+)\""
+    tmp_file = ADDON_PROFILE + os.path.basename(url) + '.tmp'
 
-    for match in result:
-        if not 'id="video' in match and not 'id="Video' in match:
-            continue
+    try:
+        # the read timeout bounds every wait for data, a stalled host cannot hold up the hourly run
+        md5 = Session().chunked_dl(url=url, dst_path=tmp_file, timeout=SESSION_DOWNLOAD_TIMEOUT)
+        extract_zip(file=tmp_file, path=ADDON_PROFILE)
+    finally:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
 
-        match2 = re.search(bandwidth_regex, match)
+    return md5
 
-        if match2:
-            try:
-                if int(match2.group(1)) > bandwidth:
-                    bandwidth = int(match2.group(1))
-            except:
-                pass
+def encode_cursor(*values):
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode('utf-8')).decode('utf-8')
 
-    return bandwidth
+def extract_zip(file, path):
+    from zipfile import ZipFile
 
-def force_highest_bandwidth(xml):
-    try:
-        results = {}
+    root = os.path.realpath(path)
 
-        result = re.findall(r'<[rR]epresentation(?:(?!<[rR]epresentation)(?!</[aA]daptationSet>)[\S\s])+', xml)
-        bandwidth_regex = r"bandwidth=\"([0-9]+)\""
+    with ZipFile(file) as zipfile:
+        for member in zipfile.infolist():
+            dst = os.path.realpath(os.path.join(root, member.filename))
 
-        for match in result:
-            if not 'id="video' in match and not 'id="Video' in match:
+            if not dst.startswith(root + os.sep):
                 continue
 
-            bandwidth = 0
-            match2 = re.search(bandwidth_regex, match)
+            if member.filename.endswith('/'):
+                if not os.path.isdir(dst):
+                    os.makedirs(dst)
 
-            if match2:
-                bandwidth = match2.group(1)
+                continue
 
-            results[bandwidth] = match
+            if not os.path.isdir(os.path.dirname(dst)):
+                os.makedirs(os.path.dirname(dst))
 
-        if len(results) > 1:
-            results.pop(max(results, key=int))
+            tmp_dst = dst + '.tmp'
 
-        for bandwidth in results:
-            xml = xml.replace(results[bandwidth], "")
+            with zipfile.open(member) as src, open(tmp_dst, 'wb') as f:
+                shutil.copyfileobj(src, f, SESSION_CHUNKSIZE * 16)
 
-    except:
-        pass
+            replace_file(src=tmp_dst, dst=dst)
 
-    return xml
+def find_free_port():
+    import socket
+
+    with closing(socket.socket(socket.AF_INET, socket.SOCK_STREAM)) as s:
+        s.bind(('', 0))
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        return s.getsockname()[1]
 
 def get_credentials():
     username = settings.get(key='_username')
@@ -374,15 +420,26 @@ def get_credentials():
         set_credentials(username, password)
         return {'username' : username, 'password' : password }
 
+    from resources.lib.base.encrypt import Credentials
+
     return Credentials().decode_credentials(username, password)
 
 def get_kodi_version():
     try:
-        return int(xbmc.getInfoLabel("System.BuildVersion").split('.')[0])
+        return _kodi_version[0]
+    except IndexError:
+        pass
+
+    try:
+        _kodi_version.append(int(xbmc.getInfoLabel("System.BuildVersion").split('.')[0]))
     except:
         return 0
 
+    return _kodi_version[0]
+
 def get_system_arch():
+    import platform, struct
+
     if xbmc.getCondVisibility('System.Platform.UWP') or '4n2hpmxwrvr6p' in xbmc.translatePath('special://xbmc/'):
         system = 'UWP'
     elif xbmc.getCondVisibility('System.Platform.Android'):
@@ -415,6 +472,32 @@ def get_system_arch():
 
     return system, arch
 
+def get_timezone(tz):
+    try:
+        return _timezones[tz]
+    except KeyError:
+        import pytz
+
+        _timezones[tz] = pytz.timezone(tz)
+
+    return _timezones[tz]
+
+def get_utc_offset(timestamp, tz):
+    hour = int(timestamp) // 3600 * 3600
+
+    try:
+        return _utc_offsets[(tz, hour)]
+    except KeyError:
+        pass
+
+    if len(_utc_offsets) > 10000:
+        _utc_offsets.clear()
+
+    offset = datetime.datetime.utcfromtimestamp(hour).replace(tzinfo=get_timezone(tz="UTC")).astimezone(get_timezone(tz)).utcoffset()
+    _utc_offsets[(tz, hour)] = offset.days * 86400 + offset.seconds
+
+    return _utc_offsets[(tz, hour)]
+
 def is_file_older_than_x_days(file, days=1):
     if not os.path.isfile(file):
         return True
@@ -509,7 +592,18 @@ def renew_vod():
         except:
             download_vod()
 
+def replace_file(src, dst):
+    try:
+        os.replace(src, dst)
+    except AttributeError:
+        if os.name == 'nt' and os.path.isfile(dst):
+            os.remove(dst)
+
+        os.rename(src, dst)
+
 def set_credentials(username, password):
+    from resources.lib.base.encrypt import Credentials
+
     encoded = Credentials().encode_credentials(username, password)
 
     try:
@@ -522,74 +616,6 @@ def set_credentials(username, password):
     except:
         settings.set(key='_pswd', value=encoded['password'])
 
-def set_duration(xml):
-    try:
-        duration = settings.getInt(key='_stream_duration')
-
-        if duration and duration > 0:
-            given_duration = 0
-            matched = False
-            duration += settings.getInt(key='add_duration')
-
-            regex = r"mediaPresentationDuration=\"PT([0-9]*)M([0-9]*)[0-9.]*S\""
-            matches2 = re.finditer(regex, xml, re.MULTILINE)
-
-            if len([i for i in matches2]) > 0:
-                matches = re.finditer(regex, xml, re.MULTILINE)
-                matched = True
-            else:
-                regex2 = r"mediaPresentationDuration=\"PT([0-9]*)H([0-9]*)M([0-9]*)[0-9.]*S\""
-                matches3 = re.finditer(regex2, xml, re.MULTILINE)
-
-                if len([i for i in matches3]) > 0:
-                    matches = re.finditer(regex2, xml, re.MULTILINE)
-                    matched = True
-                else:
-                    regex3 = r"mediaPresentationDuration=\"PT([0-9]*)D([0-9]*)H([0-9]*)M([0-9]*)[0-9.]*S\""
-                    matches4 = re.finditer(regex3, xml, re.MULTILINE)
-
-                    if len([i for i in matches4]) > 0:
-                        matches = re.finditer(regex3, xml, re.MULTILINE)
-                        matched = True
-
-            if matched == True:
-                given_day = 0
-                given_hour = 0
-                given_minute = 0
-                given_second = 0
-
-                for matchNum, match in enumerate(matches, start=1):
-                    if len(match.groups()) == 2:
-                        given_minute = int(match.group(1))
-                        given_second = int(match.group(2))
-                    elif len(match.groups()) == 3:
-                        given_hour = int(match.group(1))
-                        given_minute = int(match.group(2))
-                        given_second = int(match.group(3))
-                    elif len(match.groups()) == 4:
-                        given_day = int(match.group(1))
-                        given_hour = int(match.group(2))
-                        given_minute = int(match.group(3))
-                        given_second = int(match.group(4))
-
-                given_duration = (given_day * 24* 60 * 60) + (given_hour * 60 * 60) + (given_minute * 60) + given_second
-
-            if not given_duration > 0 or given_duration > duration:
-                minute, second = divmod(duration, 60)
-                hour, minute = divmod(minute, 60)
-
-                regex4 = r"mediaPresentationDuration=\"[a-zA-Z0-9.]*\""
-                subst = "mediaPresentationDuration=\"PT{hour}H{minute}M{second}S\"".format(hour=hour, minute=minute, second=second)
-                regex5 = r"duration=\"[a-zA-Z0-9.]*\">"
-                subst2 = "duration=\"PT{hour}H{minute}M{second}S\">".format(hour=hour, minute=minute, second=second)
-
-                xml = re.sub(regex4, subst, xml, 0, re.MULTILINE)
-                xml = re.sub(regex5, subst2, xml, 0, re.MULTILINE)
-    except:
-        pass
-
-    return xml
-
 def write_file(file, data, isJSON=False):
     with io.open(ADDON_PROFILE + file, 'w', encoding="utf-8") as f:
         if isJSON == True:
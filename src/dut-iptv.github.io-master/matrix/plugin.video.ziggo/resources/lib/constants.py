@@ -23,6 +23,12 @@ CONST_BASE_HEADERS = {
     'Sec-Fetch-Site': 'cross-site',
 }
 
+CONST_CACHE_TTL = [
+    (r'/channels\?byLocationId=', 86400),
+    (r'/listings/[^/?]+$', 60),
+    (r'/mediaitems/[^/?]+$', 60),
+]
+
 CONST_DEFAULT_CLIENTID = '4.23.13'
 CONST_EPG = 'https://dut-epg.github.io/z.epg.xml.zip'
 CONST_IMAGES = 'https://dut-epg.github.io/z.images.zip'
@@ -0,0 +1,274 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bitparallel.py
+
+Pure python implementation of the python-Levenshtein functions used by
+StringMatcher, for platforms where the C extension is not available.
+
+Distances are computed a whole row at a time using the bits of python
+integers (Hyyrö's variant of Myers' algorithm for the edit distance,
+Allison-Dix for the longest common subsequence). Edit operations are traced
+back through the matrix the same way python-Levenshtein does, so ratios,
+opcodes and matching blocks are identical to the C implementation.
+"""
+
+
+def _popcount(n):
+    return bin(n).count('1')
+
+
+def _length(s):
+    return s if isinstance(s, int) else len(s)
+
+
+def _affix(s1, s2):
+    """Return the lengths of the common prefix and suffix of s1 and s2."""
+    len1, len2 = len(s1), len(s2)
+
+    prefix = 0
+    while prefix < len1 and prefix < len2 and s1[prefix] == s2[prefix]:
+        prefix += 1
+
+    suffix = 0
+    while prefix + suffix < len1 and prefix + suffix < len2 and s1[len1 - suffix - 1] == s2[len2 - suffix - 1]:
+        suffix += 1
+
+    return prefix, suffix
+
+
+_masks_cache = [None, None]
+
+
+def _match_masks(s):
+    # partial_ratio compares the same shorter string against many substrings
+    if type(_masks_cache[0]) is type(s) and _masks_cache[0] == s:
+        return _masks_cache[1]
+
+    masks = {}
+    bit = 1
+
+    for c in s:
+        masks[c] = masks.get(c, 0) | bit
+        bit <<= 1
+
+    _masks_cache[0] = s
+    _masks_cache[1] = masks
+    return masks
+
+
+def _lcs(s1, s2):
+    prefix, suffix = _affix(s1, s2)
+    s1 = s1[prefix:len(s1) - suffix]
+    s2 = s2[prefix:len(s2) - suffix]
+
+    if not s1 or not s2:
+        return prefix + suffix
+
+    masks = _match_masks(s1)
+    mask = (1 << len(s1)) - 1
+    v = mask
+
+    for c in s2:
+        u = v & masks.get(c, 0)
+        v = ((v + u) | (v - u)) & mask
+
+    return prefix + suffix + len(s1) - _popcount(v)
+
+
+def _matrix(s1, s2):
+    """Return the rows of the edit distance matrix of s1 against s2.
+
+    Row i holds the bit vectors of the positions j where D[i][j] - D[i][j - 1]
+    is +1 and -1, followed by those where D[i][j] - D[i - 1][j] is +1 and -1.
+    """
+    masks = _match_masks(s2)
+    mask = (1 << len(s2)) - 1
+    vp, vn = mask, 0
+    rows = [(vp, vn, 0, 0)]
+
+    for c in s1:
+        eq = masks.get(c, 0)
+        d0 = (((eq & vp) + vp) ^ vp) | eq | vn
+        hp = vn | ~(d0 | vp)
+        hn = vp & d0
+        hp = (hp << 1) | 1
+        hn = hn << 1
+        vp = (hn | ~(d0 | hp)) & mask
+        vn = hp & d0 & mask
+        rows.append((vp, vn, hp, hn))
+
+    return rows
+
+
+def _delta(plus, minus, bit):
+    if plus & bit:
+        return 1
+    if minus & bit:
+        return -1
+    return 0
+
+
+def _editops(s1, s2):
+    prefix, suffix = _affix(s1, s2)
+    s1 = s1[prefix:len(s1) - suffix]
+    s2 = s2[prefix:len(s2) - suffix]
+
+    rows = _matrix(s1, s2)
+    i, j = len(s1), len(s2)
+    direction = 0
+    ops = []
+
+    # D[i][j] is never needed itself, only its difference with the cells to
+    # the left, above and diagonally above, which are single bits of the rows
+    while i or j:
+        vp, vn, hp, hn = rows[i]
+        left = 1 << (j - 1) if j else 0
+
+        # prefer continuing in the same direction
+        if direction < 0 and vp & left:
+            j -= 1
+            ops.append(('insert', i + prefix, j + prefix))
+            continue
+
+        if direction > 0 and i and hp & (1 << j):
+            i -= 1
+            ops.append(('delete', i + prefix, j + prefix))
+            continue
+
+        if i and j:
+            diagonal = _delta(vp, vn, left) + _delta(hp, hn, left)
+
+            if diagonal == 0 and s1[i - 1] == s2[j - 1]:
+                i -= 1
+                j -= 1
+                direction = 0
+                continue
+
+            if diagonal == 1:
+                i -= 1
+                j -= 1
+                direction = 0
+                ops.append(('replace', i + prefix, j + prefix))
+                continue
+
+        # a direct turn from insert to delete is never taken, go diagonally instead
+        if direction == 0 and vp & left:
+            j -= 1
+            direction = -1
+            ops.append(('insert', i + prefix, j + prefix))
+            continue
+
+        if direction == 0 and i and hp & (1 << j):
+            i -= 1
+            direction = 1
+            ops.append(('delete', i + prefix, j + prefix))
+            continue
+
+        raise RuntimeError('lost in the cost matrix')
+
+    ops.reverse()
+    return ops
+
+
+def _editops_to_opcodes(ops, len1, len2):
+    blocks = []
+    spos = dpos = 0
+    k = 0
+
+    while k < len(ops):
+        op, s, d = ops[k]
+
+        if spos < s or dpos < d:
+            blocks.append(('equal', spos, s, dpos, d))
+            spos, dpos = s, d
+
+        sbeg, dbeg = spos, dpos
+
+        while k < len(ops) and ops[k][0] == op and ops[k][1] == spos and ops[k][2] == dpos:
+            if op != 'insert':
+                spos += 1
+            if op != 'delete':
+                dpos += 1
+            k += 1
+
+        blocks.append((op, sbeg, spos, dbeg, dpos))
+
+    if spos < len1 or dpos < len2:
+        blocks.append(('equal', spos, len1, dpos, len2))
+
+    return blocks
+
+
+def _opcodes_to_editops(blocks):
+    ops = []
+
+    for op, sbeg, send, dbeg, dend in blocks:
+        if op == 'replace':
+            ops.extend(('replace', sbeg + k, dbeg + k) for k in range(send - sbeg))
+        elif op == 'delete':
+            ops.extend(('delete', sbeg + k, dbeg) for k in range(send - sbeg))
+        elif op == 'insert':
+            ops.extend(('insert', sbeg, dbeg + k) for k in range(dend - dbeg))
+
+    return ops
+
+
+def distance(s1, s2):
+    prefix, suffix = _affix(s1, s2)
+    s1 = s1[prefix:len(s1) - suffix]
+    s2 = s2[prefix:len(s2) - suffix]
+
+    vp, vn = _matrix(s1, s2)[-1][:2]
+    return len(s1) + _popcount(vp) - _popcount(vn)
+
+
+def ratio(s1, s2):
+    lensum = len(s1) + len(s2)
+
+    if not lensum:
+        return 1.0
+
+    return 2.0 * _lcs(s1, s2) / lensum
+
+
+def editops(*args):
+    if len(args) == 3:
+        if args[0] and len(args[0][0]) == 5:
+            return _opcodes_to_editops(args[0])
+        return list(args[0])
+
+    return _editops(args[0], args[1])
+
+
+def opcodes(*args):
+    if len(args) == 3:
+        ops, s1, s2 = args
+        if ops and len(ops[0]) == 5:
+            return list(ops)
+    else:
+        s1, s2 = args
+        ops = _editops(s1, s2)
+
+    return _editops_to_opcodes(ops, _length(s1), _length(s2))
+
+
+def matching_blocks(ops, s1, s2):
+    len1, len2 = _length(s1), _length(s2)
+
+    if not ops or len(ops[0]) != 5:
+        ops = _editops_to_opcodes(ops, len1, len2)
+
+    blocks = []
+
+    for op, sbeg, send, dbeg, dend in ops:
+        if op != 'equal':
+            continue
+
+        if blocks and blocks[-1][0] + blocks[-1][2] == sbeg and blocks[-1][1] + blocks[-1][2] == dbeg:
+            blocks[-1] = (blocks[-1][0], blocks[-1][1], blocks[-1][2] + send - sbeg)
+        else:
+            blocks.append((sbeg, dbeg, send - sbeg))
+
+    blocks.append((len1, len2, 0))
+    return blocks
@@ -222,6 +222,125 @@ def extractOne(query, choices, processor=default_processor, scorer=default_score
         return None
 
 
+def extractRatios(query, choices, processor=None, score_cutoff=0, force_ascii=True):
+    """Score a query against a collection of choices in a single pass.
+
+    For every choice this computes token_set_ratio, partial_ratio and
+    token_sort_ratio, giving the same results as calling the three fuzz
+    functions with (choice, query). The query is processed and tokenized
+    only once and the processed form of each choice is cached across calls,
+    so scoring the same catalogue again only pays for the comparisons.
+
+    Args:
+        query: A string to match against
+        choices: A list or dictionary of choices, see extractWithoutOrder().
+        processor: Optional function of the form f(a) -> b, where b is the
+            string of choice a that is to be scored. Choices for which it
+            returns None are skipped.
+        score_cutoff: Optional threshold for the sum of the three ratios.
+            Choices that cannot reach it are dropped as soon as that is
+            known, skipping the remaining (more expensive) ratios.
+            Defaults to 0.
+        force_ascii: Allow only ASCII characters (Default: True)
+
+    Returns:
+        Generator of tuples containing the match and a
+        (token_set_ratio, partial_ratio, token_sort_ratio) tuple, plus the
+        key for each match when a dictionary is used.
+    """
+    if query is None:
+        return
+
+    processed_query = _process_tokens(query, force_ascii)
+
+    def score(choice):
+        s = processor(choice) if processor else choice
+
+        if s is None:
+            return None
+
+        processed = _process_tokens(s, force_ascii)
+
+        sort_score = fuzz.ratio(processed[2], processed_query[2])
+
+        if sort_score + 200 < score_cutoff:
+            return None
+
+        set_score = _token_set_ratio(processed, processed_query)
+
+        if sort_score + set_score + 100 < score_cutoff:
+            return None
+
+        partial_score = fuzz.partial_ratio(s, query)
+
+        if sort_score + set_score + partial_score < score_cutoff:
+            return None
+
+        return (set_score, partial_score, sort_score)
+
+    try:
+        # See if choices is a dictionary-like object.
+        for key, choice in list(choices.items()):
+            scores = score(choice)
+            if scores is not None:
+                yield (choice, scores, key)
+    except AttributeError:
+        # It's a list; just iterate over it.
+        for choice in choices:
+            scores = score(choice)
+            if scores is not None:
+                yield (choice, scores)
+
+
+_processed_cache = {}
+_processed_cache_size = 50000
+
+
+def _process_tokens(s, force_ascii):
+    """Return (processed string, token set, sorted tokens) for s, cached."""
+    key = (s, force_ascii)
+
+    try:
+        return _processed_cache[key]
+    except KeyError:
+        pass
+
+    processed = utils.full_process(s, force_ascii=force_ascii)
+    tokens = processed.split()
+    result = (processed, frozenset(tokens), u" ".join(sorted(tokens)).strip())
+
+    if len(_processed_cache) >= _processed_cache_size:
+        _processed_cache.clear()
+
+    _processed_cache[key] = result
+    return result
+
+
+def _token_set_ratio(processed1, processed2):
+    """fuzz.token_set_ratio on the output of _process_tokens."""
+    if not utils.validate_string(processed1[0]):
+        return 0
+    if not utils.validate_string(processed2[0]):
+        return 0
+
+    tokens1 = processed1[1]
+    tokens2 = processed2[1]
+
+    sorted_sect = u" ".join(sorted(tokens1.intersection(tokens2)))
+    sorted_1to2 = u" ".join(sorted(tokens1.difference(tokens2)))
+    sorted_2to1 = u" ".join(sorted(tokens2.difference(tokens1)))
+
+    combined_1to2 = (sorted_sect + u" " + sorted_1to2).strip()
+    combined_2to1 = (sorted_sect + u" " + sorted_2to1).strip()
+    sorted_sect = sorted_sect.strip()
+
+    return max(
+        fuzz.ratio(sorted_sect, combined_1to2),
+        fuzz.ratio(sorted_sect, combined_2to1),
+        fuzz.ratio(combined_1to2, combined_2to1)
+    )
+
+
 def dedupe(contains_dupes, threshold=70, scorer=fuzz.token_set_ratio):
     """This convenience function takes a list of strings containing duplicates and uses fuzzy matching to identify
     and remove duplicates. Specifically, it uses the process.extract to identify duplicates that
@@ -0,0 +1,109 @@
+# times plugin.Folder.display, which hands a listing to Kodi in one addDirectoryItems call, against the one
+# addDirectoryItem call per row it replaced
+#
+#   python tools/benchmark_display.py [--addon DIR] [--channels 300] [--repeat N]
+#
+# the listing is a live channel list as live_tv builds it, outside Kodi the tools/kodi stand-ins take the calls, so next
+# to the python side time the number of calls into xbmcplugin is counted, every one of those crosses into Kodi
+import argparse, collections, os, shutil, sys, tempfile, timeit
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ADDON = os.path.join(os.path.dirname(TOOLS), 'matrix', 'plugin.video.canaldigitaal')
+
+def count_calls(module, counter):
+    def counted(name, function):
+        def wrapper(*args, **kwargs):
+            counter[name] += 1
+            return function(*args, **kwargs)
+
+        return wrapper
+
+    for name in dir(module):
+        function = getattr(module, name)
+
+        if not name.startswith('_') and callable(function):
+            setattr(module, name, counted(name=name, function=function))
+
+def build_folder(plugin, channels):
+    folder = plugin.Folder(title='Live TV', content='videos')
+
+    for channel in range(channels):
+        id = 'channel{channel}'.format(channel=channel)
+
+        folder.add_item(
+            label = 'Channel {channel}'.format(channel=channel + 1),
+            info = {'plot': 'Now: programme {channel}\nNext: programme {next}'.format(channel=channel, next=channel + 1)},
+            art = {'thumb': 'https://images.example/{id}.png'.format(id=id)},
+            path = plugin.url_for(func_or_url='play_video', type='channel', channel=id, id=id, _is_live=True),
+            playable = True,
+            context = [('Start from the beginning', 'RunPlugin({url})'.format(url=plugin.url_for(func_or_url='play_video', type='channel', channel=id, id=id, from_beginning=True)))],
+        )
+
+    return folder
+
+def display_per_item(plugin, xbmcplugin, folder):
+    # Folder.display before the listing was handed over in one call
+    handle = plugin._handle()
+
+    for item in [i for i in folder.items if i]:
+        item.art['thumb'] = item.art.get('thumb') or folder.thumb
+        item.art['fanart'] = item.art.get('fanart') or folder.fanart
+
+        li = item.get_li()
+        xbmcplugin.addDirectoryItem(handle, item.path, li, item.is_folder)
+
+    if folder.content: xbmcplugin.setContent(handle, folder.content)
+    if folder.title: xbmcplugin.setPluginCategory(handle, folder.title)
+
+    for sort_method in folder.sort_methods:
+        xbmcplugin.addSortMethod(handle, sort_method)
+
+    xbmcplugin.endOfDirectory(handle, succeeded=True, updateListing=folder.updateListing, cacheToDisc=folder.cacheToDisc)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--addon', default=ADDON)
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    addon = os.path.abspath(args.addon)
+    profile = tempfile.mkdtemp()
+
+    os.environ['KODI_ADDON_PATH'] = addon
+    os.environ['KODI_PROFILE'] = profile
+    sys.argv = ['plugin://{id}/'.format(id=os.path.basename(addon)), '1', '', 'resume:false']
+    sys.path[0:0] = [addon, os.path.join(TOOLS, 'kodi')]
+
+    try:
+        import xbmcplugin
+        from resources.lib.base import plugin, settings
+
+        counter = collections.Counter()
+        count_calls(module=xbmcplugin, counter=counter)
+
+        paths = [
+            ('per item', lambda folder: display_per_item(plugin=plugin, xbmcplugin=xbmcplugin, folder=folder)),
+            ('batched', lambda folder: folder.display()),
+        ]
+
+        print('{0:<10} {1:>10} {2:>16}'.format('display', 'time', 'xbmcplugin calls'))
+
+        for name, display in paths:
+            counter.clear()
+            display(build_folder(plugin=plugin, channels=args.channels))
+            calls = sum(counter.values())
+
+            folders = [build_folder(plugin=plugin, channels=args.channels) for i in range(args.repeat)]
+            time = min(timeit.repeat(lambda: display(folders.pop()), number=1, repeat=args.repeat)) * 1000
+
+            print('{0:<10} {1:>8.2f}ms {2:>16}'.format(name, time, calls))
+
+        settings.flush()
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
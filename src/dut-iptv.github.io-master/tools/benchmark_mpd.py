@@ -0,0 +1,220 @@
+# times the single pass manifest rewrite in base/mpd.py against the regex passes the proxies ran before
+#
+#   python tools/benchmark_mpd.py [--addon DIR] [--manifest FILE ...] [--repeat N]
+#
+# without --manifest it builds live manifests sized like the ones of the five providers, once with the segment timeline
+# on the adaptation set and once repeated in every representation, captured manifests can be passed to time those as
+# well, every manifest gets the duration fix, highest bandwidth and, for ziggo, the ac-3 removal
+import argparse, io, os, re, sys, timeit
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ADDON = os.path.join(os.path.dirname(TOOLS), 'matrix', 'plugin.video.canaldigitaal')
+
+DURATION = 3 * 3600
+
+# provider, periods, video representations, audio sets, segments per set, ac-3 audio, representation id
+PROFILES = [
+    ('canaldigitaal', 1, 6, 2, 1800, False, 'video={bandwidth}'),
+    ('kpn', 1, 5, 3, 1800, False, 'video_{index}'),
+    ('nlziet', 12, 5, 2, 150, False, 'Video{index}'),
+    ('tmobile', 1, 6, 2, 1800, False, 'video={bandwidth}'),
+    ('ziggo', 24, 6, 3, 75, True, 'video{index}'),
+]
+
+def build_manifest(periods, videos, audios, segments, ac3, video_id, per_representation):
+    xml = ['<?xml version="1.0" encoding="utf-8"?>\n<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT{hours}H0M0S" minBufferTime="PT2S">\n'.format(hours=periods // 12 + 1)]
+
+    for period in range(periods):
+        xml.append('  <Period id="{id}" start="PT{start}S" duration="PT{duration}S">\n'.format(id=period, start=period * segments * 2, duration=segments * 2))
+
+        timeline = ''.join('          <S t="{t}" d="2000"/>\n'.format(t=(period * segments + i) * 2000) for i in range(segments))
+        template = '        <SegmentTemplate timescale="1000" media="$RepresentationID$/$Time$.m4s" initialization="$RepresentationID$/init.mp4">\n          <SegmentTimeline>\n{timeline}          </SegmentTimeline>\n        </SegmentTemplate>\n'.format(timeline=timeline)
+
+        xml.append('    <AdaptationSet mimeType="video/mp4" contentType="video" segmentAlignment="true">\n')
+
+        if not per_representation:
+            xml.append(template)
+
+        for index in range(videos):
+            bandwidth = 400000 * (index + 1)
+            xml.append('      <Representation id="{id}" bandwidth="{bandwidth}" codecs="avc1.4d401f" width="{width}" height="{height}" frameRate="25">\n'.format(
+                id=video_id.format(index=index, bandwidth=bandwidth), bandwidth=bandwidth, width=320 * (index + 1), height=180 * (index + 1)))
+
+            if per_representation:
+                xml.append(template)
+
+            xml.append('      </Representation>\n')
+
+        xml.append('    </AdaptationSet>\n')
+
+        for index in range(audios):
+            codec = 'ac-3' if ac3 and index == audios - 1 else 'mp4a.40.2'
+            xml.append('    <AdaptationSet mimeType="audio/mp4" contentType="audio" lang="nl">\n')
+            xml.append('      <Representation id="audio_{index}" bandwidth="128000" codecs="{codec}" audioSamplingRate="48000">\n'.format(index=index, codec=codec))
+            xml.append(template)
+            xml.append('      </Representation>\n')
+            xml.append('    </AdaptationSet>\n')
+
+        xml.append('  </Period>\n')
+
+    xml.append('</MPD>\n')
+
+    return ''.join(xml)
+
+# the passes below are the ones the proxies ran before base/mpd.py, kept here as they were to time them
+def legacy_set_duration(xml, duration):
+    try:
+        given_duration = 0
+        matched = False
+
+        regex = r"mediaPresentationDuration=\"PT([0-9]*)M([0-9]*)[0-9.]*S\""
+        matches2 = re.finditer(regex, xml, re.MULTILINE)
+
+        if len([i for i in matches2]) > 0:
+            matches = re.finditer(regex, xml, re.MULTILINE)
+            matched = True
+        else:
+            regex2 = r"mediaPresentationDuration=\"PT([0-9]*)H([0-9]*)M([0-9]*)[0-9.]*S\""
+            matches3 = re.finditer(regex2, xml, re.MULTILINE)
+
+            if len([i for i in matches3]) > 0:
+                matches = re.finditer(regex2, xml, re.MULTILINE)
+                matched = True
+            else:
+                regex3 = r"mediaPresentationDuration=\"PT([0-9]*)D([0-9]*)H([0-9]*)M([0-9]*)[0-9.]*S\""
+                matches4 = re.finditer(regex3, xml, re.MULTILINE)
+
+                if len([i for i in matches4]) > 0:
+                    matches = re.finditer(regex3, xml, re.MULTILINE)
+                    matched = True
+
+        if matched == True:
+            given_day = 0
+            given_hour = 0
+            given_minute = 0
+            given_second = 0
+
+            for matchNum, match in enumerate(matches, start=1):
+                if len(match.groups()) == 2:
+                    given_minute = int(match.group(1))
+                    given_second = int(match.group(2))
+                elif len(match.groups()) == 3:
+                    given_hour = int(match.group(1))
+                    given_minute = int(match.group(2))
+                    given_second = int(match.group(3))
+                elif len(match.groups()) == 4:
+                    given_day = int(match.group(1))
+                    given_hour = int(match.group(2))
+                    given_minute = int(match.group(3))
+                    given_second = int(match.group(4))
+
+            given_duration = (given_day * 24* 60 * 60) + (given_hour * 60 * 60) + (given_minute * 60) + given_second
+
+        if not given_duration > 0 or given_duration > duration:
+            minute, second = divmod(duration, 60)
+            hour, minute = divmod(minute, 60)
+
+            regex4 = r"mediaPresentationDuration=\"[a-zA-Z0-9.]*\""
+            subst = "mediaPresentationDuration=\"PT{hour}H{minute}M{second}S\"".format(hour=hour, minute=minute, second=second)
+            regex5 = r"duration=\"[a-zA-Z0-9.]*\">"
+            subst2 = "duration=\"PT{hour}H{minute}M{second}S\">".format(hour=hour, minute=minute, second=second)
+
+            xml = re.sub(regex4, subst, xml, 0, re.MULTILINE)
+            xml = re.sub(regex5, subst2, xml, 0, re.MULTILINE)
+    except:
+        pass
+
+    return xml
+
+def legacy_force_highest_bandwidth(xml):
+    try:
+        results = {}
+
+        result = re.findall(r'<[rR]epresentation(?:(?!<[rR]epresentation)(?!</[aA]daptationSet>)[\S\s])+', xml)
+        bandwidth_regex = r"bandwidth=\"([0-9]+)\""
+
+        for match in result:
+            if not 'id="video' in match and not 'id="Video' in match:
+                continue
+
+            bandwidth = 0
+            match2 = re.search(bandwidth_regex, match)
+
+            if match2:
+                bandwidth = match2.group(1)
+
+            results[bandwidth] = match
+
+        if len(results) > 1:
+            results.pop(max(results, key=int))
+
+        for bandwidth in results:
+            xml = xml.replace(results[bandwidth], "")
+
+    except:
+        pass
+
+    return xml
+
+def legacy_remove_ac3(xml):
+    try:
+        result = re.findall(r'<AdaptationSet(?:(?!</AdaptationSet>)[\S\s])+</AdaptationSet>', xml)
+
+        for match in result:
+            if "codecs=\"ac-3\"" in match:
+                xml = xml.replace(match, "")
+    except:
+        pass
+
+    return xml
+
+def legacy_rewrite(xml, ac3):
+    xml = legacy_set_duration(xml=xml, duration=DURATION)
+    xml = legacy_force_highest_bandwidth(xml=xml)
+
+    if ac3:
+        xml = legacy_remove_ac3(xml=xml)
+
+    return xml
+
+def best(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat)) * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--addon', default=ADDON)
+    parser.add_argument('--manifest', action='append', default=[])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path[0:0] = [os.path.abspath(args.addon), os.path.join(TOOLS, 'kodi')]
+    from resources.lib.base import mpd
+
+    manifests = []
+
+    for per_representation in [False, True]:
+        for provider, periods, videos, audios, segments, ac3, video_id in PROFILES:
+            name = provider + (' (rep)' if per_representation else '')
+            manifests.append((name, ac3, build_manifest(periods=periods, videos=videos, audios=audios, segments=segments, ac3=ac3, video_id=video_id, per_representation=per_representation)))
+
+    for path in args.manifest:
+        with io.open(path, 'r', encoding='utf-8') as f:
+            manifests.append((os.path.basename(path), 'ziggo' in path.lower(), f.read()))
+
+    print('{0:<20} {1:>9} {2:>12} {3:>12} {4:>8}'.format('manifest', 'size', 'regex', 'single pass', 'speedup'))
+
+    for name, ac3, xml in manifests:
+        transforms = [mpd.set_duration(duration=DURATION), mpd.force_highest_bandwidth]
+
+        if ac3:
+            transforms.append(mpd.remove_codec(codec='ac-3'))
+
+        legacy = best(lambda: legacy_rewrite(xml=xml, ac3=ac3), args.repeat)
+        single = best(lambda: mpd.rewrite(xml=xml, transforms=transforms), args.repeat)
+
+        print('{0:<20} {1:>7}kB {2:>10.1f}ms {3:>10.1f}ms {4:>7.1f}x'.format(name, len(xml) // 1024, legacy, single, legacy / single))
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
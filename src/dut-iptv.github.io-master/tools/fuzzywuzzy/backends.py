@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+backends.py
+
+Helpers shared by the tools in this directory: switching fuzz between the
+difflib, bitparallel and python-Levenshtein backends, and loading the
+programme titles the tools run on.
+"""
+import difflib
+import io
+import os
+import sys
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(TOOLS)), 'matrix', 'script.module.fuzzywuzzy', 'lib'))
+
+from fuzzywuzzy import StringMatcher, bitparallel, fuzz
+
+try:
+    import Levenshtein
+except ImportError:
+    Levenshtein = None
+
+FUNCTIONS = ('distance', 'editops', 'matching_blocks', 'opcodes', 'ratio')
+
+
+def available():
+    backends = ['difflib', 'bitparallel']
+
+    if Levenshtein:
+        backends.append('Levenshtein')
+
+    return backends
+
+
+def module(backend):
+    return bitparallel if backend == 'bitparallel' else Levenshtein
+
+
+def use(backend):
+    """Make fuzz (and so process) score with the given backend."""
+    if backend == 'difflib':
+        fuzz.SequenceMatcher = difflib.SequenceMatcher
+        return
+
+    for name in FUNCTIONS:
+        setattr(StringMatcher, name, getattr(module(backend), name))
+
+    fuzz.SequenceMatcher = StringMatcher.StringMatcher
+
+
+def load_titles(path=None):
+    with io.open(path or os.path.join(TOOLS, 'titles.txt'), 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
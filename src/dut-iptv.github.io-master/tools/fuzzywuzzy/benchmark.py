@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+benchmark.py
+
+Times the fuzz backends on programme titles: difflib (the old fallback),
+bitparallel (the pure python fallback) and python-Levenshtein when it is
+installed.
+
+    python tools/fuzzywuzzy/benchmark.py [--titles FILE] [--queries 20] [--repeat 3]
+
+Each query is scored against every title with process.extractRatios, as the
+replay and vod searches do, and every title pair is scored with fuzz.ratio
+and fuzz.partial_ratio.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import random
+import sys
+import timeit
+
+import backends
+from backends import fuzz
+from fuzzywuzzy import process
+
+
+def queries(rnd, titles, count):
+    result = []
+
+    for i in range(count):
+        words = rnd.choice(titles).lower().split()
+        start = rnd.randint(0, len(words) - 1)
+        result.append(' '.join(words[start:start + rnd.randint(1, 2)]))
+
+    return result
+
+
+def best(function, repeat):
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--titles')
+    parser.add_argument('--queries', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    titles = backends.load_titles(args.titles)
+    search = queries(random.Random(0), titles, args.queries)
+    pairs = [(s1, s2) for s1 in titles for s2 in titles[:20]]
+
+    print('{0} titles, {1} queries, {2} pairs'.format(len(titles), len(search), len(pairs)))
+    print('{0:<12} {1:>18} {2:>14} {3:>18}'.format('backend', 'extractRatios/query', 'ratio/pair', 'partial_ratio/pair'))
+
+    for backend in backends.available():
+        backends.use(backend)
+
+        extract = best(lambda: [list(process.extractRatios(query, titles)) for query in search], args.repeat)
+        ratio = best(lambda: [fuzz.ratio(s1, s2) for s1, s2 in pairs], args.repeat)
+        partial = best(lambda: [fuzz.partial_ratio(s1, s2) for s1, s2 in pairs], args.repeat)
+
+        print('{0:<12} {1:>16.2f}ms {2:>12.1f}us {3:>16.1f}us'.format(
+            backend, extract * 1000 / len(search), ratio * 1000000 / len(pairs), partial * 1000000 / len(pairs)))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
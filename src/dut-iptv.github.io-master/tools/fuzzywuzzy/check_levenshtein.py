@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+check_levenshtein.py
+
+Checks that fuzzywuzzy/bitparallel.py gives exactly the same results as
+python-Levenshtein, which has to be importable (the backend follows 0.12.2).
+
+    python tools/fuzzywuzzy/check_levenshtein.py [--pairs 20000] [--seed 0] [--titles FILE]
+
+Pairs are drawn from programme titles: a title against another title,
+against a mistyped copy of itself and against a search query cut from it,
+plus short strings over a small alphabet, which give the most ties in the
+traceback. Every Levenshtein function StringMatcher uses is compared, and
+so are the fuzz scores computed with each backend.
+"""
+from __future__ import print_function, unicode_literals
+
+import argparse
+import random
+import sys
+
+import backends
+from backends import Levenshtein, bitparallel, fuzz
+
+SCORES = ('ratio', 'partial_ratio', 'token_sort_ratio', 'token_set_ratio')
+
+
+def mistype(rnd, s):
+    chars = list(s)
+
+    for i in range(rnd.randint(1, 4)):
+        pos = rnd.randint(0, len(chars))
+        edit = rnd.randint(0, 2)
+
+        if edit == 0 or not chars:
+            chars.insert(pos, rnd.choice('aeiounrst '))
+        elif edit == 1:
+            del chars[min(pos, len(chars) - 1)]
+        else:
+            chars[min(pos, len(chars) - 1)] = rnd.choice('aeiounrst ')
+
+    return ''.join(chars)
+
+
+def pairs(rnd, titles, count):
+    for i in range(count):
+        kind = i % 4
+        title = rnd.choice(titles)
+
+        if kind == 0:
+            yield title, rnd.choice(titles)
+        elif kind == 1:
+            yield title, mistype(rnd, title)
+        elif kind == 2:
+            words = title.lower().split()
+            start = rnd.randint(0, len(words) - 1)
+            yield title, ' '.join(words[start:start + rnd.randint(1, 2)])
+        else:
+            yield (''.join(rnd.choice('abc d') for n in range(rnd.randint(0, 40))),
+                   ''.join(rnd.choice('abc d') for n in range(rnd.randint(0, 40))))
+
+
+def results(module, s1, s2):
+    ops = module.editops(s1, s2)
+    codes = module.opcodes(s1, s2)
+
+    return [
+        module.distance(s1, s2),
+        module.ratio(s1, s2),
+        [tuple(op) for op in ops],
+        [tuple(op) for op in codes],
+        [tuple(block) for block in module.matching_blocks(ops, s1, s2)],
+        [tuple(block) for block in module.matching_blocks(codes, len(s1), len(s2))],
+        [tuple(op) for op in module.editops(codes, s1, s2)],
+    ]
+
+
+def scores(backend, s1, s2):
+    backends.use(backend)
+    return [getattr(fuzz, name)(s1, s2) for name in SCORES]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--titles')
+    args = parser.parse_args()
+
+    if not Levenshtein:
+        print('python-Levenshtein is not installed')
+        return 2
+
+    rnd = random.Random(args.seed)
+    titles = backends.load_titles(args.titles)
+    mismatches = 0
+
+    for s1, s2 in pairs(rnd, titles, args.pairs):
+        expected = results(Levenshtein, s1, s2) + scores('Levenshtein', s1, s2)
+        actual = results(bitparallel, s1, s2) + scores('bitparallel', s1, s2)
+
+        if actual != expected:
+            mismatches += 1
+
+            if mismatches <= 10:
+                print('mismatch: {0!r} {1!r}'.format(s1, s2))
+                print('  Levenshtein: {0!r}'.format(expected))
+                print('  bitparallel: {0!r}'.format(actual))
+
+    print('{0} pairs, {1} mismatches'.format(args.pairs, mismatches))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# checks what a cold 'import resources.lib.plugin' costs, the part of every navigation that runs before a route
+#
+#   python tools/import_budget.py [--addon DIR] [--budget MS] [--runs N]
+#
+# every run starts a fresh interpreter, exactly as Kodi does, and the check fails when the fastest run is over
+# the budget or when one of the modules that only some routes need was loaded
+import argparse, json, os, shutil, subprocess, sys, tempfile
+
+TOOLS = os.path.dirname(os.path.abspath(__file__))
+ADDON = os.path.join(os.path.dirname(TOOLS), 'matrix', 'plugin.video.canaldigitaal')
+
+HEAVY = ['Cryptodome', 'fuzzywuzzy', 'platform', 'pytz', 'requests', 'resources.lib.base.encrypt', 'resources.lib.base.uaparser', 'zipfile']
+
+CHILD = '''
+import json, os, sys, time
+sys.path[0:0] = {paths}
+before = set(sys.modules)
+start = time.time()
+import resources.lib.plugin
+print(json.dumps({{'ms': (time.time() - start) * 1000, 'modules': sorted(set(sys.modules) - before)}}))
+sys.stdout.flush()
+
+# the settings write-behind leaves a timer thread behind, python 2 trips over it when shutting down
+os._exit(0)
+'''
+
+def measure(addon, runs):
+    profile = tempfile.mkdtemp()
+    paths = [addon, os.path.join(os.path.dirname(addon), 'script.module.fuzzywuzzy', 'lib'), os.path.join(TOOLS, 'kodi')]
+
+    env = dict(os.environ)
+    env['KODI_ADDON_PATH'] = addon
+    env['KODI_PROFILE'] = profile
+
+    results = []
+
+    try:
+        for i in range(runs):
+            output = subprocess.check_output([sys.executable, '-c', CHILD.format(paths=json.dumps(paths))], cwd=addon, env=env)
+            results.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    finally:
+        shutil.rmtree(profile, ignore_errors=True)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--addon', default=ADDON)
+    parser.add_argument('--budget', type=float, default=250)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    results = measure(addon=os.path.abspath(args.addon), runs=args.runs)
+    times = sorted(result['ms'] for result in results)
+    heavy = sorted(module for module in results[0]['modules'] if module.split('.')[0] in HEAVY or module in HEAVY)
+
+    print('import resources.lib.plugin: best {best:.1f} ms, median {median:.1f} ms, budget {budget:.0f} ms'.format(best=times[0], median=times[len(times) // 2], budget=args.budget))
+    print('modules loaded: {count}'.format(count=len(results[0]['modules'])))
+
+    if heavy:
+        print('loaded at import time: {modules}'.format(modules=', '.join(heavy)))
+
+    if times[0] > args.budget or heavy:
+        print('FAIL')
+        return 1
+
+    print('OK')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
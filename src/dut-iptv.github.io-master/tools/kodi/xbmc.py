@@ -0,0 +1,46 @@
+# stand-ins for the parts of Kodi the add-on touches, so the tools can import it outside Kodi
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+LOGNONE = 5
+ISO_639_1 = 0
+
+def log(msg, level=LOGDEBUG):
+    pass
+
+def translatePath(path):
+    return path
+
+def getInfoLabel(infotag):
+    return ''
+
+def getCondVisibility(condition):
+    return False
+
+def getLanguage(format=None, region=False):
+    return 'en'
+
+def getLocalizedString(id):
+    return str(id)
+
+def executebuiltin(function, wait=False):
+    pass
+
+def executeJSONRPC(jsonrpccommand):
+    return '{}'
+
+def sleep(time):
+    pass
+
+class Monitor(object):
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return False
+
+class Player(object):
+    def isPlayingVideo(self):
+        return False
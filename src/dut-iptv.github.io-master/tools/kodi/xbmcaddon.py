@@ -0,0 +1,30 @@
+import os
+
+_settings = {}
+
+class Addon(object):
+    def __init__(self, id=None):
+        self._path = os.environ.get('KODI_ADDON_PATH', os.getcwd())
+        self._id = id or os.path.basename(os.path.normpath(self._path))
+
+    def getAddonInfo(self, id):
+        return {
+            'id': self._id,
+            'name': self._id,
+            'path': os.path.join(self._path, ''),
+            'profile': os.path.join(os.environ.get('KODI_PROFILE', self._path), ''),
+            'icon': os.path.join(self._path, 'icon.png'),
+            'fanart': os.path.join(self._path, 'fanart.jpg'),
+        }.get(id, '')
+
+    def getLocalizedString(self, id):
+        return str(id)
+
+    def getSetting(self, id):
+        return _settings.get(id, '')
+
+    def setSetting(self, id, value):
+        _settings[id] = value
+
+    def openSettings(self):
+        pass
@@ -0,0 +1,25 @@
+ALPHANUM_HIDE_INPUT = 2
+
+class ListItem(object):
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.properties = {}
+
+    def setLabel(self, label):
+        self.label = label
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def getProperty(self, key):
+        return self.properties.get(key, '')
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+class Dialog(object):
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+class DialogProgress(Dialog):
+    pass
@@ -0,0 +1,24 @@
+SORT_METHOD_UNSORTED = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_DATEADDED = 21
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    return True
+
+def addDirectoryItems(handle, items, totalItems=0):
+    return True
+
+def addSortMethod(handle, sortMethod, label2Mask=''):
+    pass
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
+
+def setContent(handle, content):
+    pass
+
+def setPluginCategory(handle, category):
+    pass
+
+def setResolvedUrl(handle, succeeded, listitem):
+    pass